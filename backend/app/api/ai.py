@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Query, Response, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import SessionLocal
 from app.core.config import OPENAI_MODEL
+from app.core.pagination import encode_cursor, decode_cursor, NEXT_CURSOR_HEADER
+from app.core.etag import data_version_etag, not_modified
+from app.core import data_versions
 from app.schemas import schemas
 from app.services import ai_config_service, ai_service, ai_output_manager
 from sse_starlette.sse import EventSourceResponse
 import json
 import datetime
-from typing import List
+from typing import List, Optional
 
 router = APIRouter()
 
@@ -28,8 +31,16 @@ async def get_db():
         yield db
 
 # --- 配置 ---
+# AI 配置中包含提醒列表，ETag 同时取决于两者的版本号
+AI_CONFIG_RESOURCES = (data_versions.AI_CONFIG, data_versions.REMINDERS)
+
 @router.get("/config/{user_id}", response_model=schemas.AIConfig)
-async def get_ai_config(user_id: int, db: AsyncSession = Depends(get_db)):
+async def get_ai_config(user_id: int, request: Request, response: Response,
+                        if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    etag = await data_version_etag(db, user_id, AI_CONFIG_RESOURCES, request)
+    unchanged = not_modified(if_none_match, etag, response)
+    if unchanged is not None:
+        return unchanged
     config = await ai_config_service.get_ai_config(db, user_id)
     if not config:
         default_config = schemas.AIConfigCreate(
@@ -38,23 +49,55 @@ async def get_ai_config(user_id: int, db: AsyncSession = Depends(get_db)):
             model=OPENAI_MODEL
         )
         config = await ai_config_service.create_ai_config(db, default_config)
+        # 创建默认配置递增了版本号，重新计算 ETag
+        not_modified(None, await data_version_etag(db, user_id, AI_CONFIG_RESOURCES, request), response)
     return config
 
 @router.put("/config/{user_id}", response_model=schemas.AIConfig)
 async def update_ai_config(user_id: int, config: schemas.AIConfigUpdate, db: AsyncSession = Depends(get_db)):
-    updated = await ai_config_service.update_ai_config(db, user_id, config)
+    try:
+        updated = await ai_config_service.update_ai_config(db, user_id, config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not updated:
         raise HTTPException(status_code=404, detail="Config not found")
     return updated
 
 # --- 对话 ---
 @router.get("/dialogues", response_model=List[dict])
-async def get_dialogues(user_id: int, db: AsyncSession = Depends(get_db)):
-    return await ai_config_service.get_dialogues(db, user_id)
+async def get_dialogues(
+    user_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取对话列表（按最后活跃时间倒序）
+    传入 limit 时分页返回，下一页游标通过 X-Next-Cursor 响应头返回，请求下一页时作为 cursor 参数传回
+    """
+    try:
+        before = decode_cursor(cursor, 2)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    dialogues = await ai_config_service.get_dialogues(db, user_id, limit, tuple(before) if before else None)
+    if limit is not None and len(dialogues) == limit:
+        last = dialogues[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last["last_timestamp"], last["id"])
+    return dialogues
 
 @router.get("/dialogues/{dialogue_id}", response_model=schemas.AiMessage)
-async def get_dialogue(dialogue_id: int, user_id: int, db: AsyncSession = Depends(get_db)):
-    d = await ai_config_service.get_dialogue(db, dialogue_id, user_id)
+async def get_dialogue(
+    dialogue_id: int,
+    user_id: int,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取对话详情，offset/limit 按轮次分页（不传 limit 时返回 offset 之后的全部轮次）
+    """
+    d = await ai_config_service.get_dialogue(db, dialogue_id, user_id, offset, limit)
     if not d:
         raise HTTPException(status_code=404, detail="Dialogue not found")
     return d
@@ -0,0 +1,267 @@
+# 读缓存：按用户和查询缓存任务列表、长期任务列表、紧急任务和日历/热力图的读取结果
+#
+# 每个 (用户, 范围) 带有版本号，缓存键包含读取前取得的版本号。写操作提交后递增版本号（见
+# invalidate_on_commit / apply_invalidations），旧版本的条目不再命中；并发写入提交前读到的旧数据
+# 即使在失效之后才写入缓存，也只会落在旧版本下，不会被读到。
+# 版本号取自全局递增的失效序号。读事务的快照在第一条语句执行时确定，会话在开始前记下当时的序号
+# （mark_snapshot）；事务已开始后读到的版本号大于该序号时，快照可能早于这次失效对应的提交，
+# 此时直接查询且不写入缓存，避免把旧数据缓存在新版本下。
+# 后端由 CACHE_BACKEND 选择：memory 为进程内 LRU + TTL（总大小受 CACHE_MAX_BYTES 限制），none 关闭缓存。
+# 多个 worker 需要共享缓存时，实现 CacheBackend 并注册到 BACKENDS 即可（如基于 Redis 的实现）。
+# 缓存的结果在多个请求之间共享，调用方不能修改返回的对象。
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+from pydantic_core import to_json
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import CACHE_BACKEND, CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES
+
+# 缓存范围：写操作按范围失效
+SCOPE_TASKS = "tasks"
+SCOPE_LONG_TERM_TASKS = "long_term_tasks"
+SCOPE_URGENT = "urgent"
+SCOPE_CALENDAR = "calendar"
+
+# 事务中待失效的 (用户, 范围)，保存在 session.info 中，提交后统一失效
+PENDING_KEY = "cache_invalidations"
+# 会话开始查询前的失效序号，保存在 session.info 中
+SNAPSHOT_KEY = "cache_snapshot_sequence"
+
+
+def _estimate_size(value: Any) -> int:
+    """按 JSON 序列化后的长度估算缓存值占用的内存"""
+    try:
+        return len(to_json(value))
+    except ValueError:
+        return sys.getsizeof(value)
+
+
+class CacheBackend:
+    """缓存后端接口"""
+    name = "base"
+
+    async def version(self, user_id: int, scope: str) -> int:
+        """(用户, 范围) 的当前版本号，即最近一次失效时的失效序号，从未失效时为 0"""
+        raise NotImplementedError
+
+    async def sequence(self) -> int:
+        """当前的失效序号（每次失效递增）"""
+        raise NotImplementedError
+
+    async def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """返回 (是否命中, 值)"""
+        raise NotImplementedError
+
+    async def set(self, key: Hashable, value: Any):
+        raise NotImplementedError
+
+    async def invalidate(self, user_id: int, scope: str):
+        """递增版本号，使该用户该范围下的缓存全部失效"""
+        raise NotImplementedError
+
+    async def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    """关闭缓存：总是未命中，不保存任何内容"""
+    name = "none"
+
+    def __init__(self):
+        self.misses = 0
+
+    async def version(self, user_id: int, scope: str) -> int:
+        return 0
+
+    async def sequence(self) -> int:
+        return 0
+
+    async def get(self, key: Hashable) -> Tuple[bool, Any]:
+        self.misses += 1
+        return False, None
+
+    async def set(self, key: Hashable, value: Any):
+        pass
+
+    async def invalidate(self, user_id: int, scope: str):
+        pass
+
+    async def clear(self):
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "entries": 0, "bytes": 0, "hits": 0, "misses": self.misses,
+                "hit_rate": 0.0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+
+class MemoryCache(CacheBackend):
+    """
+    进程内缓存：超过 ttl 秒的条目视为过期；条目数或估算的总字节数超出上限时淘汰最久未使用的条目
+    缓存键为 (user_id, scope, version, query)
+    """
+    name = "memory"
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES,
+                 max_bytes: int = CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (过期时间, 字节数, 值)
+        self._versions = {}            # (user_id, scope) -> 版本号
+        self._sequence = 0             # 失效序号
+        self._keys = {}                # (user_id, scope) -> 该范围下的缓存键，失效时直接删除
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    async def version(self, user_id: int, scope: str) -> int:
+        return self._versions.get((user_id, scope), 0)
+
+    async def sequence(self) -> int:
+        return self._sequence
+
+    async def get(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        if entry[0] <= time.monotonic():
+            self._remove(key)
+            self.expired += 1
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[2]
+
+    async def set(self, key: Hashable, value: Any):
+        user_id, scope = key[0], key[1]
+        if key[2] != self._versions.get((user_id, scope), 0):
+            # 读取期间已有写入提交，结果可能是旧数据
+            return
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self._keys.setdefault((user_id, scope), set()).add(key)
+        self.bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def invalidate(self, user_id: int, scope: str):
+        self._sequence += 1
+        self._versions[(user_id, scope)] = self._sequence
+        for key in self._keys.pop((user_id, scope), ()):
+            self._remove(key)
+        self.invalidations += 1
+
+    async def clear(self):
+        self._entries.clear()
+        self._keys.clear()
+        self.bytes = 0
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry[1]
+        keys = self._keys.get((key[0], key[1]))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys[(key[0], key[1])]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "invalidations": self.invalidations,
+        }
+
+
+# 可选的缓存后端，CACHE_BACKEND 取其中的键
+BACKENDS = {
+    "memory": MemoryCache,
+    "none": NullCache,
+}
+
+
+def _create_backend(name: str) -> CacheBackend:
+    backend_class = BACKENDS.get((name or "").strip().lower())
+    if backend_class is None:
+        print(f"[cache] 未知的缓存后端 {name}，使用 memory")
+        backend_class = MemoryCache
+    return backend_class()
+
+
+cache: CacheBackend = _create_backend(CACHE_BACKEND)
+
+
+async def cached(db: AsyncSession, user_id: int, scope: str, query: Hashable,
+                 loader: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    按 (用户, 范围, 查询) 读取缓存，未命中时调用 loader 查询并写入缓存
+    当前事务中已修改该范围（尚未提交）时直接查询，既不读也不写缓存；
+    事务已开始且该范围在 mark_snapshot 之后失效过（或会话未调用 mark_snapshot）时，
+    读快照可能早于失效对应的提交，同样直接查询
+
+    参数:
+        query: 可哈希的查询参数，区分同一范围内的不同查询
+        loader: 无参数的异步函数，返回查询结果
+    """
+    if (user_id, scope) in db.info.get(PENDING_KEY, ()):
+        return await loader()
+    version = await cache.version(user_id, scope)
+    if db.in_transaction():
+        snapshot = db.info.get(SNAPSHOT_KEY)
+        if snapshot is None or version > snapshot:
+            return await loader()
+    key = (user_id, scope, version, query)
+    hit, value = await cache.get(key)
+    if hit:
+        return value
+    value = await loader()
+    await cache.set(key, value)
+    return value
+
+
+async def mark_snapshot(db: AsyncSession):
+    """
+    在会话执行第一条语句之前记下当前的失效序号，之后的读取即使先执行了其他查询（如 ETag 的版本号查询）
+    也能使用缓存。提交后开始的新事务沿用这个更早的序号，只会多绕过缓存，不会读到旧数据
+    """
+    db.info[SNAPSHOT_KEY] = await cache.sequence()
+
+
+def invalidate_on_commit(db: AsyncSession, user_id: Optional[int], *scopes: str):
+    """登记写操作影响的 (用户, 范围)，事务提交后由 apply_invalidations 失效"""
+    if user_id is None:
+        return
+    db.info.setdefault(PENDING_KEY, set()).update((user_id, scope) for scope in scopes)
+
+
+async def apply_invalidations(db: AsyncSession):
+    """事务提交后失效登记的缓存范围"""
+    for user_id, scope in db.info.pop(PENDING_KEY, ()):
+        await cache.invalidate(user_id, scope)
+
+
+def discard_invalidations(db: AsyncSession):
+    """事务回滚后丢弃登记（数据未变化）"""
+    db.info.pop(PENDING_KEY, None)
@@ -84,9 +84,52 @@ try:
 except (ValueError, TypeError):
     AI_CONTEXT_WINDOW_TURNS = 10
 
+def _get_int_env(name: str, default: int) -> int:
+    """读取整数类型的环境变量，格式错误时回退到默认值"""
+    try:
+        return int(os.getenv(name, str(default)))
+    except (ValueError, TypeError):
+        return default
+
+def _get_bool_env(name: str, default: bool) -> bool:
+    """读取布尔类型的环境变量（true/1/yes/on 为真）"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("true", "1", "yes", "on")
+
+# 数据库配置
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./task_stream.db")
+# 连接池配置：常驻连接数、允许的溢出连接数、获取连接的超时时间（秒）
+DB_POOL_SIZE = _get_int_env("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _get_int_env("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = _get_int_env("DB_POOL_TIMEOUT", 30)
+# SQLite 连接参数，每个池化连接建立时通过 PRAGMA 应用
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = _get_int_env("SQLITE_BUSY_TIMEOUT_MS", 5000)
+# cache_size 为负数时单位是 KiB，-65536 即 64 MiB
+SQLITE_CACHE_SIZE = _get_int_env("SQLITE_CACHE_SIZE", -65536)
+SQLITE_MMAP_SIZE = _get_int_env("SQLITE_MMAP_SIZE", 268435456)
+
+# 是否通过触发器维护 daily_stats 每日统计表；关闭时热力图直接在 tasks 表上分组统计
+DAILY_STATS_ENABLED = _get_bool_env("DAILY_STATS_ENABLED", True)
+
+# 读缓存配置：后端（memory / none）、条目有效期（秒）、最大条目数和估算的最大总字节数
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL_SECONDS = _get_int_env("CACHE_TTL_SECONDS", 60)
+CACHE_MAX_ENTRIES = _get_int_env("CACHE_MAX_ENTRIES", 2000)
+CACHE_MAX_BYTES = _get_int_env("CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+# 幂等键：保存的响应保留时间（秒）和可保存的最大响应体字节数
+IDEMPOTENCY_TTL_SECONDS = _get_int_env("IDEMPOTENCY_TTL_SECONDS", 24 * 3600)
+IDEMPOTENCY_MAX_RESPONSE_BYTES = _get_int_env("IDEMPOTENCY_MAX_RESPONSE_BYTES", 1024 * 1024)
+
 # 最终调试信息
 print(f"=== Final Configuration ===")
 print(f"Model: {OPENAI_MODEL}")
 print(f"API_KEY present: {bool(OPENAI_API_KEY)}")
 print(f"Base_URL: {OPENAI_BASE_URL}")
-print(f"Context Window Turns: {AI_CONTEXT_WINDOW_TURNS}")
\ No newline at end of file
+print(f"Context Window Turns: {AI_CONTEXT_WINDOW_TURNS}")
+print(f"Database URL: {DATABASE_URL}")
+print(f"DB Pool: size={DB_POOL_SIZE}, max_overflow={DB_MAX_OVERFLOW}")
\ No newline at end of file
@@ -0,0 +1,61 @@
+# 数据版本号：data_versions 表为每个用户的每类数据保存单调递增的版本号
+#
+# crud 写操作通过 bump_on_commit 登记受影响的 (用户, 数据类型)，提交事务前在同一事务中统一递增
+# （见 app/core/database.py 的 commit / unit_of_work），版本号与数据总是一起提交或一起回滚。
+# GET 接口先读取版本号生成 ETag，与 If-None-Match 一致时直接返回 304，不查询也不序列化数据。
+from typing import Dict, Iterable
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# 数据类型
+TASKS = "tasks"
+LONG_TERM_TASKS = "long_term_tasks"
+JOURNALS = "journals"
+SETTINGS = "settings"
+MEMO = "memo"
+AI_CONFIG = "ai_config"
+REMINDERS = "reminders"
+
+# 事务中待递增的 (用户, 数据类型)，保存在 session.info 中
+PENDING_KEY = "data_version_bumps"
+
+BUMP = text(
+    "INSERT INTO data_versions (user_id, resource, version) VALUES (:user_id, :resource, 1) "
+    "ON CONFLICT (user_id, resource) DO UPDATE SET version = version + 1"
+)
+SELECT = text(
+    "SELECT resource, version FROM data_versions WHERE user_id = :user_id AND resource IN :resources"
+).bindparams(bindparam("resources", expanding=True))
+
+
+def bump_on_commit(db: AsyncSession, user_id: int, *resources: str):
+    """登记写操作修改的数据类型，提交前由 apply_bumps 递增版本号"""
+    if user_id is None:
+        return
+    db.info.setdefault(PENDING_KEY, set()).update((user_id, resource) for resource in resources)
+
+
+async def apply_bumps(db: AsyncSession):
+    """在当前事务中递增登记的版本号（提交前调用，一条语句批量执行）"""
+    pending = db.info.pop(PENDING_KEY, None)
+    if pending:
+        await db.execute(BUMP, [{"user_id": user_id, "resource": resource} for user_id, resource in sorted(pending)])
+
+
+def discard_bumps(db: AsyncSession):
+    """事务回滚后丢弃登记"""
+    db.info.pop(PENDING_KEY, None)
+
+
+async def get_versions(db: AsyncSession, user_id: int, resources: Iterable[str]) -> Dict[str, int]:
+    """
+    读取用户各数据类型的当前版本号（一次查询）
+
+    返回:
+        {数据类型: 版本号}，从未写入过的数据类型为 0
+    """
+    resources = list(resources)
+    result = await db.execute(SELECT, {"user_id": user_id, "resources": resources})
+    versions = dict.fromkeys(resources, 0)
+    versions.update(dict(result.all()))
+    return versions
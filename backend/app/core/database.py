@@ -1,14 +1,175 @@
+from contextlib import asynccontextmanager
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.core.cache import apply_invalidations, discard_invalidations
+from app.core.data_versions import apply_bumps, discard_bumps
+from app.core.config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE,
+    SQLITE_MMAP_SIZE,
+)
+
+# 数据库连接 URL (默认使用 sqlite+aiosqlite，可通过环境变量 DATABASE_URL 覆盖)
+SQLALCHEMY_DATABASE_URL = DATABASE_URL
+
+_url = make_url(SQLALCHEMY_DATABASE_URL)
+_is_sqlite = _url.get_backend_name() == "sqlite"
+_is_memory_sqlite = _is_sqlite and _url.database in (None, "", ":memory:")
 
-# 数据库连接 URL (使用 sqlite+aiosqlite)
-SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./task_stream.db"
+# 引擎参数：文件型数据库使用可配置大小的连接池，内存数据库沿用 SQLAlchemy 默认的单连接池
+engine_kwargs = {}
+if _is_sqlite:
+    engine_kwargs["connect_args"] = {"check_same_thread": False}
+if not _is_memory_sqlite:
+    engine_kwargs.update(
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
 
 # 创建异步数据库引擎
-engine = create_async_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, **engine_kwargs)
+
+# 执行选项：为 True 时 SQLite 事务以 BEGIN IMMEDIATE 开始（用于先读后写的会话，见 WriteSessionLocal）
+BEGIN_IMMEDIATE = "sqlite_begin_immediate"
+_PENDING_BEGIN_KEY = "sqlite_pending_begin"
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+# SQLite 连接参数，每个新建的池化连接都会执行一次
+SQLITE_PRAGMAS = {
+    "journal_mode": SQLITE_JOURNAL_MODE,
+    "synchronous": SQLITE_SYNCHRONOUS,
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "cache_size": SQLITE_CACHE_SIZE,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "temp_store": "MEMORY",
+}
+
+if _is_sqlite:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        """
+        在连接建立时应用 SQLite PRAGMA
+        WAL 模式下读写互不阻塞，busy_timeout 让写冲突时等待而不是直接报 database is locked
+        """
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in SQLITE_PRAGMAS.items():
+                if _is_memory_sqlite and name == "journal_mode":
+                    # 内存数据库不支持 WAL
+                    continue
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+        # 关闭驱动自带的隐式事务管理，由下面的事件显式发出 BEGIN
+        # 否则驱动直到第一条写语句才开启事务，SAVEPOINT（begin_nested）会在事务外执行，释放时即被提交
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _begin_sqlite_transaction(conn):
+        # 推迟到事务的第一条语句再发出 BEGIN，按语句类型选择事务模式（见 _emit_sqlite_begin）
+        conn.info[_PENDING_BEGIN_KEY] = True
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _emit_sqlite_begin(conn, cursor, statement, parameters, context, executemany):
+        """
+        发出推迟的 BEGIN
+        第一条语句是写语句或连接带有 BEGIN_IMMEDIATE 执行选项时使用 BEGIN IMMEDIATE，开始时即取得写锁：
+        WAL 下 DEFERRED 事务先读后写时，若其他连接已在其后提交，升级写锁会立即返回 database is locked
+        而不经过 busy_timeout 等待（写 FTS5 索引的触发器也会先读索引结构，单条 INSERT 同样受影响）。
+        只读事务仍使用 BEGIN，不阻塞写入
+        """
+        if not conn.info.pop(_PENDING_BEGIN_KEY, False):
+            return
+        immediate = (conn.get_execution_options().get(BEGIN_IMMEDIATE)
+                     or statement.lstrip()[:7].upper().startswith(_WRITE_PREFIXES))
+        cursor.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+    @event.listens_for(engine.sync_engine, "commit")
+    @event.listens_for(engine.sync_engine, "rollback")
+    def _clear_pending_begin(conn):
+        # 事务中没有执行任何语句时不会发出 BEGIN
+        conn.info.pop(_PENDING_BEGIN_KEY, None)
+
 # 创建异步数据库会话工厂
 SessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+# 写请求的会话：事务开始即取得写锁，先读后写时不会因其他连接的提交而报 database is locked
+# 写锁持有到提交为止，事务中不应等待外部调用（如 AI 接口）
+WriteSessionLocal = async_sessionmaker(autocommit=False, autoflush=False,
+                                       bind=engine.execution_options(**{BEGIN_IMMEDIATE: True}),
+                                       class_=AsyncSession)
 # 创建声明性基类，用于模型定义
 Base = declarative_base()
+
+# 会话处于工作单元中的标记（保存在 session.info 中）
+UNIT_OF_WORK_KEY = "unit_of_work"
+
+
+async def commit(db: AsyncSession):
+    """
+    提交写入操作
+    会话处于工作单元（unit_of_work）中时只 flush，由工作单元在边界处统一提交；
+    否则立即提交，单独调用 crud 函数时行为不变
+    提交前递增本事务登记的数据版本号（见 app/core/data_versions.py），提交后失效登记的读缓存（见 app/core/cache.py）
+    """
+    if db.info.get(UNIT_OF_WORK_KEY):
+        await db.flush()
+    else:
+        await apply_bumps(db)
+        await db.commit()
+        await apply_invalidations(db)
+
+
+@asynccontextmanager
+async def unit_of_work(db: AsyncSession):
+    """
+    工作单元：块内所有 crud 写操作共用一个事务，正常结束时只提交一次，出现异常时回滚
+    SQLite 每次提交都要 fsync，一次请求 / 一次 AI 工具调用应只提交一次
+    可嵌套使用，只有最外层负责提交
+    用法: async with unit_of_work(db): ...
+    """
+    if db.info.get(UNIT_OF_WORK_KEY):
+        yield db
+        return
+    db.info[UNIT_OF_WORK_KEY] = True
+    try:
+        yield db
+    except BaseException:
+        db.info.pop(UNIT_OF_WORK_KEY, None)
+        await db.rollback()
+        discard_bumps(db)
+        discard_invalidations(db)
+        raise
+    db.info.pop(UNIT_OF_WORK_KEY, None)
+    await apply_bumps(db)
+    await db.commit()
+    await apply_invalidations(db)
+
+
+def create_missing_indexes(sync_conn):
+    """
+    为已存在的表补建模型中声明的索引（幂等）
+    create_all 只会在建表时创建索引，旧的数据库文件需要通过此步骤补齐
+    引用了尚未添加的列的索引会被跳过，由添加该列的迁移再次调用本函数补建
+    用法: await conn.run_sync(create_missing_indexes)
+    """
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if all(column.name in existing_columns for column in index.columns):
+                index.create(sync_conn, checkfirst=True)
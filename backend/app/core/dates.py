@@ -0,0 +1,137 @@
+# 日期/时间字符串的规范化
+# 数据库中的日期统一存为可按字典序比较的规范字符串：
+#   日期      YYYY-MM-DD
+#   日期时间  YYYY-MM-DD HH:MM
+#   时间      HH:MM
+# 截止时间另存一份整数时间戳（due_at），用于索引排序和区间比较
+import calendar
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional, Union
+
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+TIME_FORMAT = "%H:%M"
+
+# 兼容 YYYY-M-D、YYYY/MM/DD，以及用空格或 T 分隔的时间部分（秒、毫秒、时区后缀可选）
+_DATETIME_RE = re.compile(
+    r"^\s*(\d{4})[-/](\d{1,2})[-/](\d{1,2})"
+    r"(?:[ T](\d{1,2}):(\d{1,2})(?::(\d{1,2})(?:\.\d+)?)?)?"
+    r"\s*(Z|[+-]\d{2}:?\d{2})?\s*$"
+)
+_TIME_RE = re.compile(r"^\s*(\d{1,2}):(\d{1,2})(?::(\d{1,2})(?:\.\d+)?)?\s*$")
+
+
+def _parse(value: str):
+    """解析日期/日期时间字符串，返回 (datetime, 是否包含时间部分)，无法解析时抛出 ValueError"""
+    match = _DATETIME_RE.match(value)
+    if not match:
+        raise ValueError(f"invalid date: {value!r}")
+    year, month, day, hour, minute, second, tz = match.groups()
+    try:
+        parsed = datetime(
+            int(year), int(month), int(day),
+            int(hour or 0), int(minute or 0), int(second or 0)
+        )
+    except ValueError:
+        raise ValueError(f"invalid date: {value!r}")
+    if tz and hour is not None:
+        # 带时区的时间（如前端 toISOString() 的结果）换算为服务器本地时间
+        if tz == "Z":
+            tzinfo = timezone.utc
+        else:
+            digits = tz[1:].replace(":", "")
+            offset = timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+            tzinfo = timezone(-offset if tz[0] == "-" else offset)
+        parsed = parsed.replace(tzinfo=tzinfo).astimezone().replace(tzinfo=None)
+    return parsed, hour is not None
+
+
+def normalize_date(value: Union[str, date, None]) -> Optional[str]:
+    """
+    规范化为 YYYY-MM-DD，附带的时间部分会被丢弃
+
+    返回:
+        规范日期字符串；None 或空字符串返回 None
+
+    异常:
+        ValueError: 无法解析
+    """
+    if value is None:
+        return None
+    if isinstance(value, date):
+        return value.strftime(DATE_FORMAT)
+    if not value.strip():
+        return None
+    parsed, _ = _parse(value)
+    return parsed.strftime(DATE_FORMAT)
+
+
+def normalize_datetime(value: Union[str, datetime, None], require_time: bool = False) -> Optional[str]:
+    """
+    规范化为 YYYY-MM-DD HH:MM；只有日期部分时保留为 YYYY-MM-DD
+
+    参数:
+        value: 待规范化的值
+        require_time: 为 True 时必须包含时间部分
+
+    返回:
+        规范字符串；None 或空字符串返回 None
+
+    异常:
+        ValueError: 无法解析，或 require_time 时缺少时间部分
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    if not value.strip():
+        return None
+    parsed, has_time = _parse(value)
+    if not has_time:
+        if require_time:
+            raise ValueError(f"missing time: {value!r}")
+        return parsed.strftime(DATE_FORMAT)
+    return parsed.strftime(DATETIME_FORMAT)
+
+
+def normalize_time(value: Optional[str]) -> Optional[str]:
+    """
+    规范化为 HH:MM
+
+    异常:
+        ValueError: 无法解析
+    """
+    if value is None or not value.strip():
+        return None
+    match = _TIME_RE.match(value)
+    if not match:
+        raise ValueError(f"invalid time: {value!r}")
+    try:
+        return time(int(match.group(1)), int(match.group(2))).strftime(TIME_FORMAT)
+    except ValueError:
+        raise ValueError(f"invalid time: {value!r}")
+
+
+def to_epoch(value: Union[str, datetime, None]) -> Optional[int]:
+    """
+    将规范日期/日期时间转换为整数时间戳（秒）
+
+    本地时间按 UTC 换算，只用于排序和比较，不表示真实的 UTC 时刻。
+    只有日期部分的截止时间视为当天结束（23:59:59），与同一天带时间的截止时间排序一致。
+    无法解析时返回 None。
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        parsed, has_time = value, True
+    else:
+        if not value.strip():
+            return None
+        try:
+            parsed, has_time = _parse(value)
+        except ValueError:
+            return None
+    if not has_time:
+        parsed = datetime.combine(parsed.date(), time(23, 59, 59))
+    return calendar.timegm(parsed.timetuple())
@@ -0,0 +1,58 @@
+# ETag 条件请求：内容未变化时返回 304，客户端沿用缓存
+import hashlib
+import json
+from typing import Any, Iterable, Optional
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.data_versions import get_versions
+from app.migrations import LATEST_VERSION
+
+# 带 ETag 的响应要求客户端每次使用缓存前都向服务器验证
+ETAG_CACHE_CONTROL = "private, no-cache"
+
+
+def compute_etag(payload: Any) -> str:
+    """根据响应内容计算弱 ETag（内容相同则 ETag 相同）"""
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return 'W/"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断请求头 If-None-Match 是否命中 ETag（弱比较，支持逗号分隔的多个值和 *）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def version_etag(*parts: Any) -> str:
+    """根据数据版本号和请求参数计算强 ETag（参数相同则 ETag 相同，不需要读取数据本身）"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+async def data_version_etag(db: AsyncSession, user_id: int, resources: Iterable[str], request: Request) -> str:
+    """
+    根据用户相关数据类型的版本号生成 ETag（一次查询）
+    请求路径和查询参数、数据库结构版本也参与计算，迁移改写数据后旧 ETag 自然失效
+    """
+    versions = await get_versions(db, user_id, resources)
+    return version_etag(LATEST_VERSION, user_id, versions, request.url.path,
+                        sorted(request.query_params.multi_items()))
+
+
+def not_modified(if_none_match: Optional[str], etag: str, response: Response) -> Optional[Response]:
+    """If-None-Match 命中时返回 304 响应；否则在 response 上设置 ETag 响应头并返回 None"""
+    headers = {"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
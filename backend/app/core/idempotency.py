@@ -0,0 +1,200 @@
+# 幂等键：写请求（POST / PUT / PATCH / DELETE）带上 Idempotency-Key 请求头时，服务器保存第一次的响应，
+# 客户端因超时、断网重试同一请求时直接返回保存的响应，不会重复创建任务或重复写入。
+#
+# 保存的响应在 idempotency_keys 表中（见 models.IdempotencyKey），超过 IDEMPOTENCY_TTL_SECONDS 后过期，
+# 每次认领新键时顺带清理过期的记录。键按用户区分：查询参数或 JSON 请求体顶层的 user_id 与键、方法、路径
+# 一起确定一条记录，不同用户使用相同的键互不影响；请求中没有 user_id 时（如 PATCH /api/v1/tasks/{id}）
+# 按 user_id = 0 处理。同一个键只能用于同一个请求：查询参数或请求体不同时返回 422；
+# 第一个请求仍在处理中时重试返回 409，客户端稍后再试即可。
+# 5xx 响应、流式响应（AI 对话）和超过 IDEMPOTENCY_MAX_RESPONSE_BYTES 的响应不保存，重试时重新执行。
+#
+# 写操作与保存响应在两个事务中提交：进程在两者之间退出时，占位记录留在表中，重试返回 409，
+# 直到 PENDING_TIMEOUT_SECONDS 后占位记录过期，之后的重试会再次执行该请求（这段时间内的写操作可能重复）。
+import hashlib
+import json
+import time
+from urllib.parse import parse_qs
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_RESPONSE_BYTES
+from app.core.database import engine
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# 响应来自保存的结果时带上该响应头
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+MAX_KEY_LENGTH = 255
+# 请求处理中的占位记录的有效期（秒），进程在处理中途或保存响应之前退出时，超时后同一个键可以重新执行
+PENDING_TIMEOUT_SECONDS = 300
+# 不保存的响应类型
+STREAMING_CONTENT_TYPES = ("text/event-stream", "application/x-ndjson")
+
+DELETE_EXPIRED = text("DELETE FROM idempotency_keys WHERE expires_at <= :now")
+SELECT_KEY = text(
+    "SELECT fingerprint, status_code, content_type, body FROM idempotency_keys "
+    "WHERE user_id = :user_id AND key = :key AND method = :method AND path = :path"
+)
+INSERT_PENDING = text(
+    "INSERT INTO idempotency_keys (user_id, key, method, path, fingerprint, expires_at) "
+    "VALUES (:user_id, :key, :method, :path, :fingerprint, :expires_at)"
+)
+SAVE_RESPONSE = text(
+    "UPDATE idempotency_keys SET status_code = :status_code, content_type = :content_type, body = :body, "
+    "expires_at = :expires_at WHERE user_id = :user_id AND key = :key AND method = :method AND path = :path"
+)
+DELETE_KEY = text(
+    "DELETE FROM idempotency_keys WHERE user_id = :user_id AND key = :key AND method = :method AND path = :path"
+)
+
+
+def _fingerprint(method: str, path: str, query: bytes, body: bytes) -> str:
+    """请求内容的哈希，用于识别同一个键被用在了不同的请求上"""
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query, body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def _request_user_id(query: bytes, body: bytes) -> int:
+    """请求所属的用户：查询参数中的 user_id，其次是 JSON 请求体顶层的 user_id，都没有（或不是整数）时为 0"""
+    values = parse_qs(query.decode("latin-1")).get("user_id")
+    value = values[0] if values else None
+    if value is None and body[:1] == b"{":
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            value = data.get("user_id")
+    try:
+        return int(value) if value is not None and not isinstance(value, bool) else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+async def _claim(params: dict, fingerprint: str):
+    """
+    认领幂等键（一个事务）：清理过期记录（包括超时的占位记录），键已存在时返回已有记录，否则写入处理中的占位记录
+
+    返回:
+        已有记录 (fingerprint, status_code, content_type, body)；认领成功返回 None
+    """
+    now = int(time.time())
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(DELETE_EXPIRED, {"now": now})
+            row = (await conn.execute(SELECT_KEY, params)).first()
+            if row is not None:
+                return tuple(row)
+            await conn.execute(INSERT_PENDING, {**params, "fingerprint": fingerprint,
+                                                "expires_at": now + PENDING_TIMEOUT_SECONDS})
+            return None
+    except IntegrityError:
+        # 并发的相同请求抢先写入了占位记录
+        return fingerprint, None, None, None
+
+
+async def _finish(params: dict, status_code: int = None, content_type: str = None, body: bytes = None):
+    """保存响应；status_code 为空时删除占位记录，之后的重试重新执行"""
+    async with engine.begin() as conn:
+        if status_code is None:
+            await conn.execute(DELETE_KEY, params)
+        else:
+            await conn.execute(SAVE_RESPONSE, {**params, "status_code": status_code, "content_type": content_type,
+                                               "body": body, "expires_at": int(time.time()) + IDEMPOTENCY_TTL_SECONDS})
+
+
+class IdempotencyMiddleware:
+    """为带 Idempotency-Key 请求头的写请求去重（ASGI 中间件，不带该请求头的请求原样通过）"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+        key = None
+        for name, value in scope["headers"]:
+            if name == b"idempotency-key":
+                key = value.decode("latin-1").strip()
+                break
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": f"{IDEMPOTENCY_HEADER} 长度不能超过 {MAX_KEY_LENGTH}"}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        # 读出完整请求体用于计算指纹，之后原样交给应用
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        query = scope.get("query_string", b"")
+        params = {"user_id": _request_user_id(query, body), "key": key, "method": scope["method"], "path": scope["path"]}
+        fingerprint = _fingerprint(scope["method"], scope["path"], query, body)
+        existing = await _claim(params, fingerprint)
+        if existing is not None:
+            stored_fingerprint, status_code, content_type, stored_body = existing
+            if stored_fingerprint != fingerprint:
+                response = JSONResponse({"detail": f"{IDEMPOTENCY_HEADER} 已用于内容不同的请求"}, status_code=422)
+            elif status_code is None:
+                response = JSONResponse({"detail": "相同的请求正在处理中，请稍后重试"}, status_code=409)
+            else:
+                headers = {REPLAYED_HEADER: "true"}
+                if content_type:
+                    headers["content-type"] = content_type
+                response = Response(content=stored_body or b"", status_code=status_code, headers=headers)
+            await response(scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def replay_receive() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        captured = {"status": None, "content_type": None, "body": [], "size": 0, "storable": True}
+
+        async def capture_send(message: Message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-type":
+                        captured["content_type"] = value.decode("latin-1")
+                if (captured["content_type"] or "").startswith(STREAMING_CONTENT_TYPES):
+                    captured["storable"] = False
+            elif message["type"] == "http.response.body" and captured["storable"]:
+                chunk = message.get("body", b"")
+                captured["size"] += len(chunk)
+                if captured["size"] > IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                    captured["storable"] = False
+                    captured["body"] = []
+                else:
+                    captured["body"].append(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await _finish(params)
+            raise
+        if captured["storable"] and captured["status"] is not None and captured["status"] < 500:
+            await _finish(params, captured["status"], captured["content_type"], b"".join(captured["body"]))
+        else:
+            await _finish(params)
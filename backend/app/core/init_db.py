@@ -1,5 +1,15 @@
-# 初始化数据库脚本（可选，根据实际需要迁移）
-from core.database import engine
-from models.models import Base
+# 初始化 / 升级数据库结构（与应用启动时执行的迁移相同）
+# 用法: python -m app.core.init_db
+import asyncio
+from app.core.database import engine
+from app.migrations import run_migrations
 
-Base.metadata.create_all(bind=engine)
+
+async def main():
+    version = await run_migrations(engine)
+    print(f"Database schema version: {version}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,36 @@
+# 键集分页（keyset pagination）游标的编码与解码
+# 游标是排序键取值列表的 URL 安全 base64 编码，对客户端不透明
+import base64
+import json
+from typing import Any, List, Optional
+
+# 下一页游标通过该响应头返回，响应体保持原有的列表格式
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+    """
+    解码游标
+
+    参数:
+        cursor: 客户端传回的游标，为空时返回 None
+        size: 排序键的个数
+
+    异常:
+        ValueError: 游标格式无效
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError):
+        raise ValueError("invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("invalid cursor")
+    return values
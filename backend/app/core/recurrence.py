@@ -0,0 +1,254 @@
+# 重复任务规则（iCalendar RRULE 的子集）的解析与按日期窗口展开
+#
+# 规则字符串形如 FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;UNTIL=20261231，支持：
+#   FREQ        DAILY / WEEKLY / MONTHLY
+#   INTERVAL    每隔几个周期发生一次（默认 1）
+#   BYDAY       星期（MO TU WE TH FR SA SU，逗号分隔）：WEEKLY 时为每周发生的日子（默认为开始日期的星期），
+#               DAILY 时只保留这些星期的发生日；MONTHLY 不支持
+#   BYMONTHDAY  每月的第几天（1~31，负数从月底倒数，-1 为最后一天），仅 MONTHLY（默认为开始日期的日），
+#               当月没有的日期（如 2 月 30 日）跳过
+#   COUNT       共发生几次（不超过 MAX_COUNT），与 UNTIL 不能同时出现
+#   UNTIL       最后日期（含），YYYYMMDD 或 YYYY-MM-DD
+# 也接受简写 daily / weekly / monthly。规则保存为规范形式（见 RecurrenceRule.__str__）。
+#
+# 数据库中每条重复任务只有一行规则（models.TaskRecurrence），发生日在查询时按日期窗口展开；
+# 某天的发生日被完成或编辑时才写入一行普通任务（recurrence_id + occurrence_date）覆盖该天，
+# 被删除的发生日记在规则的 exdates 中。未覆盖的发生日使用由规则 ID 和日期编码的负数任务 ID
+# （见 occurrence_task_id），任务接口收到这样的 ID 时再写入覆盖行。
+from datetime import date, timedelta
+from typing import Iterable, Iterator, Optional, Tuple
+from app.core.dates import normalize_date
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+SHORTHANDS = {"daily": "FREQ=DAILY", "weekly": "FREQ=WEEKLY", "monthly": "FREQ=MONTHLY"}
+RULE_PARTS = ("FREQ", "INTERVAL", "BYDAY", "BYMONTHDAY", "COUNT", "UNTIL")
+
+MAX_COUNT = 3660
+MAX_INTERVAL = 1000
+
+# 发生日的负数任务 ID：-(规则ID * OCCURRENCE_ID_BASE + 距 1970-01-01 的天数)
+OCCURRENCE_EPOCH = date(1970, 1, 1)
+OCCURRENCE_ID_BASE = 100000
+# 展开的上限日期，保证天数小于 OCCURRENCE_ID_BASE
+MAX_DATE = date(2199, 12, 31)
+
+
+def occurrence_task_id(recurrence_id: int, day: str) -> int:
+    """未覆盖的发生日对应的任务 ID（负数）"""
+    return -(recurrence_id * OCCURRENCE_ID_BASE + (date.fromisoformat(day) - OCCURRENCE_EPOCH).days)
+
+
+def parse_occurrence_task_id(task_id: int) -> Optional[Tuple[int, str]]:
+    """
+    解析发生日的任务 ID
+
+    返回:
+        (规则ID, YYYY-MM-DD)；普通任务的 ID 返回 None
+    """
+    if task_id >= 0:
+        return None
+    recurrence_id, days = divmod(-task_id, OCCURRENCE_ID_BASE)
+    if recurrence_id <= 0:
+        return None
+    return recurrence_id, (OCCURRENCE_EPOCH + timedelta(days=days)).isoformat()
+
+
+def _positive_int(value: str, name: str, maximum: int) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"invalid {name}: {value!r}")
+    if number < 1 or number > maximum:
+        raise ValueError(f"{name} must be between 1 and {maximum}")
+    return number
+
+
+def _parse_until(value: str) -> date:
+    if len(value) >= 8 and value[:8].isdigit():
+        # RRULE 的 YYYYMMDD[THHMMSSZ] 形式，时间部分忽略
+        try:
+            return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+        except ValueError:
+            raise ValueError(f"invalid UNTIL: {value!r}")
+    return date.fromisoformat(normalize_date(value))
+
+
+class RecurrenceRule:
+    """解析后的重复规则，start 为开始日期（第一个可能的发生日）"""
+
+    def __init__(self, freq: str, start: date, interval: int = 1, byday: Optional[Iterable[int]] = None,
+                 bymonthday: Optional[Iterable[int]] = None, count: Optional[int] = None,
+                 until: Optional[date] = None):
+        self.freq = freq
+        self.start = start
+        self.interval = interval
+        self.byday = tuple(sorted(set(byday))) if byday else None
+        self.bymonthday = tuple(sorted(set(bymonthday))) if bymonthday else None
+        self.count = count
+        self.until = until
+
+    def __str__(self) -> str:
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.byday:
+            parts.append("BYDAY=" + ",".join(WEEKDAYS[d] for d in self.byday))
+        if self.bymonthday:
+            parts.append("BYMONTHDAY=" + ",".join(str(d) for d in self.bymonthday))
+        if self.count:
+            parts.append(f"COUNT={self.count}")
+        if self.until:
+            parts.append("UNTIL=" + self.until.strftime("%Y%m%d"))
+        return ";".join(parts)
+
+    def _candidates(self, lower: date, upper: date) -> Iterator[date]:
+        """按时间顺序生成 [lower, upper] 内符合 FREQ / INTERVAL / BYDAY / BYMONTHDAY 的日期（不考虑 COUNT）"""
+        lower = max(lower, self.start)
+        if lower > upper:
+            return
+        if self.freq == "DAILY":
+            steps = -(-(lower - self.start).days // self.interval)
+            day = self.start + timedelta(days=steps * self.interval)
+            while day <= upper:
+                if self.byday is None or day.weekday() in self.byday:
+                    yield day
+                day += timedelta(days=self.interval)
+        elif self.freq == "WEEKLY":
+            weekdays = self.byday or (self.start.weekday(),)
+            first_monday = self.start - timedelta(days=self.start.weekday())
+            weeks = (lower - first_monday).days // 7
+            monday = first_monday + timedelta(weeks=-(-weeks // self.interval) * self.interval)
+            while monday <= upper:
+                for weekday in weekdays:
+                    day = monday + timedelta(days=weekday)
+                    if day > upper:
+                        return
+                    if day >= lower:
+                        yield day
+                monday += timedelta(weeks=self.interval)
+        else:
+            monthdays = self.bymonthday or (self.start.day,)
+            first_month = self.start.year * 12 + self.start.month - 1
+            months = lower.year * 12 + lower.month - 1 - first_month
+            month = first_month + -(-months // self.interval) * self.interval
+            while True:
+                year, month_index = divmod(month, 12)
+                month_start = date(year, month_index + 1, 1)
+                if month_start > upper:
+                    return
+                last_day = ((month_start + timedelta(days=31)).replace(day=1) - timedelta(days=1)).day
+                days = sorted({d if d > 0 else last_day + 1 + d for d in monthdays if -last_day <= d <= last_day})
+                for day_of_month in days:
+                    day = month_start.replace(day=day_of_month)
+                    if day > upper:
+                        return
+                    if day >= lower:
+                        yield day
+                month += self.interval
+
+    def occurrences(self, window_start: date, window_end: date, exdates: Iterable[str] = ()) -> Iterator[date]:
+        """
+        按时间顺序生成 [window_start, window_end] 内的发生日，跳过 exdates（YYYY-MM-DD）
+        COUNT 按 RFC 5545 计算：被跳过的日期同样计入次数
+        """
+        upper = min(window_end, self.until or MAX_DATE, MAX_DATE)
+        skipped = set(exdates)
+        if self.count:
+            # 需要从开始日期数起；次数不超过 MAX_COUNT
+            for index, day in enumerate(self._candidates(self.start, upper)):
+                if index >= self.count:
+                    return
+                if day >= window_start and day.isoformat() not in skipped:
+                    yield day
+            return
+        for day in self._candidates(window_start, upper):
+            if day.isoformat() not in skipped:
+                yield day
+
+    def occurs_on(self, day: date) -> bool:
+        """day 是否为发生日（不考虑 exdates）"""
+        return next(self.occurrences(day, day), None) is not None
+
+    def last_date(self) -> Optional[date]:
+        """最后一个发生日；规则不结束时返回 None"""
+        if self.count:
+            last = None
+            for last in self.occurrences(self.start, MAX_DATE):
+                pass
+            return last
+        return self.until
+
+
+def parse_rule(text: str, start: str) -> RecurrenceRule:
+    """
+    解析重复规则
+
+    参数:
+        text: 规则字符串（RRULE 子集或 daily / weekly / monthly 简写，可带 RRULE: 前缀）
+        start: 开始日期
+
+    异常:
+        ValueError: 规则无效、不受支持或没有任何发生日
+    """
+    start_date = normalize_date(start)
+    if not start_date:
+        raise ValueError("start_date is required")
+    start_day = date.fromisoformat(start_date)
+    if start_day < OCCURRENCE_EPOCH or start_day > MAX_DATE:
+        raise ValueError(f"start_date must be between {OCCURRENCE_EPOCH} and {MAX_DATE}")
+
+    text = (text or "").strip()
+    text = SHORTHANDS.get(text.lower(), text)
+    if text.upper().startswith("RRULE:"):
+        text = text[6:]
+    parts = {}
+    for part in text.split(";"):
+        if not part.strip():
+            continue
+        name, sep, value = part.partition("=")
+        name = name.strip().upper()
+        if not sep or not value.strip():
+            raise ValueError(f"invalid rule part: {part!r}")
+        if name not in RULE_PARTS:
+            raise ValueError(f"unsupported rule part: {name}")
+        if name in parts:
+            raise ValueError(f"duplicate rule part: {name}")
+        parts[name] = value.strip().upper()
+
+    freq = parts.get("FREQ")
+    if freq not in FREQUENCIES:
+        raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+    interval = _positive_int(parts.get("INTERVAL", "1"), "INTERVAL", MAX_INTERVAL)
+
+    byday = None
+    if "BYDAY" in parts:
+        if freq == "MONTHLY":
+            raise ValueError("BYDAY is not supported with FREQ=MONTHLY")
+        try:
+            byday = [WEEKDAYS.index(d.strip()) for d in parts["BYDAY"].split(",")]
+        except ValueError:
+            raise ValueError(f"invalid BYDAY: {parts['BYDAY']!r}")
+
+    bymonthday = None
+    if "BYMONTHDAY" in parts:
+        if freq != "MONTHLY":
+            raise ValueError("BYMONTHDAY is only supported with FREQ=MONTHLY")
+        try:
+            bymonthday = [int(d) for d in parts["BYMONTHDAY"].split(",")]
+        except ValueError:
+            raise ValueError(f"invalid BYMONTHDAY: {parts['BYMONTHDAY']!r}")
+        if any(d == 0 or not -31 <= d <= 31 for d in bymonthday):
+            raise ValueError("BYMONTHDAY must be between 1 and 31 or -31 and -1")
+
+    if "COUNT" in parts and "UNTIL" in parts:
+        raise ValueError("COUNT and UNTIL must not both be set")
+    count = _positive_int(parts["COUNT"], "COUNT", MAX_COUNT) if "COUNT" in parts else None
+    until = _parse_until(parts["UNTIL"]) if "UNTIL" in parts else None
+    if until is not None and until < start_day:
+        raise ValueError("UNTIL must not be earlier than start_date")
+
+    rule = RecurrenceRule(freq, start_day, interval, byday, bymonthday, count, until)
+    if next(rule.occurrences(start_day, MAX_DATE), None) is None:
+        raise ValueError("rule has no occurrences")
+    return rule
@@ -1,10 +1,11 @@
 # 导入FastAPI核心组件：FastAPI应用实例、依赖注入、HTTP异常处理
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Header, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 # 导入SQLAlchemy的异步会话对象，用于数据库交互
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
 # 导入类型注解：列表、可选类型
 from typing import List, Optional
+import json
 
 # 导入项目内部模块：
 # models：数据库模型定义（表结构）
@@ -12,9 +13,17 @@ from typing import List, Optional
 # crud：数据库CRUD操作封装（增删改查逻辑）
 from app.models import models
 from app.schemas import schemas
-from app.services import crud
+from app.services import crud, search_service, sync_service
 # 导入数据库配置：SessionLocal（数据库会话生成器）、engine（数据库连接引擎）
-from app.core.database import SessionLocal, engine
+from app.core.database import SessionLocal, WriteSessionLocal, engine
+from app.migrations import run_migrations
+from app.services.daily_stats import sync_daily_stats
+from app.core.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from app.core.dates import normalize_date
+from app.core.etag import ETAG_CACHE_CONTROL, compute_etag, etag_matches, data_version_etag, not_modified
+from app.core import data_versions
+from app.core.cache import cache, mark_snapshot
+from app.core.idempotency import IdempotencyMiddleware, MUTATING_METHODS, REPLAYED_HEADER
 from app.services.auth import router as auth_router
 
 from contextlib import asynccontextmanager
@@ -22,24 +31,20 @@ from contextlib import asynccontextmanager
 # 定义异步初始化逻辑
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 创建所有数据库表（如果表不存在）
-    # 使用异步引擎的 run_sync 方法运行同步的 create_all
-    async with engine.begin() as conn:
-        await conn.run_sync(models.Base.metadata.create_all)
-        
-        # 检查并更新 ai_configs 表结构
-        try:
-            result = await conn.execute(text("PRAGMA table_info(ai_configs)"))
-            cols = [row[1] for row in result.fetchall()]
-            if "openai_base_url" not in cols:
-                await conn.execute(text("ALTER TABLE ai_configs ADD COLUMN openai_base_url TEXT"))
-        except Exception:
-            pass
+    # 执行数据库迁移（结构版本已是最新时只做一次版本查询）
+    await run_migrations(engine)
+    # 按配置创建或删除每日统计表的维护触发器
+    await sync_daily_stats(engine)
     yield
+    # 关闭连接池中的所有连接
+    await engine.dispose()
 
 # 初始化FastAPI应用实例，设置API标题和生命周期管理
 app = FastAPI(title="Task Stream API", lifespan=lifespan)
 
+# 写请求的 Idempotency-Key 去重（先添加，位于 CORS 中间件内层）
+app.add_middleware(IdempotencyMiddleware)
+
 # 导入并配置CORS中间件（跨域资源共享）
 from fastapi.middleware.cors import CORSMiddleware
 app.add_middleware(
@@ -53,43 +58,135 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", REPLAYED_HEADER],
 )
 
 
 # 定义数据库会话依赖项：每次请求时创建新会话，请求结束后关闭
-async def get_db():
+# 写请求使用 WriteSessionLocal（事务开始即取得写锁），读请求不阻塞写入
+async def get_db(request: Request):
     # 创建异步数据库会话实例
-    async with SessionLocal() as db:
+    session_factory = WriteSessionLocal if request.method in MUTATING_METHODS else SessionLocal
+    async with session_factory() as db:
+        # 在第一条查询之前记下读缓存的失效序号（见 app/core/cache.py）
+        await mark_snapshot(db)
         # 使用yield将会话对象提供给依赖它的路由函数
         yield db
 
+def _parse_fields(fields: Optional[str], allowed: tuple) -> Optional[List[str]]:
+    """解析列表接口的 fields 参数，包含不支持的字段时返回 400"""
+    try:
+        return crud.parse_fields(fields, allowed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid fields: {e}")
+
+def _sparse_response(items, selected: Optional[List[str]], response: Optional[Response] = None):
+    """指定了 fields 时结果是部分字段的字典，直接返回 JSON（跳过 response_model 的完整校验）"""
+    if not selected:
+        return items
+    headers = dict(response.headers) if response is not None else None
+    if headers:
+        headers.pop("content-length", None)
+    return JSONResponse(content=items, headers=headers)
+
+# 任务和长期任务的列表互相内嵌（任务带所属长期任务，长期任务带子任务），ETag 同时取决于两者的版本号
+TASK_LIST_RESOURCES = (data_versions.TASKS, data_versions.LONG_TERM_TASKS)
+
 # ------------------------------ 任务相关接口 ------------------------------
 # GET请求：获取急需处理任务列表
 @app.get("/api/v1/tasks/urgent")
-async def get_urgent_tasks(user_id: int, db: AsyncSession = Depends(get_db)):
+async def get_urgent_tasks(
+    user_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    within_days: Optional[float] = Query(None, ge=0),
+    sort: str = Query("due", pattern="^(due|score)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取指定用户的急需处理任务（长期+短期）
+    参数：user_id 用户ID；limit 最多返回条数；within_days 只返回截止时间在多少天内的任务（含已逾期）；
+         sort=due 按截止时间升序，sort=score 按紧急度（剩余工作量与剩余时间之比）降序
+    返回：[{id, title, due_date, type, progress, score}]
     """
-    获取指定用户的所有急需处理任务（长期+短期，按截止时间升序）
-    参数：user_id 用户ID
-    返回：[{id, title, due_date, type}]
+    return await crud.get_urgent_tasks(user_id, db, limit, within_days, sort)
+
+# GET请求：获取标签统计（标签云）
+@app.get("/api/v1/tasks/tags")
+async def get_task_tag_counts(user_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    获取指定用户每个标签下的任务数
+    返回：[{tag, count}]，按任务数降序
     """
-    return await crud.get_urgent_tasks(user_id, db)
+    return await crud.get_tag_counts(user_id, db)
 
-# GET请求：获取任务列表（支持日期范围筛选）
+# GET请求：获取任务列表（支持日期范围筛选、键集分页和 NDJSON 流式返回）
 @app.get("/api/v1/tasks/", response_model=List[schemas.Task])
 async def read_tasks(
     user_id: int,
+    request: Request,
+    response: Response,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    tag_mode: str = Query("any", pattern="^(any|all)$"),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    获取指定用户的任务列表。
-    如果提供了 start_date 和 end_date，则返回该日期范围内的任务。
+    获取指定用户的任务列表，按 (assigned_date, id) 升序排列。
+    如果提供了 start_date 和 end_date，则返回该日期范围内的任务（含按规则展开的重复任务发生日）。
     否则返回该用户的所有任务。
-    """
+    tags 可重复传入（?tags=a&tags=b）按标签筛选，tag_mode=any 匹配任一标签，all 需包含全部标签。
+    传入 limit 时分页返回，下一页游标通过 X-Next-Cursor 响应头返回，请求下一页时作为 cursor 参数传回。
+    format=ndjson 时以 application/x-ndjson 逐行流式返回全部结果（可配合 cursor 从指定位置开始）。
+    分页和流式返回只包含 tasks 表中的任务（含已编辑或完成的发生日的覆盖行），不展开重复任务未覆盖的发生日，
+    需要发生日时不带 limit / cursor 按日期范围请求，或通过 GET /api/v1/recurrences 获取规则后在客户端展开。
+    fields 为逗号分隔的字段名（如 fields=id,title,status）时只返回这些字段（id 总是返回），不返回关联的长期任务。
+    JSON 格式的响应带有 ETag，任务和长期任务数据都未变化时（If-None-Match 一致）返回 304。
+    """
+    selected = _parse_fields(fields, crud.TASK_FIELDS)
+    try:
+        after = decode_cursor(cursor, 2)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if after is not None and not (isinstance(after[0], (str, type(None))) and isinstance(after[1], int)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    after = tuple(after) if after else None
     if start_date and end_date:
-        return await crud.get_tasks_in_date_range(start_date, end_date, user_id, db)
-    return await crud.get_all_tasks_for_user(user_id, db)
+        try:
+            normalize_date(start_date), normalize_date(end_date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date")
+
+    if format == "ndjson":
+        async def ndjson_lines():
+            # 流式响应在路由函数返回后才开始迭代，使用独立的会话
+            async with SessionLocal() as stream_db:
+                async for task in crud.stream_tasks(user_id, stream_db, after, start_date, end_date,
+                                                    tags, tag_mode, selected):
+                    if selected:
+                        yield json.dumps(task, ensure_ascii=False, separators=(",", ":")) + "\n"
+                    else:
+                        yield task.model_dump_json() + "\n"
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+    unchanged = not_modified(if_none_match, await data_version_etag(db, user_id, TASK_LIST_RESOURCES, request), response)
+    if unchanged is not None:
+        return unchanged
+    if limit is not None or after is not None:
+        tasks, next_after = await crud.get_tasks_page(user_id, limit or 100, db, after, start_date, end_date,
+                                                      tags, tag_mode, selected)
+        if limit is not None and next_after is not None:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*next_after)
+    elif start_date and end_date:
+        tasks = await crud.get_tasks_in_date_range(start_date, end_date, user_id, db, tags, tag_mode, selected)
+    else:
+        tasks = await crud.get_all_tasks_for_user(user_id, db, tags, tag_mode, selected)
+    return _sparse_response(tasks, selected, response)
 
 @app.post("/api/v1/tasks/", response_model=schemas.Task)
 async def create_task(
@@ -98,6 +195,19 @@ async def create_task(
 ):
     return await crud.create_task(task, db)
 
+# POST请求：批量创建/更新/删除任务（同一事务）
+@app.post("/api/v1/tasks/batch", response_model=List[schemas.TaskBatchResult], response_model_exclude_none=True)
+async def batch_tasks(
+    batch: schemas.TaskBatchRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    在一个事务中执行多个任务操作，例如日历中拖动一周的任务或批量完成当天任务
+    operations: [{op: create|update|delete, task_id, task}]，update 的 task 与 PATCH /tasks/{task_id} 的请求体相同，只写入出现的字段
+    返回：每个操作的结果 [{index, op, success, task_id, error}]，单个操作失败不影响其他操作
+    """
+    return await crud.batch_task_operations(batch.operations, db)
+
 @app.get("/api/v1/tasks/{task_id}", response_model=schemas.Task)
 async def get_task_by_id(
     task_id: int,
@@ -137,17 +247,98 @@ async def update_task(
         raise HTTPException(status_code=404, detail="Task not found")
     return {"success": True}
 
+# PATCH请求：部分更新指定ID的普通任务
+@app.patch("/api/v1/tasks/{task_id}")
+async def patch_task(
+    task_id: int,
+    patch: schemas.TaskPatch,   # 请求体：只包含需要修改的字段
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    部分更新指定ID的普通任务，未出现在请求体中的字段保持不变
+    """
+    success = await crud.patch_task(task_id, patch, db)
+    if not success:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return {"success": True}
+
+# ------------------------------ 重复任务相关接口 ------------------------------
+# 每条重复任务只保存一行规则，GET /api/v1/tasks/ 按日期范围查询时展开其中的发生日（负数 ID）；
+# 对发生日的 PATCH / PUT 会写入该天的覆盖行，DELETE 把该天记入 exdates
+@app.get("/api/v1/recurrences", response_model=List[schemas.TaskRecurrence])
+async def read_recurrences(user_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    获取指定用户的全部重复任务规则
+    """
+    return await crud.get_recurrences(user_id, db)
+
+@app.post("/api/v1/recurrences", response_model=schemas.TaskRecurrence)
+async def create_recurrence(
+    recurrence: schemas.TaskRecurrenceCreate,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    创建重复任务，rule 为 daily / weekly / monthly 或 RRULE 子集（如 FREQ=WEEKLY;BYDAY=MO,WE,FR;UNTIL=20261231）
+    """
+    try:
+        return await crud.create_recurrence(recurrence, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid rule: {e}")
+
+@app.get("/api/v1/recurrences/{recurrence_id}", response_model=schemas.TaskRecurrence)
+async def read_recurrence(recurrence_id: int, db: AsyncSession = Depends(get_db)):
+    recurrence = await crud.get_recurrence_by_id(recurrence_id, db)
+    if not recurrence:
+        raise HTTPException(status_code=404, detail="Recurrence not found")
+    return recurrence
+
+@app.patch("/api/v1/recurrences/{recurrence_id}", response_model=schemas.TaskRecurrence)
+async def patch_recurrence(
+    recurrence_id: int,
+    patch: schemas.TaskRecurrencePatch,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    部分更新重复任务，只影响尚未完成或编辑过的发生日
+    """
+    try:
+        recurrence = await crud.patch_recurrence(recurrence_id, patch, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid rule: {e}")
+    if not recurrence:
+        raise HTTPException(status_code=404, detail="Recurrence not found")
+    return recurrence
+
+@app.delete("/api/v1/recurrences/{recurrence_id}")
+async def delete_recurrence(recurrence_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    删除重复任务，已完成或编辑过的发生日保留为普通任务
+    """
+    if not await crud.delete_recurrence(recurrence_id, db):
+        raise HTTPException(status_code=404, detail="Recurrence not found")
+    return {"success": True}
+
 # ------------------------------ 长期任务相关接口 ------------------------------
 # GET请求：获取指定用户的所有长期任务
 @app.get("/api/v1/long-term-tasks", response_model=List[schemas.LongTermTask])
 async def read_all_long_term_tasks(
     user_id: int,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db)
 ):
     """
     获取指定用户的所有长期任务
+    fields 为逗号分隔的字段名时只返回这些字段（id 总是返回），sub_task_ids 只读取关联表，不返回 subtasks
+    响应带有 ETag，数据未变化时返回 304
     """
-    return await crud.get_all_long_term_tasks(user_id, db)
+    selected = _parse_fields(fields, crud.LONG_TERM_TASK_FIELDS)
+    unchanged = not_modified(if_none_match, await data_version_etag(db, user_id, TASK_LIST_RESOURCES, request), response)
+    if unchanged is not None:
+        return unchanged
+    return _sparse_response(await crud.get_all_long_term_tasks(user_id, db, selected), selected, response)
 
 @app.post("/api/v1/long-term-tasks", response_model=schemas.LongTermTask)
 async def create_long_term_task(
@@ -170,12 +361,33 @@ async def delete_long_term_task(
 @app.get("/api/v1/long-term-tasks/uncompleted", response_model=List[schemas.LongTermTask])
 async def read_all_uncompleted_long_term_tasks(
     user_id: int,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db)
 ):
     """
     获取指定用户的所有未完成长期任务
+    fields 和 ETag 的用法同 GET /api/v1/long-term-tasks
+    """
+    selected = _parse_fields(fields, crud.LONG_TERM_TASK_FIELDS)
+    unchanged = not_modified(if_none_match, await data_version_etag(db, user_id, TASK_LIST_RESOURCES, request), response)
+    if unchanged is not None:
+        return unchanged
+    return _sparse_response(await crud.get_all_uncompleted_long_term_tasks(user_id, db, selected), selected, response)
+
+# POST请求：全量重新计算指定用户所有长期任务的进度（修复增量维护的汇总值）
+@app.post("/api/v1/long-term-tasks/repair-progress")
+async def repair_long_term_task_progress(
+    user_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    根据子任务状态和权重重新计算长期任务进度，返回被修正的长期任务数
     """
-    return await crud.get_all_uncompleted_long_term_tasks(user_id, db)
+    repaired = await crud.repair_long_term_task_progress(user_id, db)
+    return {"success": True, "repaired": repaired}
 
 # GET请求：获取指定ID的长期任务
 @app.get("/api/v1/long-term-tasks/{task_id}", response_model=schemas.LongTermTask)
@@ -211,7 +423,42 @@ async def update_long_term_task(
         raise HTTPException(status_code=404, detail="Long term task not found")
     return {"success": True}
 
+# PATCH请求：部分更新指定ID的长期任务
+@app.patch("/api/v1/long-term-tasks/{task_id}")
+async def patch_long_term_task(
+    task_id: int,
+    patch: schemas.LongTermTaskPatch,   # 请求体：只包含需要修改的字段
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    部分更新指定ID的长期任务，未出现在请求体中的字段保持不变
+    """
+    success = await crud.patch_long_term_task(task_id, patch, db)
+    if not success:
+        raise HTTPException(status_code=404, detail="Long term task not found")
+    return {"success": True}
+
 # ------------------------------ 日记相关接口 ------------------------------
+# GET请求：获取指定日期范围内的日记列表
+@app.get("/api/v1/journals", response_model=List[schemas.Journal])
+async def read_journals(
+    user_id: int,
+    start_date: str,        # 查询参数：开始日期 YYYY-MM-DD（含）
+    end_date: str,          # 查询参数：结束日期 YYYY-MM-DD（含）
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取指定用户一段时间内的日记，按日期升序
+    fields 为逗号分隔的字段名时只返回这些字段（date 总是返回），例如 fields=date 不读取日记正文
+    """
+    selected = _parse_fields(fields, crud.JOURNAL_FIELDS)
+    try:
+        journals = await crud.get_journals_in_date_range(start_date, end_date, user_id, db, selected)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    return _sparse_response(journals, selected)
+
 # GET请求：获取指定用户指定月份的所有有日志的日期
 @app.get("/api/v1/journals/dates")
 async def get_journal_dates(
@@ -249,7 +496,10 @@ async def read_journal(
     """
     获取指定用户指定日期的日记
     """
-    return await crud.get_journal_by_date(date, user_id, db)
+    try:
+        return await crud.get_journal_by_date(date, user_id, db)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
 
 # 定义日记更新的Pydantic模型
 from pydantic import BaseModel
@@ -267,7 +517,10 @@ async def update_journal_content_endpoint(
     """
     更新指定用户指定日期的日记内容
     """
-    success = await crud.update_journal_content(date, update.content, update.user_id, db)
+    try:
+        success = await crud.update_journal_content(date, update.content, update.user_id, db)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
     return {"success": success}
 
 # ------------------------------ 热力图相关接口 ------------------------------
@@ -283,15 +536,67 @@ async def read_heatmap_data(
     """
     return await crud.get_heatmap_data(year, month, user_id, db)
 
+# GET请求：获取一整年或任意日期范围的热力图数据（一次请求）
+@app.get("/api/v1/stats/heatmap/range", response_model=schemas.HeatmapRange)
+async def read_heatmap_range(
+    user_id: int,
+    year: Optional[int] = None,         # 查询参数：年份，提供时返回整年
+    start_date: Optional[str] = None,   # 查询参数：开始日期 YYYY-MM-DD（含）
+    end_date: Optional[str] = None,     # 查询参数：结束日期 YYYY-MM-DD（含）
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取指定用户一段时间内每天的完成数和热力等级，热力等级按整个范围统一划分
+    """
+    if year is not None:
+        start_date, end_date = f"{year:04d}-01-01", f"{year:04d}-12-31"
+    if not start_date or not end_date:
+        raise HTTPException(status_code=400, detail="year or start_date and end_date are required")
+    try:
+        return await crud.get_heatmap_range(start_date, end_date, user_id, db)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date range")
+
+# ------------------------------ 月历相关接口 ------------------------------
+# GET请求：一次获取月历所需的日记标记、热力等级和任务数（支持 ETag 条件请求）
+@app.get("/api/v1/calendar/{year}/{month}", response_model=schemas.CalendarMonth)
+async def read_calendar_month(
+    year: int,
+    month: int,
+    user_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取指定用户指定年月每天的日记标记、热力等级和任务数
+    数据未变化时（If-None-Match 与 ETag 一致）返回 304
+    """
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="Invalid month")
+    data = await crud.get_calendar_month(year, month, user_id, db)
+    etag = compute_etag(data)
+    headers = {"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return data
+
 # ------------------------------ 设置相关接口 ------------------------------
 @app.get("/api/v1/settings/{user_id}", response_model=Optional[schemas.Settings])
 async def read_settings(
     user_id: int,
+    request: Request,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    获取指定用户的设置
+    获取指定用户的设置（带 ETag，未变化时返回 304）
     """
+    unchanged = not_modified(if_none_match, await data_version_etag(db, user_id, (data_versions.SETTINGS,), request), response)
+    if unchanged is not None:
+        return unchanged
     return await crud.get_settings_by_user_id(user_id, db)
 
 @app.post("/api/v1/settings", response_model=schemas.Settings)
@@ -326,11 +631,17 @@ async def update_settings(
 @app.get("/api/v1/memos/{user_id}", response_model=Optional[schemas.Memo])
 async def read_memo(
     user_id: int,
+    request: Request,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    获取指定用户的备忘录
+    获取指定用户的备忘录（带 ETag，未变化时返回 304）
     """
+    unchanged = not_modified(if_none_match, await data_version_etag(db, user_id, (data_versions.MEMO,), request), response)
+    if unchanged is not None:
+        return unchanged
     return await crud.get_memo(user_id, db)
 
 @app.put("/api/v1/memos/{user_id}", response_model=schemas.Memo)
@@ -344,6 +655,110 @@ async def update_memo(
     """
     return await crud.update_memo(user_id, memo.content, db)
 
+# ------------------------------ 提醒相关接口 ------------------------------
+@app.get("/api/v1/reminders", response_model=schemas.ReminderChanges, response_model_exclude_none=True)
+async def read_reminders(
+    user_id: int,
+    since: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取提醒
+    不传 since 时返回全部未删除的提醒；传入上次返回的 sync_token 时只返回之后变更的提醒（含 deleted=True 的已删除提醒）
+    sync_token 为同步修订号而非时间戳，旧版本客户端保存的毫秒时间戳会触发一次全量返回
+    """
+    return await crud.get_reminder_changes(user_id, since, db)
+
+@app.post("/api/v1/reminders", response_model=schemas.Reminder, response_model_exclude_none=True)
+async def create_reminder(
+    reminder: schemas.ReminderCreate,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    新增一条提醒
+    """
+    try:
+        return await crud.add_reminder(reminder.user_id, reminder.dict(exclude={"user_id"}, exclude_none=True), db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/api/v1/reminders/{reminder_id}")
+async def delete_reminder(
+    reminder_id: int,
+    user_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    删除一条提醒
+    """
+    success = await crud.delete_reminder(user_id, reminder_id, db)
+    if not success:
+        raise HTTPException(status_code=404, detail="Reminder not found")
+    return {"success": True}
+
+# ------------------------------ 搜索相关接口 ------------------------------
+@app.get("/api/v1/search", response_model=List[schemas.SearchResult])
+async def search(
+    user_id: int,
+    q: str,
+    response: Response,
+    types: Optional[List[str]] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    全文检索任务、日记、备忘录和 AI 对话
+    types 可重复传入（?types=task&types=journal）限定来源；结果按相关度排序，
+    还有更多结果时通过 X-Next-Cursor 响应头返回下一页游标
+    """
+    try:
+        position = decode_cursor(cursor, 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    offset = position[0] if position else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    results = await search_service.search(db, user_id, q, types, limit + 1, offset)
+    if len(results) > limit:
+        results = results[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(offset + limit)
+    return results
+
+# ------------------------------ 增量同步接口 ------------------------------
+@app.get("/api/v1/sync", response_model=schemas.SyncChanges)
+async def sync_changes(
+    user_id: int,
+    since: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    返回修订号 since 之后变更的任务、长期任务、日记、备忘录、设置和提醒，以及被删除记录的墓碑
+    不传 since 时返回全部数据；客户端保存响应中的 revision，下次作为 since 传回
+    """
+    return await sync_service.get_changes(db, user_id, since)
+
+@app.post("/api/v1/sync/replay", response_model=schemas.ReplayResponse)
+async def sync_replay(
+    replay: schemas.ReplayRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    重放客户端离线时排队的修改（同一事务，按顺序执行）
+    mutations: [{type: task|long_term_task|journal|memo, op: create|update|delete, id, date, base_rev, data}]
+    base_rev 与服务器上记录的 rev 不一致时该修改不执行，返回 conflict 以及服务器的当前记录 current 和 rev
+    返回：{revision, results: [{index, status: applied|conflict|error, id, rev, current, error}]}
+    """
+    return await sync_service.replay_mutations(db, replay.user_id, replay.mutations)
+
+# ------------------------------ 缓存统计接口 ------------------------------
+@app.get("/api/v1/cache/stats")
+async def read_cache_stats():
+    """
+    读缓存的命中/未命中次数、条目数、估算占用字节数、淘汰和失效次数（当前进程）
+    """
+    return cache.stats()
+
 # ------------------------------ 认证相关路由 ------------------------------
 # 注册认证路由，前缀 /api/v1/auth
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["auth"])
@@ -0,0 +1,111 @@
+"""
+数据库版本化迁移
+
+schema_version 表记录每个已执行的迁移版本。启动时只读取一次当前版本，
+与 LATEST_VERSION 一致时直接返回，不做任何表结构检查；否则在一个事务内
+按版本号顺序执行尚未执行的迁移脚本。
+
+新增迁移：在本目录添加 mXXXX_<name>.py（定义 VERSION、DESCRIPTION 和
+async upgrade(conn)），并追加到 MIGRATIONS 列表末尾。迁移脚本需要幂等，
+全新数据库同样会从第 1 个版本开始执行。
+"""
+import datetime
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+# 导入模型，确保 Base.metadata 中注册了全部表
+from app.models import models  # noqa: F401
+from app.migrations import (
+    m0001_baseline,
+    m0002_hot_query_indexes,
+    m0003_long_term_task_subtasks,
+    m0004_dialogue_turns,
+    m0005_dialogue_list_index,
+    m0006_task_tags,
+    m0007_canonical_dates,
+    m0008_reminders,
+    m0009_search_index,
+    m0010_long_term_progress_totals,
+    m0011_daily_stats,
+    m0012_data_versions,
+    m0013_sync_revisions,
+    m0014_idempotency_keys,
+    m0015_task_recurrences,
+    m0016_idempotency_key_users,
+)
+
+MIGRATIONS = [
+    m0001_baseline,
+    m0002_hot_query_indexes,
+    m0003_long_term_task_subtasks,
+    m0004_dialogue_turns,
+    m0005_dialogue_list_index,
+    m0006_task_tags,
+    m0007_canonical_dates,
+    m0008_reminders,
+    m0009_search_index,
+    m0010_long_term_progress_totals,
+    m0011_daily_stats,
+    m0012_data_versions,
+    m0013_sync_revisions,
+    m0014_idempotency_keys,
+    m0015_task_recurrences,
+    m0016_idempotency_key_users,
+]
+
+LATEST_VERSION = MIGRATIONS[-1].VERSION
+
+
+async def get_schema_version(conn: AsyncConnection) -> Optional[int]:
+    """读取当前结构版本，schema_version 表不存在时返回 None"""
+    try:
+        result = await conn.execute(text("SELECT MAX(version) FROM schema_version"))
+    except OperationalError:
+        return None
+    version = result.scalar()
+    return version or 0
+
+
+async def run_migrations(engine: AsyncEngine) -> int:
+    """
+    将数据库升级到最新版本
+
+    返回:
+        int: 升级后的结构版本
+    """
+    # 快速路径：版本已是最新时只需这一次查询
+    async with engine.connect() as conn:
+        version = await get_schema_version(conn)
+    if version == LATEST_VERSION:
+        return version
+
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, "
+            "description TEXT NOT NULL, "
+            "applied_at TEXT NOT NULL)"
+        ))
+        # 先执行一条写语句拿到写锁，多个 worker 同时启动时只有一个会真正执行迁移，
+        # 其余的在 busy_timeout 内等待，随后读到已更新的版本号
+        await conn.execute(text("DELETE FROM schema_version WHERE version < 0"))
+        version = await get_schema_version(conn)
+
+        for migration in MIGRATIONS:
+            if migration.VERSION <= version:
+                continue
+            print(f"Applying migration {migration.VERSION:04d}: {migration.DESCRIPTION}")
+            await migration.upgrade(conn)
+            await conn.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {
+                    "v": migration.VERSION,
+                    "d": migration.DESCRIPTION,
+                    "t": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                }
+            )
+            version = migration.VERSION
+
+    return version
@@ -0,0 +1,35 @@
+# 迁移脚本共用的 SQLite 结构检查工具
+from typing import Set
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+
+async def table_exists(conn: AsyncConnection, table: str) -> bool:
+    result = await conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": table}
+    )
+    return result.first() is not None
+
+
+async def table_columns(conn: AsyncConnection, table: str) -> Set[str]:
+    result = await conn.execute(text(f"PRAGMA table_info({table})"))
+    return {row[1] for row in result.fetchall()}
+
+
+async def add_column_if_missing(conn: AsyncConnection, table: str, column: str, ddl: str) -> bool:
+    """
+    表中缺少指定列时执行 ALTER TABLE ADD COLUMN
+
+    参数:
+        table: 表名
+        column: 列名
+        ddl: 列定义（不含列名），例如 "TEXT" 或 "INTEGER NOT NULL DEFAULT 0"
+
+    返回:
+        bool: 是否新增了该列
+    """
+    if column in await table_columns(conn, table):
+        return False
+    await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
@@ -0,0 +1,12 @@
+# 基线结构：创建缺失的表，并补齐早期版本缺少的列
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.core.database import Base
+from app.migrations.helpers import add_column_if_missing
+
+VERSION = 1
+DESCRIPTION = "baseline tables"
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.run_sync(Base.metadata.create_all)
+    await add_column_if_missing(conn, "ai_configs", "openai_base_url", "TEXT")
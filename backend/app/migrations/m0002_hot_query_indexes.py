@@ -0,0 +1,10 @@
+# 为旧数据库补建热点查询索引
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.core.database import create_missing_indexes
+
+VERSION = 2
+DESCRIPTION = "hot query indexes"
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.run_sync(create_missing_indexes)
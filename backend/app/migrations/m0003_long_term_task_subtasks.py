@@ -0,0 +1,49 @@
+# 将 long_term_tasks.sub_task_ids 中的 JSON 权重迁移到 long_term_task_subtasks 表
+import json
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.models import models
+from app.migrations.helpers import table_columns
+
+VERSION = 3
+DESCRIPTION = "long_term_task_subtasks association table"
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.run_sync(lambda sync_conn: models.LongTermTaskSubtask.__table__.create(sync_conn, checkfirst=True))
+
+    # 旧版本的 JSON 权重，格式: {"task_id": weight}
+    weights_by_lt = {}
+    if "sub_task_ids" in await table_columns(conn, "long_term_tasks"):
+        result = await conn.execute(text(
+            "SELECT id, sub_task_ids FROM long_term_tasks WHERE sub_task_ids IS NOT NULL"
+        ))
+        for lt_id, raw in result.fetchall():
+            try:
+                parsed = json.loads(raw)
+            except (json.JSONDecodeError, TypeError):
+                continue
+            if isinstance(parsed, dict):
+                weights_by_lt[lt_id] = parsed
+
+    # 关联关系以 tasks.long_term_task_id 为准，JSON 中没有记录的子任务权重为 1.0
+    result = await conn.execute(text(
+        "SELECT t.id, t.long_term_task_id FROM tasks t "
+        "JOIN long_term_tasks lt ON lt.id = t.long_term_task_id"
+    ))
+    rows = []
+    for task_id, lt_id in result.fetchall():
+        try:
+            weight = float(weights_by_lt.get(lt_id, {}).get(str(task_id), 1.0))
+        except (TypeError, ValueError):
+            weight = 1.0
+        rows.append({"lt_id": lt_id, "task_id": task_id, "weight": weight})
+
+    if rows:
+        await conn.execute(
+            text(
+                "INSERT OR IGNORE INTO long_term_task_subtasks (long_term_task_id, task_id, weight) "
+                "VALUES (:lt_id, :task_id, :weight)"
+            ),
+            rows
+        )
@@ -0,0 +1,41 @@
+# 将 ai_assistant_messages.messages 中的整段对话拆分为 dialogue_turns 表中的逐轮记录
+import json
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.models import models
+
+VERSION = 4
+DESCRIPTION = "dialogue_turns per-turn storage"
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.run_sync(lambda sync_conn: models.DialogueTurn.__table__.create(sync_conn, checkfirst=True))
+
+    result = await conn.execute(text(
+        "SELECT id, timestamp, messages FROM ai_assistant_messages "
+        "WHERE messages IS NOT NULL AND messages != '[]'"
+    ))
+    for dialogue_id, timestamp, raw in result.fetchall():
+        try:
+            turns = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            turns = []
+        if not isinstance(turns, list):
+            turns = []
+        rows = [
+            {"dialogue_id": dialogue_id, "seq": seq, "content": json.dumps(turn), "created_at": timestamp}
+            for seq, turn in enumerate(turns)
+        ]
+        if rows:
+            await conn.execute(
+                text(
+                    "INSERT OR IGNORE INTO dialogue_turns (dialogue_id, seq, content, created_at) "
+                    "VALUES (:dialogue_id, :seq, :content, :created_at)"
+                ),
+                rows
+            )
+        # 历史已迁移，清空旧列避免重复保存大段 JSON
+        await conn.execute(
+            text("UPDATE ai_assistant_messages SET messages = '[]' WHERE id = :id"),
+            {"id": dialogue_id}
+        )
@@ -0,0 +1,12 @@
+# 对话列表改为按 (user_id, timestamp) 索引查询，替换单列 user_id 索引
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.core.database import create_missing_indexes
+
+VERSION = 5
+DESCRIPTION = "dialogue list (user_id, timestamp) index"
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.execute(text("DROP INDEX IF EXISTS ix_ai_assistant_messages_user_id"))
+    await conn.run_sync(create_missing_indexes)
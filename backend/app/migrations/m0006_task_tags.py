@@ -0,0 +1,33 @@
+# 将 tasks.tags 中的 JSON 标签列表展开到 task_tags 表
+import json
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.models import models
+
+VERSION = 6
+DESCRIPTION = "task_tags index table"
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.run_sync(lambda sync_conn: models.TaskTag.__table__.create(sync_conn, checkfirst=True))
+
+    result = await conn.execute(text(
+        "SELECT id, user_id, tags FROM tasks WHERE tags IS NOT NULL AND tags NOT IN ('', '[]', 'null')"
+    ))
+    rows = []
+    for task_id, user_id, raw in result.fetchall():
+        try:
+            tags = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            continue
+        if not isinstance(tags, list):
+            continue
+        for tag in tags:
+            if isinstance(tag, str) and tag.strip():
+                rows.append({"task_id": task_id, "user_id": user_id, "tag": tag.strip()})
+
+    if rows:
+        await conn.execute(
+            text("INSERT OR IGNORE INTO task_tags (task_id, user_id, tag) VALUES (:task_id, :user_id, :tag)"),
+            rows
+        )
@@ -0,0 +1,120 @@
+# 日期/时间字段统一为规范格式，并为截止时间增加可索引的时间戳列 due_at
+# 无法解析的旧值会被置空（日记日期无法解析时保留原值），并打印出来便于核对
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.core.database import create_missing_indexes
+from app.core.dates import normalize_date, normalize_datetime, normalize_time, to_epoch
+from app.migrations.helpers import add_column_if_missing
+
+VERSION = 7
+DESCRIPTION = "canonical date strings and due_at epoch columns"
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _canonical(normalize, value, label):
+    try:
+        return normalize(value)
+    except ValueError:
+        print(f"[Migration] 无法解析的{label}已置空: {value!r}")
+        return None
+
+
+def _canonical_timestamp(value):
+    """created_at / updated_at 统一为 YYYY-MM-DD HH:MM:SS，无法解析时保留原值"""
+    if not value:
+        return value
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return value
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.strftime(TIMESTAMP_FORMAT)
+
+
+async def upgrade(conn: AsyncConnection):
+    await add_column_if_missing(conn, "tasks", "due_at", "INTEGER")
+    await add_column_if_missing(conn, "long_term_tasks", "due_at", "INTEGER")
+
+    # ---------------- tasks ----------------
+    result = await conn.execute(text(
+        "SELECT id, due_date, due_at, assigned_date, assigned_start_time, assigned_end_time, updated_at FROM tasks"
+    ))
+    updates = []
+    for row in result.fetchall():
+        task_id, due_date, due_at, assigned_date, start_time, end_time, updated_at = row
+        new = {
+            "id": task_id,
+            "due_date": _canonical(normalize_datetime, due_date, "截止时间"),
+            "assigned_date": _canonical(normalize_date, assigned_date, "安排日期"),
+            "assigned_start_time": _canonical(normalize_time, start_time, "开始时间"),
+            "assigned_end_time": _canonical(normalize_time, end_time, "结束时间"),
+            "updated_at": _canonical_timestamp(updated_at),
+        }
+        new["due_at"] = to_epoch(new["due_date"])
+        if (new["due_date"], new["due_at"], new["assigned_date"], new["assigned_start_time"],
+                new["assigned_end_time"], new["updated_at"]) != tuple(row[1:]):
+            updates.append(new)
+    if updates:
+        await conn.execute(
+            text(
+                "UPDATE tasks SET due_date = :due_date, due_at = :due_at, assigned_date = :assigned_date, "
+                "assigned_start_time = :assigned_start_time, assigned_end_time = :assigned_end_time, "
+                "updated_at = :updated_at WHERE id = :id"
+            ),
+            updates
+        )
+
+    # ---------------- long_term_tasks ----------------
+    result = await conn.execute(text("SELECT id, start_date, due_date, due_at FROM long_term_tasks"))
+    updates = []
+    for row in result.fetchall():
+        lt_id, start_date, due_date, due_at = row
+        new = {
+            "id": lt_id,
+            "start_date": _canonical(normalize_date, start_date, "开始日期"),
+            "due_date": _canonical(normalize_datetime, due_date, "截止时间"),
+        }
+        new["due_at"] = to_epoch(new["due_date"])
+        if (new["start_date"], new["due_date"], new["due_at"]) != tuple(row[1:]):
+            updates.append(new)
+    if updates:
+        await conn.execute(
+            text("UPDATE long_term_tasks SET start_date = :start_date, due_date = :due_date, due_at = :due_at WHERE id = :id"),
+            updates
+        )
+
+    # ---------------- journals ----------------
+    # 主键为 (date, user_id)，不同写法的同一天（如 2025-3-5 与 2025-03-05）合并为一篇
+    result = await conn.execute(text("SELECT date, user_id, content FROM journals ORDER BY user_id, date"))
+    journals = {}
+    renamed = []
+    for date, user_id, content in result.fetchall():
+        try:
+            canonical = normalize_date(date)
+        except ValueError:
+            print(f"[Migration] 无法解析的日记日期已保留原值: {date!r}")
+            continue
+        if not canonical:
+            continue
+        journals.setdefault((canonical, user_id), []).append((date, content))
+        if canonical != date:
+            renamed.append((canonical, user_id))
+    for canonical, user_id in dict.fromkeys(renamed):
+        entries = journals[(canonical, user_id)]
+        merged = "\n\n".join(content for _, content in entries if content)
+        await conn.execute(
+            text("DELETE FROM journals WHERE user_id = :user_id AND date = :date"),
+            [{"user_id": user_id, "date": date} for date, _ in entries]
+        )
+        await conn.execute(
+            text("INSERT INTO journals (date, user_id, content) VALUES (:date, :user_id, :content)"),
+            {"date": canonical, "user_id": user_id, "content": merged}
+        )
+
+    # 旧的按字符串 due_date 建立的索引由 due_at 索引替代
+    await conn.execute(text("DROP INDEX IF EXISTS ix_tasks_user_due_date_status"))
+    await conn.execute(text("DROP INDEX IF EXISTS ix_long_term_tasks_user_due_date"))
+    await conn.run_sync(create_missing_indexes)
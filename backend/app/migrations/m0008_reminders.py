@@ -0,0 +1,84 @@
+# 将 ai_configs.reminder_list 中的 JSON 提醒列表拆分到 reminders 表
+#
+# 提醒的校验与规范化复制自编写本迁移时的 crud._normalize_reminder_item，
+# 不引用服务层代码，服务层以后的修改不会改变旧数据库重放本迁移的结果。
+import json
+import time
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.core.dates import normalize_datetime, to_epoch
+from app.models import models
+
+VERSION = 8
+DESCRIPTION = "reminders table"
+
+REMINDER_TYPES = {"Message", "Task", "LongTermTask"}
+
+
+def _normalize_reminder_item(item: dict) -> dict:
+    """校验旧提醒并规范 time 为 YYYY-MM-DD HH:MM；无效时抛出 ValueError"""
+    reminder_type = item.get("type")
+    if reminder_type not in REMINDER_TYPES:
+        raise ValueError("invalid reminder type")
+
+    time_value = item.get("time")
+    if not isinstance(time_value, str) or not time_value.strip():
+        raise ValueError("invalid reminder time")
+    time_value = normalize_datetime(time_value, require_time=True)
+
+    content_value = item.get("content")
+    if not isinstance(content_value, str) or not content_value.strip():
+        raise ValueError("invalid reminder content")
+
+    normalized = {"type": reminder_type, "time": time_value, "content": content_value}
+    if reminder_type in {"Task", "LongTermTask"}:
+        task_id = item.get("task_id")
+        if not isinstance(task_id, int):
+            raise ValueError("task_id must be an integer for Task/LongTermTask")
+        normalized["task_id"] = task_id
+    return normalized
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.run_sync(lambda sync_conn: models.Reminder.__table__.create(sync_conn, checkfirst=True))
+
+    result = await conn.execute(text(
+        "SELECT user_id, reminder_list FROM ai_configs "
+        "WHERE reminder_list IS NOT NULL AND reminder_list NOT IN ('', '[]', 'null')"
+    ))
+    now_ms = int(time.time() * 1000)
+    rows = []
+    for user_id, raw in result.fetchall():
+        try:
+            items = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            continue
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                item = _normalize_reminder_item(item)
+            except ValueError:
+                continue
+            rows.append({
+                "user_id": user_id,
+                "type": item["type"],
+                "time": item["time"],
+                "fire_at": to_epoch(item["time"]),
+                "content": item["content"],
+                "task_id": item.get("task_id"),
+                "updated_at": now_ms,
+            })
+
+    if rows:
+        await conn.execute(
+            text(
+                "INSERT INTO reminders (user_id, type, time, fire_at, content, task_id, updated_at, deleted) "
+                "VALUES (:user_id, :type, :time, :fire_at, :content, :task_id, :updated_at, 0)"
+            ),
+            rows
+        )
+    # 旧列保留但不再使用
+    await conn.execute(text("UPDATE ai_configs SET reminder_list = '[]' WHERE reminder_list IS NOT NULL"))
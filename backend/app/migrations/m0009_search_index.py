@@ -0,0 +1,99 @@
+# 全文检索：FTS5 索引表 search_index，由触发器与 tasks / journals / memos / dialogue_turns 保持同步
+#
+# 使用 trigram 分词器，中文等不以空格分词的文本也能按子串检索。
+# search_index 的 rowid 由来源记录确定（见 app/services/search_service.py），
+# 触发器按 rowid 删除旧条目，不需要扫描索引表。
+# 对话轮次纯文本的提取复制自编写本迁移时的 ai_config_service.dialogue_turn_text，不引用服务层代码。
+import json
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.migrations.helpers import add_column_if_missing
+
+VERSION = 9
+DESCRIPTION = "FTS5 search index"
+
+# 各来源的 rowid 表达式（与 search_service 中的 KIND_* 编码一致）
+TASK_ROWID = "{row}.id * 4"
+JOURNAL_ROWID = "({row}.user_id * 100000000 + CAST(replace({row}.date, '-', '') AS INTEGER)) * 4 + 1"
+MEMO_ROWID = "{row}.user_id * 4 + 2"
+DIALOGUE_ROWID = "{row}.id * 4 + 3"
+
+INSERT_COLUMNS = "INSERT INTO search_index (rowid, title, body, kind, ref_id, ref_key, user_id)"
+
+TASK_VALUES = (
+    "SELECT " + TASK_ROWID + ", {row}.title, "
+    "trim(coalesce({row}.description, '') || char(10) || coalesce({row}.result, ''), char(10)), "
+    "'task', {row}.id, NULL, {row}.user_id"
+)
+JOURNAL_VALUES = (
+    "SELECT " + JOURNAL_ROWID + ", {row}.date, {row}.content, 'journal', NULL, {row}.date, {row}.user_id"
+)
+MEMO_VALUES = (
+    "SELECT " + MEMO_ROWID + ", NULL, coalesce({row}.content, ''), 'memo', NULL, NULL, {row}.user_id"
+)
+DIALOGUE_VALUES = (
+    "SELECT " + DIALOGUE_ROWID + ", NULL, coalesce({row}.text, ''), 'dialogue', {row}.dialogue_id, {row}.seq, "
+    "(SELECT user_id FROM ai_assistant_messages WHERE id = {row}.dialogue_id)"
+)
+
+# (表名, 参与检索的列, rowid 表达式, 写入索引的 SELECT, 回填时的过滤条件)
+SOURCES = [
+    ("tasks", "title, description, result, user_id", TASK_ROWID, TASK_VALUES, ""),
+    # 日期无法解析而保留原值的旧日记不进入索引（rowid 由规范日期计算）
+    ("journals", "date, content, user_id", JOURNAL_ROWID, JOURNAL_VALUES,
+     " WHERE date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"),
+    ("memos", "content", MEMO_ROWID, MEMO_VALUES, ""),
+    ("dialogue_turns", "text", DIALOGUE_ROWID, DIALOGUE_VALUES, ""),
+]
+
+
+def _dialogue_turn_text(turn) -> str:
+    """提取一轮对话中各条消息的文本内容"""
+    if not isinstance(turn, list):
+        return ""
+    parts = []
+    for message in turn:
+        if isinstance(message, dict) and isinstance(message.get("content"), str):
+            parts.append(message["content"])
+    return "\n".join(parts)
+
+
+def _trigger_statements(table: str, columns: str, rowid: str, values: str):
+    new_values = values.format(row="new")
+    delete_old = f"DELETE FROM search_index WHERE rowid = {rowid.format(row='old')};"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN "
+        f"{INSERT_COLUMNS} {new_values}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE OF {columns} ON {table} BEGIN "
+        f"{delete_old} {INSERT_COLUMNS} {new_values}; END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN "
+        f"{delete_old} END",
+    ]
+
+
+async def upgrade(conn: AsyncConnection):
+    # 对话轮次的纯文本列（旧数据从 JSON 中提取）
+    await add_column_if_missing(conn, "dialogue_turns", "text", "TEXT")
+    result = await conn.execute(text("SELECT id, content FROM dialogue_turns WHERE text IS NULL"))
+    rows = []
+    for turn_id, raw in result.fetchall():
+        try:
+            turn = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            turn = []
+        rows.append({"id": turn_id, "text": _dialogue_turn_text(turn)})
+    if rows:
+        await conn.execute(text("UPDATE dialogue_turns SET text = :text WHERE id = :id"), rows)
+
+    await conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "title, body, kind UNINDEXED, ref_id UNINDEXED, ref_key UNINDEXED, user_id UNINDEXED, "
+        "tokenize = 'trigram')"
+    ))
+
+    # 重建索引内容
+    await conn.execute(text("DELETE FROM search_index"))
+    for table, columns, rowid, values, where in SOURCES:
+        await conn.execute(text(f"{INSERT_COLUMNS} {values.format(row=table)} FROM {table}{where}"))
+        for statement in _trigger_statements(table, columns, rowid, values):
+            await conn.execute(text(statement))
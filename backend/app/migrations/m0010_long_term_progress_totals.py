@@ -0,0 +1,29 @@
+# 长期任务增加子任务权重汇总列 total_weight / completed_weight，进度改为增量维护
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.migrations.helpers import add_column_if_missing
+
+VERSION = 10
+DESCRIPTION = "long_term_tasks weight totals"
+
+# 已完成(3)计全部权重，进行中(2)计一半权重
+SUBTASK_TOTALS = (
+    "SELECT {expr} FROM long_term_task_subtasks l JOIN tasks t ON t.id = l.task_id "
+    "WHERE l.long_term_task_id = long_term_tasks.id"
+)
+
+
+async def upgrade(conn: AsyncConnection):
+    await add_column_if_missing(conn, "long_term_tasks", "total_weight", "FLOAT NOT NULL DEFAULT 0")
+    await add_column_if_missing(conn, "long_term_tasks", "completed_weight", "FLOAT NOT NULL DEFAULT 0")
+
+    total = SUBTASK_TOTALS.format(expr="coalesce(round(sum(l.weight), 9), 0.0)")
+    completed = SUBTASK_TOTALS.format(
+        expr="coalesce(round(sum(l.weight * CASE t.status WHEN 3 THEN 1.0 WHEN 2 THEN 0.5 ELSE 0.0 END), 9), 0.0)"
+    )
+    await conn.execute(text(f"UPDATE long_term_tasks SET total_weight = ({total}), completed_weight = ({completed})"))
+    # 没有子任务的长期任务保留原有（手动设置的）进度
+    await conn.execute(text(
+        "UPDATE long_term_tasks SET progress = round(CASE WHEN total_weight <= 1.0 THEN completed_weight "
+        "ELSE completed_weight / total_weight END, 9) WHERE total_weight > 0"
+    ))
@@ -0,0 +1,10 @@
+# 每日任务统计表 daily_stats（维护触发器在启动时按 DAILY_STATS_ENABLED 创建，见 app/services/daily_stats.py）
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.models import models
+
+VERSION = 11
+DESCRIPTION = "daily_stats table"
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.run_sync(lambda sync_conn: models.DailyStat.__table__.create(sync_conn, checkfirst=True))
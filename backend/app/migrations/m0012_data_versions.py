@@ -0,0 +1,10 @@
+# 数据版本号表 data_versions（由 crud 写操作在提交前递增，见 app/core/data_versions.py）
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.models import models
+
+VERSION = 12
+DESCRIPTION = "data_versions table"
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.run_sync(lambda sync_conn: models.DataVersion.__table__.create(sync_conn, checkfirst=True))
@@ -0,0 +1,80 @@
+# 增量同步：数据行增加同步修订号 rev，删除的任务 / 长期任务写入墓碑表 sync_tombstones
+#
+# sync_revision 表只有一行，保存全局单调递增的修订号。下列表的每次插入和更新都由触发器递增修订号
+# 并写入该行的 rev 列；SQLite 同一时刻只有一个写事务，修订号的先后即提交的先后，
+# 客户端记住上次同步时的修订号，下次只取 rev 更大的行（见 app/services/sync_service.py）。
+# 长期任务的子任务关联（含权重）变化时同时更新所属长期任务的 rev。
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.core.database import create_missing_indexes
+from app.migrations.helpers import add_column_if_missing
+from app.models import models
+
+VERSION = 13
+DESCRIPTION = "sync revisions and tombstones"
+
+NEXT_REVISION = "UPDATE sync_revision SET rev = rev + 1 WHERE id = 1;"
+CURRENT_REVISION = "(SELECT rev FROM sync_revision WHERE id = 1)"
+
+# (表名, 定位一行的条件, 删除时写入墓碑的类型)
+SOURCES = [
+    ("tasks", "id = {row}.id", "task"),
+    ("long_term_tasks", "id = {row}.id", "long_term_task"),
+    ("journals", "date = {row}.date AND user_id = {row}.user_id", None),
+    ("memos", "user_id = {row}.user_id", None),
+    ("settings", "id = {row}.id", None),
+    # 提醒删除时保留墓碑行（deleted = 1），属于更新
+    ("reminders", "id = {row}.id", None),
+]
+
+
+def _stamp(table: str, where: str) -> str:
+    return f"UPDATE {table} SET rev = {CURRENT_REVISION} WHERE {where};"
+
+
+def _trigger_statements(table: str, where: str, tombstone_kind):
+    statements = [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_sync_ai AFTER INSERT ON {table} BEGIN "
+        f"{NEXT_REVISION} {_stamp(table, where.format(row='new'))} END",
+        # 只修改 rev 的更新（即触发器自身写入的修订号）不再递增
+        f"CREATE TRIGGER IF NOT EXISTS {table}_sync_au AFTER UPDATE ON {table} WHEN new.rev IS old.rev BEGIN "
+        f"{NEXT_REVISION} {_stamp(table, where.format(row='new'))} END",
+    ]
+    if tombstone_kind:
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_sync_ad AFTER DELETE ON {table} BEGIN {NEXT_REVISION} "
+            f"INSERT INTO sync_tombstones (rev, user_id, kind, ref_id) "
+            f"VALUES ({CURRENT_REVISION}, old.user_id, '{tombstone_kind}', old.id); END"
+        )
+    return statements
+
+
+def _link_trigger_statements():
+    statements = []
+    for event, row in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")):
+        suffix = {"INSERT": "ai", "UPDATE": "au", "DELETE": "ad"}[event]
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS long_term_task_subtasks_sync_{suffix} "
+            f"AFTER {event} ON long_term_task_subtasks BEGIN {NEXT_REVISION} "
+            f"{_stamp('long_term_tasks', f'id = {row}.long_term_task_id')} END"
+        )
+    return statements
+
+
+async def upgrade(conn: AsyncConnection):
+    for table, _, _ in SOURCES:
+        await add_column_if_missing(conn, table, "rev", "INTEGER NOT NULL DEFAULT 0")
+    await conn.run_sync(lambda sync_conn: models.SyncRevision.__table__.create(sync_conn, checkfirst=True))
+    await conn.run_sync(lambda sync_conn: models.SyncTombstone.__table__.create(sync_conn, checkfirst=True))
+    await conn.run_sync(create_missing_indexes)
+
+    # 已有数据统一记为修订号 1，首次增量同步（since=0）会返回全部数据
+    await conn.execute(text("INSERT OR IGNORE INTO sync_revision (id, rev) VALUES (1, 1)"))
+    for table, _, _ in SOURCES:
+        await conn.execute(text(f"UPDATE {table} SET rev = 1 WHERE rev = 0"))
+
+    for table, where, tombstone_kind in SOURCES:
+        for statement in _trigger_statements(table, where, tombstone_kind):
+            await conn.execute(text(statement))
+    for statement in _link_trigger_statements():
+        await conn.execute(text(statement))
@@ -0,0 +1,10 @@
+# 幂等键表 idempotency_keys（由 app/core/idempotency.py 中的中间件读写）
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.models import models
+
+VERSION = 14
+DESCRIPTION = "idempotency_keys table"
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.run_sync(lambda sync_conn: models.IdempotencyKey.__table__.create(sync_conn, checkfirst=True))
@@ -0,0 +1,20 @@
+# 重复任务：规则表 task_recurrences，tasks 增加覆盖发生日的 recurrence_id / occurrence_date 列
+# 规则表同样维护同步修订号，删除的规则写入墓碑（触发器同 m0013_sync_revisions）
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.core.database import create_missing_indexes
+from app.migrations.helpers import add_column_if_missing
+from app.migrations.m0013_sync_revisions import _trigger_statements
+from app.models import models
+
+VERSION = 15
+DESCRIPTION = "task recurrences"
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.run_sync(lambda sync_conn: models.TaskRecurrence.__table__.create(sync_conn, checkfirst=True))
+    await add_column_if_missing(conn, "tasks", "recurrence_id", "INTEGER REFERENCES task_recurrences (id)")
+    await add_column_if_missing(conn, "tasks", "occurrence_date", "VARCHAR")
+    await conn.run_sync(create_missing_indexes)
+    for statement in _trigger_statements("task_recurrences", "id = {row}.id", "task_recurrence"):
+        await conn.execute(text(statement))
@@ -0,0 +1,32 @@
+# 幂等键按用户区分：idempotency_keys 增加 user_id 列并加入主键（见 app/core/idempotency.py）
+# SQLite 不能修改主键，重建该表。表中只有短期有效的重试记录，旧记录直接丢弃，
+# 升级前尚未完成的重试会重新执行。建表语句按本版本的结构写在这里，不依赖之后修改的模型。
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.migrations.helpers import table_columns
+
+VERSION = 16
+DESCRIPTION = "idempotency keys scoped by user"
+
+STATEMENTS = [
+    "DROP TABLE IF EXISTS idempotency_keys",
+    "CREATE TABLE idempotency_keys ("
+    "user_id INTEGER DEFAULT '0' NOT NULL, "
+    "key VARCHAR NOT NULL, "
+    "method VARCHAR NOT NULL, "
+    "path VARCHAR NOT NULL, "
+    "fingerprint VARCHAR NOT NULL, "
+    "status_code INTEGER, "
+    "content_type VARCHAR, "
+    "body BLOB, "
+    "expires_at INTEGER NOT NULL, "
+    "PRIMARY KEY (user_id, key, method, path))",
+    "CREATE INDEX ix_idempotency_keys_expires_at ON idempotency_keys (expires_at)",
+]
+
+
+async def upgrade(conn: AsyncConnection):
+    if "user_id" in await table_columns(conn, "idempotency_keys"):
+        return
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
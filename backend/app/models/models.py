@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, Text, PrimaryKeyConstraint
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, Text, LargeBinary, PrimaryKeyConstraint, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 import datetime
@@ -20,21 +20,75 @@ class Task(Base):
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     status = Column(Integer, nullable=False)
-    due_date = Column(String, nullable=True)
+    due_date = Column(String, nullable=True)  # YYYY-MM-DD 或 YYYY-MM-DD HH:MM
+    due_at = Column(Integer, nullable=True)  # due_date 对应的时间戳（秒），用于排序和区间比较
     created_at = Column(String, nullable=False)
     updated_at = Column(String, nullable=False)
-    assigned_date = Column(String, nullable=True)
+    assigned_date = Column(String, nullable=True)  # YYYY-MM-DD
     assigned_start_time = Column(String, nullable=True)
     assigned_end_time = Column(String, nullable=True)
     tags = Column(Text, nullable=True)
     record_result = Column(Integer, default=0)
     result = Column(Text, nullable=True)
     result_picture_url = Column(Text, nullable=True)
-    long_term_task_id = Column(Integer, ForeignKey("long_term_tasks.id"), nullable=True)
+    long_term_task_id = Column(Integer, ForeignKey("long_term_tasks.id"), nullable=True, index=True)
+    rev = Column(Integer, nullable=False, default=0, server_default="0")  # 最后修改时的同步修订号（由触发器维护，见 migrations/m0013_sync_revisions.py）
+    # 重复任务某个发生日的覆盖行：所属规则及被覆盖的发生日（assigned_date 可被改到其他日期）
+    recurrence_id = Column(Integer, ForeignKey("task_recurrences.id"), nullable=True)
+    occurrence_date = Column(String, nullable=True)  # YYYY-MM-DD
     
     # 定义与长期任务的关系
     long_term_task = relationship("LongTermTask", back_populates="tasks")
 
+    __table_args__ = (
+        # 日期范围查询
+        Index("ix_tasks_user_assigned_date", "user_id", "assigned_date"),
+        # 热力图：按状态过滤后的日期范围查询
+        Index("ix_tasks_user_status_assigned_date", "user_id", "status", "assigned_date"),
+        # 急需处理任务：按截止时间排序的未完成任务
+        Index("ix_tasks_user_due_at_status", "user_id", "due_at", "status"),
+        # 增量同步：查询某修订号之后变更的任务
+        Index("ix_tasks_user_rev", "user_id", "rev"),
+        # 每个发生日最多一行覆盖
+        Index("ix_tasks_recurrence_occurrence", "recurrence_id", "occurrence_date", unique=True),
+    )
+
+class TaskRecurrence(Base):
+    """重复任务规则：一行代表按规则重复的一系列任务，发生日在查询时按日期窗口展开（见 app/core/recurrence.py）"""
+    __tablename__ = "task_recurrences"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=True)
+    status = Column(Integer, nullable=False, default=1)  # 未覆盖的发生日的状态
+    assigned_start_time = Column(String, nullable=True)
+    assigned_end_time = Column(String, nullable=True)
+    tags = Column(Text, nullable=True)
+    record_result = Column(Integer, default=0)
+    rule = Column(String, nullable=False)  # 规范形式的 RRULE 子集
+    start_date = Column(String, nullable=False)  # YYYY-MM-DD
+    end_date = Column(String, nullable=True)  # 最后一个发生日，为空表示不结束；用于按日期窗口筛选规则
+    exdates = Column(Text, nullable=False, default="[]", server_default="[]")  # 被删除的发生日（JSON 列表）
+    created_at = Column(String, nullable=False)
+    updated_at = Column(String, nullable=False)
+    rev = Column(Integer, nullable=False, default=0, server_default="0")  # 最后修改时的同步修订号（由触发器维护）
+
+    __table_args__ = (
+        Index("ix_task_recurrences_user_start_date", "user_id", "start_date"),
+        Index("ix_task_recurrences_user_rev", "user_id", "rev"),
+    )
+
+class TaskTag(Base):
+    """任务标签索引（每个标签一行，用于按标签筛选和统计；Task.tags 保存展示用的有序列表）"""
+    __tablename__ = "task_tags"
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    tag = Column(String, nullable=False)
+    __table_args__ = (
+        PrimaryKeyConstraint('task_id', 'tag'),
+        Index("ix_task_tags_user_tag", "user_id", "tag"),
+    )
+
 class LongTermTask(Base):
     """长期任务模型"""
     __tablename__ = "long_term_tasks"
@@ -42,23 +96,48 @@ class LongTermTask(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
-    start_date = Column(String, nullable=True)
-    due_date = Column(String, nullable=True)
+    start_date = Column(String, nullable=True)  # YYYY-MM-DD
+    due_date = Column(String, nullable=True)  # YYYY-MM-DD 或 YYYY-MM-DD HH:MM
+    due_at = Column(Integer, nullable=True)  # due_date 对应的时间戳（秒）
     progress = Column(Float, nullable=False, default=0.0)
+    # 子任务权重汇总，子任务状态/权重/归属变化时增量维护，progress 由两者计算
+    total_weight = Column(Float, nullable=False, default=0.0)
+    completed_weight = Column(Float, nullable=False, default=0.0)
     created_at = Column(String, nullable=False)
-    sub_task_ids = Column(Text, nullable=True)  # JSON格式: {"task_id": weight}，例如 {"1": 0.7, "2": 0.3}
+    rev = Column(Integer, nullable=False, default=0, server_default="0")  # 最后修改时的同步修订号（由触发器维护，见 migrations/m0013_sync_revisions.py）
+    # 子任务权重保存在 long_term_task_subtasks 表中，API 中的 sub_task_ids 字典由该表生成
     
     # 定义与任务的关系
     tasks = relationship("Task", back_populates="long_term_task")
 
+    __table_args__ = (
+        Index("ix_long_term_tasks_user_due_at", "user_id", "due_at"),
+        Index("ix_long_term_tasks_user_rev", "user_id", "rev"),
+    )
+
+class LongTermTaskSubtask(Base):
+    """长期任务与子任务的关联（含权重）"""
+    __tablename__ = "long_term_task_subtasks"
+    long_term_task_id = Column(Integer, ForeignKey("long_term_tasks.id"), nullable=False)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    weight = Column(Float, nullable=False, default=1.0)
+    __table_args__ = (
+        PrimaryKeyConstraint('long_term_task_id', 'task_id'),
+        # 一个任务最多属于一个长期任务
+        Index("ix_long_term_task_subtasks_task_id", "task_id", unique=True),
+    )
+
 class Journal(Base):
     """日记模型"""
     __tablename__ = "journals"
-    date = Column(String, nullable=False)
+    date = Column(String, nullable=False)  # YYYY-MM-DD
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     content = Column(Text, nullable=False)
+    rev = Column(Integer, nullable=False, default=0, server_default="0")  # 最后修改时的同步修订号（由触发器维护，见 migrations/m0013_sync_revisions.py）
     __table_args__ = (
         PrimaryKeyConstraint('date', 'user_id'),
+        Index("ix_journals_user_date", "user_id", "date"),
+        Index("ix_journals_user_rev", "user_id", "rev"),
     )
 
 class AIAssistantMessage(Base):
@@ -68,37 +147,98 @@ class AIAssistantMessage(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=True)
     timestamp = Column(String, nullable=False)
-    messages = Column(Text, nullable=False)
+    # 旧版本整段对话的 JSON，现已迁移到 dialogue_turns 表，仅保留列以兼容旧数据库
+    messages = Column(Text, nullable=False, default="[]")
+    __table_args__ = (
+        # 对话列表：按最后活跃时间倒序的键集分页
+        Index("ix_ai_assistant_messages_user_timestamp", "user_id", "timestamp"),
+    )
+
+class DialogueTurn(Base):
+    """AI 对话的单轮记录（一次用户输入及其回复）"""
+    __tablename__ = "dialogue_turns"
+    id = Column(Integer, primary_key=True, index=True)
+    dialogue_id = Column(Integer, ForeignKey("ai_assistant_messages.id"), nullable=False)
+    seq = Column(Integer, nullable=False)  # 轮次序号，从0开始
+    content = Column(Text, nullable=False)  # JSON格式: [{"role": "user", ...}, {"role": "assistant", ...}]
+    text = Column(Text, nullable=True)  # 本轮消息的纯文本，供全文检索
+    created_at = Column(String, nullable=False)
+    __table_args__ = (
+        Index("ix_dialogue_turns_dialogue_seq", "dialogue_id", "seq", unique=True),
+    )
 
 class AIConfig(Base):
     """AI 配置模型"""
     __tablename__ = "ai_configs"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     api_key = Column(Text, nullable=False)
     model = Column(Text, nullable=False)
     openai_base_url = Column(Text, nullable=True, default="")
     prompt = Column(Text, nullable=True)
     character = Column(Text, nullable=True)
     long_term_memory = Column(Text, nullable=True)
-    ai_dialogue_id_list = Column(Text, nullable=True)
+    ai_dialogue_id_list = Column(Text, nullable=True)  # 已弃用：对话列表直接按 user_id 查询 ai_assistant_messages
     is_enable_prompt = Column(Integer, nullable=False, default=0)
     is_auto_confirm_create_request = Column(Integer, nullable=False, default=0)
     is_auto_confirm_update_request = Column(Integer, nullable=False, default=0)
     is_auto_confirm_delete_request = Column(Integer, nullable=False, default=0)
     is_auto_confirm_create_reminder = Column(Integer, nullable=False, default=0)
-    reminder_list = Column(Text, nullable=True)
+    reminder_list = Column(Text, nullable=True)  # 已弃用：提醒保存在 reminders 表中
+
+class Reminder(Base):
+    """提醒模型（每条提醒一行，删除时保留墓碑供客户端增量同步）"""
+    __tablename__ = "reminders"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    type = Column(String, nullable=False)  # Message / Task / LongTermTask
+    time = Column(String, nullable=False)  # YYYY-MM-DD HH:MM
+    fire_at = Column(Integer, nullable=False)  # time 对应的时间戳（秒），用于排序
+    content = Column(Text, nullable=False)
+    task_id = Column(Integer, nullable=True)
+    updated_at = Column(Integer, nullable=False)  # 最后修改时间（毫秒时间戳）；增量同步按 rev 进行
+    deleted = Column(Integer, nullable=False, default=0)
+    rev = Column(Integer, nullable=False, default=0, server_default="0")  # 最后修改时的同步修订号（由触发器维护，见 migrations/m0013_sync_revisions.py）
+    __table_args__ = (
+        # 提醒列表：按触发时间排序
+        Index("ix_reminders_user_fire_at", "user_id", "fire_at"),
+        Index("ix_reminders_user_updated_at", "user_id", "updated_at"),
+        # 增量同步：查询某修订号之后变更的提醒
+        Index("ix_reminders_user_rev", "user_id", "rev"),
+    )
+
+class DailyStat(Base):
+    """每日任务统计（由 tasks 表上的触发器维护，见 app/services/daily_stats.py）"""
+    __tablename__ = "daily_stats"
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    day = Column(String, nullable=False)  # YYYY-MM-DD
+    completed = Column(Integer, nullable=False, default=0)  # 安排在当天且已完成的任务数
+    created = Column(Integer, nullable=False, default=0)  # 当天创建的任务数
+    __table_args__ = (
+        PrimaryKeyConstraint('user_id', 'day'),
+    )
+
+class DataVersion(Base):
+    """用户各类数据的版本号（写入时递增，用于 ETag 条件请求，见 app/core/data_versions.py）"""
+    __tablename__ = "data_versions"
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    resource = Column(String, nullable=False)  # tasks / long_term_tasks / settings / memo / ...
+    version = Column(Integer, nullable=False, default=0)
+    __table_args__ = (
+        PrimaryKeyConstraint('user_id', 'resource'),
+    )
 
 class Settings(Base):
     """用户界面设置模型"""
     __tablename__ = "settings"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     primary = Column(String, nullable=False)
     bg = Column(String, nullable=False)
     card = Column(String, nullable=False)
     text = Column(String, nullable=False)
     theme_mode = Column(String, default="light")
+    rev = Column(Integer, nullable=False, default=0, server_default="0")  # 最后修改时的同步修订号（由触发器维护，见 migrations/m0013_sync_revisions.py）
 
 class Memo(Base):
     """备忘录模型"""
@@ -106,3 +246,39 @@ class Memo(Base):
     user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
     content = Column(Text, nullable=True)
     updated_at = Column(String, nullable=False)
+    rev = Column(Integer, nullable=False, default=0, server_default="0")  # 最后修改时的同步修订号（由触发器维护，见 migrations/m0013_sync_revisions.py）
+
+class SyncRevision(Base):
+    """全局同步修订号（只有 id = 1 一行），数据行每次写入时递增并记录到该行的 rev 列"""
+    __tablename__ = "sync_revision"
+    id = Column(Integer, primary_key=True)
+    rev = Column(Integer, nullable=False, default=0)
+
+class SyncTombstone(Base):
+    """被删除的任务 / 长期任务的墓碑，增量同步时告知客户端删除"""
+    __tablename__ = "sync_tombstones"
+    id = Column(Integer, primary_key=True)
+    rev = Column(Integer, nullable=False)  # 删除时的同步修订号
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False)  # task / long_term_task / task_recurrence
+    ref_id = Column(Integer, nullable=False)
+    __table_args__ = (
+        Index("ix_sync_tombstones_user_rev", "user_id", "rev"),
+    )
+
+class IdempotencyKey(Base):
+    """带 Idempotency-Key 的写请求及其响应，重试时直接返回保存的响应（见 app/core/idempotency.py）"""
+    __tablename__ = "idempotency_keys"
+    user_id = Column(Integer, nullable=False, default=0, server_default="0")  # 请求中的 user_id，没有时为 0
+    key = Column(String, nullable=False)
+    method = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    fingerprint = Column(String, nullable=False)  # 请求参数和请求体的哈希，同一个键对应的请求必须一致
+    status_code = Column(Integer, nullable=True)  # 为空表示首个请求仍在处理中
+    content_type = Column(String, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    expires_at = Column(Integer, nullable=False)  # 过期时间戳（秒）
+    __table_args__ = (
+        PrimaryKeyConstraint('user_id', 'key', 'method', 'path'),
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, List, Dict, Any, Literal
+from app.core.dates import normalize_date, normalize_datetime, normalize_time
 
 class User(BaseModel):
     """用户 Schema"""
@@ -28,6 +29,7 @@ class MemoUpdate(BaseModel):
 class Memo(MemoBase):
     """备忘录 Schema"""
     updated_at: str
+    rev: Optional[int] = None  # 最后修改时的同步修订号，离线重放时作为 base_rev 传回
     class Config:
         from_attributes = True
 
@@ -47,20 +49,166 @@ class TaskBase(BaseModel):
     result_picture_url: Optional[List[str]] = []
     long_term_task_id: Optional[int] = None
 
+    # 日期/时间在写入前统一为规范格式，保证数据库中按字符串比较即按时间先后排序
+    @field_validator("assigned_date")
+    @classmethod
+    def _normalize_assigned_date(cls, value):
+        return normalize_date(value)
+
+    @field_validator("due_date")
+    @classmethod
+    def _normalize_due_date(cls, value):
+        return normalize_datetime(value)
+
+    @field_validator("assigned_start_time", "assigned_end_time")
+    @classmethod
+    def _normalize_assigned_time(cls, value):
+        return normalize_time(value)
+
 class TaskCreate(TaskBase):
     """创建任务 Schema"""
     pass
 
 class Task(TaskBase):
     """任务 Schema"""
-    id: int
+    id: int  # 重复任务未覆盖的发生日为负数（见 app/core/recurrence.py）
     created_at: str
     updated_at: str
     long_term_task: Optional["LongTermTask"] = None
+    recurrence_id: Optional[int] = None  # 重复任务的发生日所属的规则
+    occurrence_date: Optional[str] = None
+    rev: Optional[int] = None  # 最后修改时的同步修订号，离线重放时作为 base_rev 传回；未覆盖的发生日为空
 
     class Config:
         from_attributes = True
 
+class TaskPatch(BaseModel):
+    """部分更新任务 Schema，只有请求中出现的字段会被写入"""
+    title: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[int] = None
+    due_date: Optional[str] = None
+    assigned_date: Optional[str] = None
+    assigned_start_time: Optional[str] = None
+    assigned_end_time: Optional[str] = None
+    tags: Optional[List[str]] = None
+    record_result: Optional[bool] = None
+    result: Optional[str] = None
+    result_picture_url: Optional[List[str]] = None
+    long_term_task_id: Optional[int] = None
+
+    @field_validator("title", "status", "tags", "record_result", "result_picture_url")
+    @classmethod
+    def _not_null(cls, value):
+        # 只在字段出现在请求中时校验，这些列不允许显式置空
+        if value is None:
+            raise ValueError("must not be null")
+        return value
+
+    @field_validator("assigned_date")
+    @classmethod
+    def _normalize_assigned_date(cls, value):
+        return normalize_date(value)
+
+    @field_validator("due_date")
+    @classmethod
+    def _normalize_due_date(cls, value):
+        return normalize_datetime(value)
+
+    @field_validator("assigned_start_time", "assigned_end_time")
+    @classmethod
+    def _normalize_assigned_time(cls, value):
+        return normalize_time(value)
+
+class TaskBatchOperation(BaseModel):
+    """批量任务操作中的单个操作 Schema"""
+    op: Literal["create", "update", "delete"]
+    task_id: Optional[int] = None  # update / delete 时必填
+    task: Optional[Dict[str, Any]] = None  # create 时为 TaskCreate，update 时为 TaskPatch 的字段（部分更新）
+
+class TaskBatchRequest(BaseModel):
+    """批量任务操作请求 Schema，所有操作在同一事务中执行"""
+    operations: List[TaskBatchOperation] = Field(..., max_length=500)
+
+class TaskBatchResult(BaseModel):
+    """批量任务操作中单个操作的结果 Schema"""
+    index: int  # 操作在请求中的序号
+    op: str
+    success: bool
+    task_id: Optional[int] = None  # 新建任务的 ID 或被操作任务的 ID
+    error: Optional[str] = None
+
+class TaskRecurrenceBase(BaseModel):
+    """重复任务基础 Schema"""
+    user_id: int
+    title: str
+    description: Optional[str] = None
+    status: int = 1  # 未覆盖的发生日的状态
+    rule: str  # RRULE 子集或 daily / weekly / monthly，见 app/core/recurrence.py
+    start_date: str
+    assigned_start_time: Optional[str] = None
+    assigned_end_time: Optional[str] = None
+    tags: Optional[List[str]] = []
+    record_result: Optional[bool] = False
+
+    @field_validator("start_date")
+    @classmethod
+    def _normalize_start_date(cls, value):
+        return normalize_date(value)
+
+    @field_validator("assigned_start_time", "assigned_end_time")
+    @classmethod
+    def _normalize_assigned_time(cls, value):
+        return normalize_time(value)
+
+class TaskRecurrenceCreate(TaskRecurrenceBase):
+    """创建重复任务 Schema"""
+    pass
+
+class TaskRecurrence(TaskRecurrenceBase):
+    """重复任务 Schema"""
+    id: int
+    end_date: Optional[str] = None  # 最后一个发生日，为空表示不结束
+    exdates: List[str] = []  # 被删除的发生日
+    created_at: str
+    updated_at: str
+    rev: Optional[int] = None  # 最后修改时的同步修订号，离线重放时作为 base_rev 传回
+
+class TaskRecurrencePatch(BaseModel):
+    """部分更新重复任务 Schema，修改只影响尚未覆盖的发生日"""
+    title: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[int] = None
+    rule: Optional[str] = None
+    start_date: Optional[str] = None
+    assigned_start_time: Optional[str] = None
+    assigned_end_time: Optional[str] = None
+    tags: Optional[List[str]] = None
+    record_result: Optional[bool] = None
+    exdates: Optional[List[str]] = None
+
+    @field_validator("title", "status", "rule", "start_date", "tags", "record_result", "exdates")
+    @classmethod
+    def _not_null(cls, value):
+        if value is None:
+            raise ValueError("must not be null")
+        return value
+
+    @field_validator("start_date")
+    @classmethod
+    def _normalize_start_date(cls, value):
+        return normalize_date(value)
+
+    @field_validator("assigned_start_time", "assigned_end_time")
+    @classmethod
+    def _normalize_assigned_time(cls, value):
+        return normalize_time(value)
+
+    @field_validator("exdates")
+    @classmethod
+    def _normalize_exdates(cls, value):
+        return sorted({normalize_date(day) for day in value if day})
+
 class LongTermTaskBase(BaseModel):
     """长期任务基础 Schema"""
     user_id: int
@@ -71,6 +219,16 @@ class LongTermTaskBase(BaseModel):
     progress: float = 0.0
     sub_task_ids: Optional[Dict[str, float]] = {}  # 格式: {"task_id": weight}，例如 {"1": 0.7, "2": 0.3}
 
+    @field_validator("start_date")
+    @classmethod
+    def _normalize_start_date(cls, value):
+        return normalize_date(value)
+
+    @field_validator("due_date")
+    @classmethod
+    def _normalize_due_date(cls, value):
+        return normalize_datetime(value)
+
 class LongTermTaskCreate(LongTermTaskBase):
     """创建长期任务 Schema"""
     pass
@@ -80,15 +238,52 @@ class LongTermTask(LongTermTaskBase):
     id: int
     subtasks: Optional[List[Task]] = []
     created_at: str
+    rev: Optional[int] = None  # 最后修改时的同步修订号，离线重放时作为 base_rev 传回
 
     class Config:
         from_attributes = True
 
+class LongTermTaskPatch(BaseModel):
+    """部分更新长期任务 Schema，只有请求中出现的字段会被写入"""
+    title: Optional[str] = None
+    description: Optional[str] = None
+    start_date: Optional[str] = None
+    due_date: Optional[str] = None
+    progress: Optional[float] = None  # 仅为兼容旧客户端保留，进度由子任务权重汇总得出，写入时忽略
+    sub_task_ids: Optional[Dict[str, float]] = None  # 含义同 LongTermTask.sub_task_ids，仅调整已关联子任务的权重
+
+    @field_validator("title", "progress", "sub_task_ids")
+    @classmethod
+    def _not_null(cls, value):
+        if value is None:
+            raise ValueError("must not be null")
+        return value
+
+    @field_validator("start_date")
+    @classmethod
+    def _normalize_start_date(cls, value):
+        return normalize_date(value)
+
+    @field_validator("due_date")
+    @classmethod
+    def _normalize_due_date(cls, value):
+        return normalize_datetime(value)
+
 class Journal(BaseModel):
     """日记 Schema"""
     date: str
     user_id: int
     content: str
+    rev: Optional[int] = None  # 最后修改时的同步修订号，离线重放时作为 base_rev 传回
+
+    # 只用于输出：迁移 0007 保留了无法解析的旧日期，原样返回而不是校验失败
+    @field_validator("date")
+    @classmethod
+    def _normalize_date(cls, value):
+        try:
+            return normalize_date(value)
+        except ValueError:
+            return value
 
     class Config:
         from_attributes = True
@@ -100,6 +295,8 @@ class AiMessage(BaseModel):
     title: Optional[str]
     timestamp: str
     messages: List[List[Dict[str, Any]]]
+    total_turns: int = 0  # 对话总轮数
+    turn_offset: int = 0  # messages 中第一轮的序号
 
     class Config:
         from_attributes = True
@@ -128,6 +325,7 @@ class SettingsUpdate(BaseModel):
 class Settings(SettingsBase):
     """设置 Schema"""
     id: int
+    rev: Optional[int] = None  # 最后修改时的同步修订号，离线重放时作为 base_rev 传回
     
     class Config:
         from_attributes = True
@@ -141,7 +339,7 @@ class AIConfigBase(BaseModel):
     prompt: Optional[str] = None
     character: Optional[str] = None
     long_term_memory: Optional[str] = None
-    ai_dialogue_id_list: Optional[List[int]] = []
+    ai_dialogue_id_list: Optional[List[int]] = []  # 已弃用，始终为空列表；对话列表请使用 /ai/dialogues
     is_enable_prompt: int = 0
     is_auto_confirm_create_request: int = 0
     is_auto_confirm_update_request: int = 0
@@ -173,3 +371,99 @@ class AIConfig(AIConfigBase):
     id: int
     class Config:
         from_attributes = True
+
+class ReminderCreate(BaseModel):
+    """新增提醒 Schema"""
+    user_id: int
+    type: str  # Message / Task / LongTermTask
+    time: str  # YYYY-MM-DD HH:MM
+    content: str
+    task_id: Optional[int] = None
+
+class Reminder(BaseModel):
+    """提醒 Schema"""
+    id: int
+    type: str
+    time: str
+    content: str
+    task_id: Optional[int] = None
+    updated_at: Optional[int] = None  # 仅增量同步接口返回
+    deleted: Optional[bool] = None  # 仅增量同步接口返回
+    rev: Optional[int] = None  # 仅 /api/v1/sync 返回
+
+class ReminderChanges(BaseModel):
+    """提醒增量同步结果 Schema"""
+    reminders: List[Reminder]
+    sync_token: int  # 下次请求时作为 since 传入
+
+class SearchResult(BaseModel):
+    """全文检索结果 Schema"""
+    type: str  # task / journal / memo / dialogue
+    id: Optional[int] = None  # 任务 ID 或对话 ID
+    date: Optional[str] = None  # 日记日期
+    seq: Optional[int] = None  # 对话轮次序号
+    title: Optional[str] = None
+    snippet: str  # 命中片段，关键词以 <mark></mark> 标出
+    score: float  # 相关度，越大越相关
+
+class HeatmapRange(BaseModel):
+    """区间热力图 Schema"""
+    start_date: str
+    end_date: str
+    counts: List[int]  # 每天已完成任务数，从 start_date 开始逐日排列
+    levels: List[int]  # 每天热力等级（0~6）
+
+class CalendarMonth(BaseModel):
+    """月历 Schema，各列表的每个元素对应当月一天"""
+    year: int
+    month: int
+    journal: List[bool]  # 当天是否有日记
+    task_count: List[int]  # 安排在当天的任务数
+    completed_count: List[int]  # 其中已完成的任务数
+    levels: List[int]  # 热力等级（0~6）
+
+class SyncDeleted(BaseModel):
+    """增量同步中被删除的记录"""
+    type: str  # task / long_term_task / task_recurrence / reminder
+    id: int
+
+class SyncChanges(BaseModel):
+    """增量同步结果 Schema"""
+    revision: int  # 下次请求时作为 since 传入
+    full: bool  # 为 True 时是全部数据（客户端应替换本地数据），否则只包含变更
+    tasks: List[Task]
+    long_term_tasks: List[LongTermTask]
+    journals: List[Journal]
+    memo: Optional[Memo] = None  # 未变化时为空
+    settings: Optional[Settings] = None  # 未变化时为空
+    reminders: List[Reminder]
+    recurrences: List[TaskRecurrence] = []
+    deleted: List[SyncDeleted]
+
+class ReplayMutation(BaseModel):
+    """离线重放中的单个修改"""
+    type: Literal["task", "long_term_task", "journal", "memo"]
+    op: Literal["create", "update", "delete"]  # journal / memo 只支持 update
+    id: Optional[int] = None  # task / long_term_task 的 update、delete 时必填
+    date: Optional[str] = None  # journal 时必填
+    base_rev: Optional[int] = None  # 客户端修改时所基于的 rev（来自同步接口），为空时不检查冲突
+    data: Optional[Dict[str, Any]] = None  # create 时为 TaskCreate / LongTermTaskCreate，update 时为 TaskPatch / LongTermTaskPatch；journal / memo 为 {"content"}
+
+class ReplayRequest(BaseModel):
+    """离线重放请求 Schema，所有修改在同一事务中按顺序执行"""
+    user_id: int
+    mutations: List[ReplayMutation] = Field(..., max_length=500)
+
+class ReplayResult(BaseModel):
+    """离线重放中单个修改的结果 Schema"""
+    index: int  # 修改在请求中的序号
+    status: Literal["applied", "conflict", "error"]
+    id: Optional[int] = None  # 新建或被修改记录的 ID
+    rev: Optional[int] = None  # 修改后（冲突时为服务器当前）记录的 rev，删除后为空
+    current: Optional[Dict[str, Any]] = None  # 冲突时服务器上的当前记录，记录已被删除时为空
+    error: Optional[str] = None
+
+class ReplayResponse(BaseModel):
+    """离线重放结果 Schema"""
+    revision: int  # 重放后的当前修订号（客户端仍应以上次同步的 revision 增量同步，取回其他设备的修改）
+    results: List[ReplayResult]
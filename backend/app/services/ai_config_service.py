@@ -1,8 +1,12 @@
 import json
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, update
+from sqlalchemy import select, delete, update, insert, func, literal, or_, and_
 from app.models import models
 from app.schemas import schemas
+from app.services import crud
+from app.core.database import commit, unit_of_work
+from app.core import data_versions
+from app.core.data_versions import bump_on_commit
 from typing import List, Optional
 import datetime
 
@@ -12,21 +16,10 @@ async def get_ai_config(db: AsyncSession, user_id: int):
     config = result.scalars().first()
     if config:
         config_dict = config.__dict__.copy()
-        if config.ai_dialogue_id_list:
-            try:
-                config_dict['ai_dialogue_id_list'] = json.loads(config.ai_dialogue_id_list)
-            except:
-                config_dict['ai_dialogue_id_list'] = []
-        else:
-            config_dict['ai_dialogue_id_list'] = []
-            
-        if config.reminder_list:
-            try:
-                config_dict['reminder_list'] = json.loads(config.reminder_list)
-            except:
-                config_dict['reminder_list'] = []
-        else:
-            config_dict['reminder_list'] = []
+        # ai_dialogue_id_list 已弃用，对话列表请使用 get_dialogues
+        config_dict['ai_dialogue_id_list'] = []
+        # 提醒保存在 reminders 表中，reminder_list 由该表生成
+        config_dict['reminder_list'] = await crud.get_reminder_list(user_id, db)
             
         return schemas.AIConfig(**config_dict)
     return None
@@ -47,11 +40,14 @@ async def create_ai_config(db: AsyncSession, config: schemas.AIConfigCreate):
         is_auto_confirm_update_request=config.is_auto_confirm_update_request,
         is_auto_confirm_delete_request=config.is_auto_confirm_delete_request,
         is_auto_confirm_create_reminder=config.is_auto_confirm_create_reminder,
-        reminder_list=json.dumps(config.reminder_list)
+        reminder_list=json.dumps([])
     )
-    db.add(db_config)
-    await db.commit()
-    await db.refresh(db_config)
+    # 配置与提醒列表在同一事务中写入，只提交一次
+    async with unit_of_work(db):
+        db.add(db_config)
+        bump_on_commit(db, config.user_id, data_versions.AI_CONFIG)
+        if config.reminder_list:
+            await crud.update_reminder_list(config.user_id, config.reminder_list, db)
     return await get_ai_config(db, config.user_id)
 
 async def update_ai_config(db: AsyncSession, user_id: int, update_data: schemas.AIConfigUpdate):
@@ -67,68 +63,115 @@ async def update_ai_config(db: AsyncSession, user_id: int, update_data: schemas.
             setattr(db_config, key, json.dumps(value or []))
             continue
         if key == "reminder_list":
-            setattr(db_config, key, json.dumps(value or []))
             continue
         setattr(db_config, key, value)
+    bump_on_commit(db, user_id, data_versions.AI_CONFIG)
         
-    await db.commit()
-    await db.refresh(db_config)
+    if "reminder_list" in update_dict:
+        # 校验失败时抛出 ValueError，本次修改不会提交
+        await crud.update_reminder_list(user_id, update_dict["reminder_list"], db)
+    else:
+        await commit(db)
     return await get_ai_config(db, user_id)
 
 # 会话相关
-async def get_dialogues(db: AsyncSession, user_id: int):
-    """获取用户的所有对话列表"""
-    result = await db.execute(select(models.AIConfig).filter(models.AIConfig.user_id == user_id))
-    config = result.scalars().first()
-    if not config or not config.ai_dialogue_id_list:
-        return []
-    
-    try:
-        id_list = json.loads(config.ai_dialogue_id_list)
-    except:
-        return []
-        
-    if not id_list:
-        return []
+async def get_dialogues(db: AsyncSession, user_id: int, limit: Optional[int] = None,
+                        before: Optional[tuple] = None):
+    """
+    获取用户的对话列表，按最后活跃时间倒序（走 (user_id, timestamp) 索引，不读取消息内容）
 
-    # 这里的 in_ 只能获取存在的，且顺序不一定
-    result = await db.execute(select(models.AIAssistantMessage).filter(models.AIAssistantMessage.id.in_(id_list)))
-    dialogues = result.scalars().all()
-    dialogue_map = {d.id: d for d in dialogues}
-    result_list = []
-    # 按照 id_list 的逆序返回，或者顺序返回？
-    # 通常对话列表是最近的在上面。id_list append 是加在后面。
-    # 假设 id_list 是 [old, ..., new]。逆序遍历。
-    for dia_id in reversed(id_list):
-        if dia_id in dialogue_map:
-            d = dialogue_map[dia_id]
-            result_list.append({
-                "id": d.id,
-                "title": d.title,
-                "last_timestamp": d.timestamp
-            })
-    return result_list
-
-async def get_dialogue(db: AsyncSession, dialogue_id: int, user_id: int):
-    """获取指定 ID 的对话详情"""
-    result = await db.execute(select(models.AIAssistantMessage).filter(
+    参数:
+        limit: 返回的最大条数，None 表示全部
+        before: 键集分页位置 (timestamp, id)，只返回排在该位置之后的对话
+    """
+    query = select(
+        models.AIAssistantMessage.id,
+        models.AIAssistantMessage.title,
+        models.AIAssistantMessage.timestamp
+    ).filter(models.AIAssistantMessage.user_id == user_id)
+    if before is not None:
+        before_timestamp, before_id = before
+        query = query.filter(or_(
+            models.AIAssistantMessage.timestamp < before_timestamp,
+            and_(
+                models.AIAssistantMessage.timestamp == before_timestamp,
+                models.AIAssistantMessage.id < before_id
+            )
+        ))
+    query = query.order_by(models.AIAssistantMessage.timestamp.desc(), models.AIAssistantMessage.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return [
+        {"id": d.id, "title": d.title, "last_timestamp": d.timestamp}
+        for d in result.all()
+    ]
+
+async def get_dialogue(db: AsyncSession, dialogue_id: int, user_id: int, offset: int = 0, limit: Optional[int] = None):
+    """
+    获取指定 ID 的对话详情
+
+    参数:
+        offset: 起始轮次序号
+        limit: 返回的最大轮数，None 表示返回 offset 之后的全部轮次
+    """
+    result = await db.execute(select(
+        models.AIAssistantMessage.id,
+        models.AIAssistantMessage.user_id,
+        models.AIAssistantMessage.title,
+        models.AIAssistantMessage.timestamp
+    ).filter(
         models.AIAssistantMessage.id == dialogue_id,
         models.AIAssistantMessage.user_id == user_id
     ))
-    d = result.scalars().first()
-    if d:
-        try:
-            messages = json.loads(d.messages)
-        except:
-            messages = []
-        return schemas.AiMessage(
-            id=d.id,
-            user_id=d.user_id,
-            title=d.title,
-            timestamp=d.timestamp,
-            messages=messages
-        )
-    return None
+    d = result.first()
+    if not d:
+        return None
+
+    result = await db.execute(select(func.count()).select_from(models.DialogueTurn).filter(
+        models.DialogueTurn.dialogue_id == dialogue_id
+    ))
+    total_turns = result.scalar()
+
+    query = select(models.DialogueTurn.content).filter(
+        models.DialogueTurn.dialogue_id == dialogue_id
+    ).order_by(models.DialogueTurn.seq).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    messages = [_load_turn(content) for content in result.scalars().all()]
+
+    return schemas.AiMessage(
+        id=d.id,
+        user_id=d.user_id,
+        title=d.title,
+        timestamp=d.timestamp,
+        messages=messages,
+        total_turns=total_turns,
+        turn_offset=offset
+    )
+
+async def get_recent_dialogue_turns(db: AsyncSession, dialogue_id: int, user_id: int, limit: Optional[int] = None) -> List[list]:
+    """按时间顺序返回对话最近的 limit 轮（limit 为 None 时返回全部），用于构造上下文窗口"""
+    query = select(models.DialogueTurn.content).join(
+        models.AIAssistantMessage, models.AIAssistantMessage.id == models.DialogueTurn.dialogue_id
+    ).filter(
+        models.DialogueTurn.dialogue_id == dialogue_id,
+        models.AIAssistantMessage.user_id == user_id
+    ).order_by(models.DialogueTurn.seq.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    turns = [_load_turn(content) for content in result.scalars().all()]
+    turns.reverse()
+    return turns
+
+def _load_turn(content: str) -> list:
+    try:
+        turn = json.loads(content)
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return turn if isinstance(turn, list) else []
 
 async def create_dialogue(db: AsyncSession, user_id: int, title: str = None):
     """创建新对话"""
@@ -139,29 +182,12 @@ async def create_dialogue(db: AsyncSession, user_id: int, title: str = None):
     new_dialogue = models.AIAssistantMessage(
         user_id=user_id,
         title=title,
-        timestamp=now,
-        messages=json.dumps([])
+        timestamp=now
     )
     db.add(new_dialogue)
-    await db.commit()
-    await db.refresh(new_dialogue)
+    await db.flush()
     new_id = new_dialogue.id
-    
-    # 更新 AIConfig
-    result = await db.execute(select(models.AIConfig).filter(models.AIConfig.user_id == user_id))
-    config = result.scalars().first()
-    if config:
-        try:
-            id_list = json.loads(config.ai_dialogue_id_list) if config.ai_dialogue_id_list else []
-        except:
-            id_list = []
-        id_list.append(new_id)
-        config.ai_dialogue_id_list = json.dumps(id_list)
-        await db.commit()
-    else:
-        # 如果没有配置，应该先创建配置？或者忽略。
-        # 最好是先创建默认配置。但这里为了鲁棒性，先不处理。
-        pass
+    await commit(db)
         
     return await get_dialogue(db, new_id, user_id)
 
@@ -173,18 +199,9 @@ async def delete_dialogue(db: AsyncSession, dialogue_id: int, user_id: int):
     ))
     d = result.scalars().first()
     if d:
+        await db.execute(delete(models.DialogueTurn).where(models.DialogueTurn.dialogue_id == dialogue_id))
         await db.delete(d)
-        result = await db.execute(select(models.AIConfig).filter(models.AIConfig.user_id == user_id))
-        config = result.scalars().first()
-        if config and config.ai_dialogue_id_list:
-            try:
-                id_list = json.loads(config.ai_dialogue_id_list)
-                if dialogue_id in id_list:
-                    id_list.remove(dialogue_id)
-                    config.ai_dialogue_id_list = json.dumps(id_list)
-            except:
-                pass
-        await db.commit()
+        await commit(db)
         return True
     return False
 
@@ -197,15 +214,45 @@ async def update_dialogue_title(db: AsyncSession, dialogue_id: int, user_id: int
     d = result.scalars().first()
     if d:
         d.title = title
-        await db.commit()
+        await commit(db)
         return True
     return False
 
-async def update_dialogue_messages(db: AsyncSession, dialogue_id: int, messages: List[dict]):
-    """更新对话消息内容"""
-    result = await db.execute(select(models.AIAssistantMessage).filter(models.AIAssistantMessage.id == dialogue_id))
-    d = result.scalars().first()
-    if d:
-        d.messages = json.dumps(messages)
-        d.timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        await db.commit()
+def dialogue_turn_text(turn) -> str:
+    """提取一轮对话中各条消息的文本内容（用于全文检索）"""
+    if not isinstance(turn, list):
+        return ""
+    parts = []
+    for message in turn:
+        if isinstance(message, dict) and isinstance(message.get("content"), str):
+            parts.append(message["content"])
+    return "\n".join(parts)
+
+async def append_dialogue_turn(db: AsyncSession, dialogue_id: int, user_id: int, turn: List[dict]) -> bool:
+    """
+    向对话追加一轮消息（只插入一行，不读取或重写历史消息）
+
+    返回:
+        bool: 对话存在且属于该用户时返回 True
+    """
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    result = await db.execute(update(models.AIAssistantMessage).where(
+        models.AIAssistantMessage.id == dialogue_id,
+        models.AIAssistantMessage.user_id == user_id
+    ).values(timestamp=now))
+    if result.rowcount == 0:
+        return False
+
+    # 序号在同一条语句中计算，保证并发追加时不会重复
+    next_seq = select(
+        literal(dialogue_id),
+        func.coalesce(func.max(models.DialogueTurn.seq), -1) + 1,
+        literal(json.dumps(turn)),
+        literal(dialogue_turn_text(turn)),
+        literal(now)
+    ).filter(models.DialogueTurn.dialogue_id == dialogue_id)
+    await db.execute(insert(models.DialogueTurn).from_select(
+        ["dialogue_id", "seq", "content", "text", "created_at"], next_seq
+    ))
+    await commit(db)
+    return True
@@ -30,7 +30,16 @@ def map_card_to_tool(card_type, card_data):
     tool_name = "unknown_tool"
     tool_args = {}
     
-    if card_type == 1:
+    if card_type == 1 and card_data.get("rule"):
+        tool_name = "create_recurring_task"
+        tool_args = {
+            "title": card_data.get("title"),
+            "rule": card_data.get("rule"),
+            "start_date": card_data.get("assigned_date"),
+            "description": card_data.get("description"),
+            "tags": card_data.get("tags")
+        }
+    elif card_type == 1:
         tool_name = "create_task"
         tool_args = {
             "title": card_data.get("title"),
@@ -120,16 +129,12 @@ async def run_chat_stream(user_id: int, dialogue_id: int, content: str):
                 
                 # 3. 准备聊天历史
                 _log("ai_service.run_agent", "history.load.start", dialogue_id=dialogue_id)
-                dialogue = await ai_config_service.get_dialogue(db, dialogue_id, user_id)
+                # 只读取上下文窗口内的最近几轮（ORDER BY seq DESC LIMIT N）
+                max_turns = _get_context_window_turns()
+                turn_lists = await ai_config_service.get_recent_dialogue_turns(db, dialogue_id, user_id, max_turns or None)
                 chat_history = []
-                if dialogue and dialogue.messages:
-                    # dialogue.messages 是 List[List[dict]] (schemas.AiMessage 中的定义)
-                    # 或者是 List[List[ChatTurn]]
-                    turn_lists = dialogue.messages
-                    max_turns = _get_context_window_turns()
-                    if max_turns and len(turn_lists) > max_turns:
-                        turn_lists = turn_lists[-max_turns:]
-
+                if turn_lists:
+                    # 每一轮是 List[dict]，即 [{"role": "user", ...}, {"role": "assistant", ...}]
                     for turn_list in turn_lists:
                         for msg in turn_list:
                             # msg 是 dict
@@ -237,12 +242,8 @@ async def run_chat_stream(user_id: int, dialogue_id: int, content: str):
                     {"role": "assistant", "content": final_content}
                 ]
                 
-                # 重新获取 dialogue 以防 detached
-                d = await ai_config_service.get_dialogue(db, dialogue_id, user_id)
-                if d:
-                    current_msgs = d.messages
-                    current_msgs.append(new_turn)
-                    await ai_config_service.update_dialogue_messages(db, dialogue_id, current_msgs)
+                # 追加一行记录，不重写历史消息
+                if await ai_config_service.append_dialogue_turn(db, dialogue_id, user_id, new_turn):
                     _log("ai_service.run_agent", "history.save.ok", dialogue_id=dialogue_id)
                     
             except Exception as e:
@@ -3,10 +3,12 @@ from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete, update
-from app.services import crud, ai_config_service
+from app.services import crud, ai_config_service, search_service
 from app.services.ai_output_manager import OutputManager
 from app.schemas import schemas
 from app.models import models
+from app.core.dates import normalize_date
+from app.core.database import BEGIN_IMMEDIATE, unit_of_work
 import datetime
 import json
 import time
@@ -62,12 +64,26 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
                 payload = " " + str(fields)
         print(f"[TS][{layer}] {_now_ts()} {message}{payload}")
     
+    async def _send_card(card_data: dict, need_confirm: bool) -> bool:
+        """
+        发送卡片并等待用户确认（工具在确认之后才写入）
+        等待期间其他请求可能已提交写入，先结束本会话的只读事务：SQLite 从过期的读快照升级为写事务时
+        会直接报 database is locked。确认后的写入从 BEGIN IMMEDIATE 的新事务开始，写锁持有到工具调用结束时提交
+        """
+        await db.rollback()
+        confirmed = await output_manager.send_card(card_data, need_confirm=need_confirm)
+        if confirmed:
+            await db.connection(execution_options={BEGIN_IMMEDIATE: True})
+        return confirmed
+
     def _wrap_tool(tool_name: str, fn):
         async def wrapped(**kwargs):
             start = time.perf_counter()
             _log("ai_tools.tool", "call.start", tool=tool_name, user_id=user_id, dialogue_id=getattr(output_manager, "_trace_dialogue_id", None), args=kwargs)
             try:
-                result = await fn(**kwargs)
+                # 一次工具调用内的所有写操作在同一事务中完成，结束时只提交一次
+                async with unit_of_work(db):
+                    result = await fn(**kwargs)
                 return result
             finally:
                 cost_ms = int((time.perf_counter() - start) * 1000)
@@ -121,7 +137,7 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
         }
         
         _log("ai_tools.create_task", "card.send", need_confirm=not auto_confirm)
-        confirmed = await output_manager.send_card(card_data, need_confirm=not auto_confirm)
+        confirmed = await _send_card(card_data, need_confirm=not auto_confirm)
         _log("ai_tools.create_task", "card.confirmed", confirmed=confirmed)
         
         if confirmed:
@@ -152,6 +168,53 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
         _log("ai_tools.create_task", "cancelled")
         return "用户取消了创建任务"
 
+    class CreateRecurringTaskInput(BaseModel):
+        title: str = Field(..., description="任务标题(必填项)")
+        rule: str = Field(..., description="重复规则: daily / weekly / monthly，或 RRULE 子集，如 FREQ=WEEKLY;BYDAY=MO,WE,FR、FREQ=DAILY;INTERVAL=2;COUNT=30、FREQ=MONTHLY;BYMONTHDAY=1;UNTIL=20271231")
+        start_date: Optional[str] = Field(None, description="开始日期 YYYY-MM-DD，默认今天")
+        description: Optional[str] = Field(None, description="任务描述")
+        assigned_start_time: Optional[str] = Field(None, description="开始时间 HH:MM")
+        assigned_end_time: Optional[str] = Field(None, description="结束时间 HH:MM")
+        tags: Optional[List[str]] = Field(None, description="标签列表")
+        record_result: Optional[bool] = Field(False, description="是否记录结果")
+
+    async def create_recurring_task(title: str, rule: str, start_date: str = None, description: str = None,
+                                    assigned_start_time: str = None, assigned_end_time: str = None,
+                                    tags: List[str] = None, record_result: bool = False):
+        """创建重复任务（习惯打卡等），只保存一条规则，不逐天创建任务"""
+        effective_start_date = start_date or datetime.datetime.now().strftime("%Y-%m-%d")
+        card_data = {
+            "type": 1,
+            "data": {
+                "title": title,
+                "description": description,
+                "rule": rule,
+                "assigned_date": effective_start_date,
+                "assigned_start_time": assigned_start_time,
+                "assigned_end_time": assigned_end_time,
+                "tags": tags if tags is not None else [],
+                "record_result": record_result
+            }
+        }
+        confirmed = await _send_card(card_data, need_confirm=not await check_auto_confirm('create'))
+        if confirmed:
+            try:
+                recurrence = await crud.create_recurrence(schemas.TaskRecurrenceCreate(
+                    user_id=user_id,
+                    title=title,
+                    description=description,
+                    rule=rule,
+                    start_date=effective_start_date,
+                    assigned_start_time=assigned_start_time,
+                    assigned_end_time=assigned_end_time,
+                    tags=tags if tags is not None else [],
+                    record_result=record_result
+                ), db)
+                return f"重复任务已创建，ID: {recurrence.id}，规则: {recurrence.rule}"
+            except Exception as e:
+                return f"创建重复任务失败: {str(e)}"
+        return "用户取消了创建任务"
+
     class DeleteTaskInput(BaseModel):
         task_id: int = Field(..., description="要删除的任务ID")
 
@@ -175,7 +238,7 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
         }
         
         _log("ai_tools.delete_task", "card.send", need_confirm=not auto_confirm, task_id=task_id)
-        confirmed = await output_manager.send_card(card_data, need_confirm=not auto_confirm)
+        confirmed = await _send_card(card_data, need_confirm=not auto_confirm)
         _log("ai_tools.delete_task", "card.confirmed", confirmed=confirmed, task_id=task_id)
         
         if confirmed:
@@ -213,39 +276,32 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
         if not task:
             return f"任务 {task_id} 不存在"
         
-        # 构造更新对象，如果未提供则保留现有值
-        updated_data = task.dict()
-        if title is not None: updated_data['title'] = title
-        if description is not None: updated_data['description'] = description
-        if status is not None: updated_data['status'] = status
-        if due_date is not None: updated_data['due_date'] = due_date
-        if assigned_date is not None: updated_data['assigned_date'] = assigned_date
-        if assigned_start_time is not None: updated_data['assigned_start_time'] = assigned_start_time
-        if assigned_end_time is not None: updated_data['assigned_end_time'] = assigned_end_time
-        if tags is not None: updated_data['tags'] = tags
-        if record_result is not None: updated_data['record_result'] = record_result
-        if result is not None: updated_data['result'] = result
-        if result_picture_url is not None: updated_data['result_picture_url'] = result_picture_url
-        if long_term_task_id is not None: updated_data['long_term_task_id'] = long_term_task_id
-        
-        # 为更新创建 schema 对象
+        # 只提交实际提供的字段，未提供的保持现有值
+        changes = {
+            "title": title, "description": description, "status": status, "due_date": due_date,
+            "assigned_date": assigned_date, "assigned_start_time": assigned_start_time,
+            "assigned_end_time": assigned_end_time, "tags": tags, "record_result": record_result,
+            "result": result, "result_picture_url": result_picture_url, "long_term_task_id": long_term_task_id,
+        }
+        changes = {k: v for k, v in changes.items() if v is not None}
         try:
-            task_update = schemas.Task(**updated_data)
+            task_patch = schemas.TaskPatch(**changes)
         except Exception as e:
             return f"更新数据无效: {str(e)}"
 
+        original = task.dict()
         card_data = {
             "type": 3, # 更新确认
             "data": {
-                "original": task.dict(),
-                "updated": updated_data
+                "original": original,
+                "updated": {**original, **task_patch.model_dump(exclude_unset=True)}
             }
         }
         
-        confirmed = await output_manager.send_card(card_data, need_confirm=not await check_auto_confirm('update'))
+        confirmed = await _send_card(card_data, need_confirm=not await check_auto_confirm('update'))
         
         if confirmed:
-            success = await crud.update_task(task_id, task_update, db)
+            success = await crud.patch_task(task_id, task_patch, db)
             if success:
                 return f"任务 {task_id} 已更新"
             return f"任务 {task_id} 更新失败"
@@ -257,17 +313,21 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
 
     async def get_tasks(start_date: str, end_date: str):
         """获取指定日期范围内的任务列表"""
-        tasks = await crud.get_tasks_in_date_range(start_date, end_date, user_id, db)
+        try:
+            tasks = await crud.get_tasks_in_date_range(start_date, end_date, user_id, db)
+        except ValueError:
+            return "日期格式无效，请使用 YYYY-MM-DD"
         if not tasks:
             return "该时间段内没有任务"
         return str([{"id": t.id, "title": t.title, "due_date": t.due_date, "status": t.status} for t in tasks])
 
     class GetUrgentTasksInput(BaseModel):
-        pass
+        limit: int = Field(10, description="最多返回的任务数")
+        within_days: Optional[float] = Field(None, description="只返回截止时间在多少天以内的任务（已逾期的总会返回）")
 
-    async def get_urgent_tasks():
-        """获取急需处理的任务（有截止日期且未完成）"""
-        tasks = await crud.get_urgent_tasks(user_id, db)
+    async def get_urgent_tasks(limit: int = 10, within_days: Optional[float] = None):
+        """获取急需处理的任务（有截止日期且未完成），按紧急度排序"""
+        tasks = await crud.get_urgent_tasks(user_id, db, max(1, limit), within_days, sort="score")
         if not tasks:
             return "没有急需处理的任务"
         return str(tasks)
@@ -294,7 +354,7 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
             }
         }
         
-        confirmed = await output_manager.send_card(card_data, need_confirm=not await check_auto_confirm('create'))
+        confirmed = await _send_card(card_data, need_confirm=not await check_auto_confirm('create'))
         
         if confirmed:
             try:
@@ -330,7 +390,7 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
             }
         }
         
-        confirmed = await output_manager.send_card(card_data, need_confirm=not await check_auto_confirm('delete'))
+        confirmed = await _send_card(card_data, need_confirm=not await check_auto_confirm('delete'))
         
         if confirmed:
             success = await crud.delete_long_term_task(task_id, db)
@@ -375,57 +435,13 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
             }
         }
         
-        confirmed = await output_manager.send_card(card_data, need_confirm=not await check_auto_confirm('update'))
+        confirmed = await _send_card(card_data, need_confirm=not await check_auto_confirm('update'))
         
         if confirmed:
-            # 同步更新子任务的关联状态
+            # sub_task_ids 同时决定子任务的关联关系，关联变更与长期任务本身的更新在同一事务中提交
             if sub_task_ids is not None:
-                try:
-                    _log("ai_tools.update_long_term_task", "subtasks.sync.start", task_id=task_id)
-                    # 1. 获取当前已关联的子任务
-                    result = await db.execute(select(models.Task).filter(models.Task.long_term_task_id == task_id))
-                    current_subtasks = result.scalars().all()
-                    current_ids = {t.id for t in current_subtasks}
-                    
-                    # 2. 获取新的子任务ID集合
-                    new_ids = set()
-                    for k in sub_task_ids.keys():
-                        try:
-                            new_ids.add(int(k))
-                        except (ValueError, TypeError):
-                            continue
-                            
-                    # 3. 计算需要添加和移除的任务
-                    to_add = new_ids - current_ids
-                    to_remove = current_ids - new_ids
-                    
-                    _log("ai_tools.update_long_term_task", "subtasks.sync.diff", task_id=task_id, to_add=sorted(list(to_add)), to_remove=sorted(list(to_remove)))
-                    
-                    # 4. 关联新任务
-                    for tid in to_add:
-                        task = await crud.get_task_by_id(tid, db)
-                        if task:
-                            # 创建更新后的任务对象
-                            # 注意：Pydantic v2使用 model_copy, v1使用 copy
-                            updated_task_data = task.dict()
-                            updated_task_data['long_term_task_id'] = task_id
-                            task_update = schemas.Task(**updated_task_data)
-                            await crud.update_task(tid, task_update, db)
-                            
-                    # 5. 解除旧任务关联
-                    for tid in to_remove:
-                        task = await crud.get_task_by_id(tid, db)
-                        if task:
-                            updated_task_data = task.dict()
-                            updated_task_data['long_term_task_id'] = None
-                            task_update = schemas.Task(**updated_task_data)
-                            await crud.update_task(tid, task_update, db)
-                            
-                except Exception as e:
-                    _log("ai_tools.update_long_term_task", "subtasks.sync.error", task_id=task_id, err=str(e))
-                    # 继续执行长期任务本身的更新，不因同步失败而完全中断
-            
-            success = await crud.update_long_term_task(task_id, lt_update, db)
+                _log("ai_tools.update_long_term_task", "subtasks.sync", task_id=task_id, sub_task_ids=sub_task_ids)
+            success = await crud.update_long_term_task(task_id, lt_update, db, relink=sub_task_ids is not None)
             if success:
                 return f"长期任务 {task_id} 已更新"
             return "更新失败"
@@ -453,6 +469,12 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
 
     async def update_journal(date: str, content: str):
         """更新指定日期的日记内容"""
+        try:
+            date = normalize_date(date)
+        except ValueError:
+            date = None
+        if not date:
+            return "日期格式无效，请使用 YYYY-MM-DD"
         old_journal = await crud.get_journal_by_date(date, user_id, db)
         before_content = old_journal.content if old_journal else ""
         
@@ -472,7 +494,7 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
             }
         }
         
-        confirmed = await output_manager.send_card(card_data, need_confirm=not await check_auto_confirm('update'))
+        confirmed = await _send_card(card_data, need_confirm=not await check_auto_confirm('update'))
         
         if confirmed:
             await crud.update_journal_content(date, content, user_id, db)
@@ -484,7 +506,10 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
 
     async def get_journal(date: str):
         """获取指定日期的日记"""
-        journal = await crud.get_journal_by_date(date, user_id, db)
+        try:
+            journal = await crud.get_journal_by_date(date, user_id, db)
+        except ValueError:
+            return "日期格式无效，请使用 YYYY-MM-DD"
         if journal:
             return f"日期: {journal.date}\n内容: {journal.content}"
         return "该日期没有日记"
@@ -495,7 +520,10 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
 
     async def get_journals_in_date_range(start_date: str, end_date: str):
         """获取指定日期范围内的所有日记"""
-        journals = await crud.get_journals_in_date_range(start_date, end_date, user_id, db)
+        try:
+            journals = await crud.get_journals_in_date_range(start_date, end_date, user_id, db)
+        except ValueError:
+            return "日期格式无效，请使用 YYYY-MM-DD"
         if not journals:
             return "该时间段内没有日记"
         
@@ -504,6 +532,27 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
             result_str += f"日期: {j.date}\n内容: {j.content}\n---\n"
         return result_str
 
+    class SearchRecordsInput(BaseModel):
+        query: str = Field(..., description="搜索关键词，多个关键词用空格分隔（需同时命中）")
+        types: Optional[List[str]] = Field(None, description="限定范围: task/journal/memo/dialogue，不填表示全部")
+
+    async def search_records(query: str, types: List[str] = None):
+        """全文搜索任务、日记、备忘录和历史对话"""
+        results = await search_service.search(db, user_id, query, types, limit=10)
+        if not results:
+            return "没有找到相关记录"
+        lines = []
+        for r in results:
+            if r["type"] == "task":
+                lines.append(f"[任务 ID:{r['id']}] {r['title']}: {r['snippet']}")
+            elif r["type"] == "journal":
+                lines.append(f"[日记 {r['date']}] {r['snippet']}")
+            elif r["type"] == "memo":
+                lines.append(f"[备忘录] {r['snippet']}")
+            else:
+                lines.append(f"[对话 ID:{r['id']} {r['title'] or ''}] {r['snippet']}")
+        return "\n".join(lines)
+
     # 4. Memo Management (Read-only)
     class GetMemoInput(BaseModel):
         pass
@@ -527,12 +576,12 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
             reminder["task_id"] = task_id
 
         card_data = {"type": 8, "data": reminder}
-        confirmed = await output_manager.send_card(card_data, need_confirm=not await check_auto_confirm_reminder())
+        confirmed = await _send_card(card_data, need_confirm=not await check_auto_confirm_reminder())
         if not confirmed:
             return "用户取消了提醒创建"
         try:
-            new_list = await crud.add_reminder(user_id, reminder, db)
-            return f"提醒已添加，共 {len(new_list)} 条"
+            new_reminder = await crud.add_reminder(user_id, reminder, db)
+            return f"提醒已添加，ID: {new_reminder['id']}，时间: {new_reminder['time']}"
         except Exception as e:
             return f"添加提醒失败: {str(e)}"
 
@@ -545,11 +594,11 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
         return json.dumps(reminders, ensure_ascii=False)
 
     class UpdateReminderListInput(BaseModel):
-        reminder_list: List[Dict[str, Any]] = Field(..., description="完整提醒列表(会自动校验并按time升序)")
+        reminder_list: List[Dict[str, Any]] = Field(..., description="完整提醒列表(会自动校验并按time升序；保留原有提醒的id，未列出的提醒会被删除)")
 
     async def update_reminder_list(reminder_list: List[Dict[str, Any]]):
         card_data = {"type": 9, "data": {"reminder_list": reminder_list}}
-        confirmed = await output_manager.send_card(card_data, need_confirm=not await check_auto_confirm('update'))
+        confirmed = await _send_card(card_data, need_confirm=not await check_auto_confirm('update'))
         if not confirmed:
             return "用户取消了提醒列表更新"
         try:
@@ -560,6 +609,7 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
 
     tools: List[StructuredTool] = [
         StructuredTool.from_function(coroutine=_wrap_tool("create_task", create_task), name="create_task", description="创建新任务", args_schema=CreateTaskInput),
+        StructuredTool.from_function(coroutine=_wrap_tool("create_recurring_task", create_recurring_task), name="create_recurring_task", description="创建按规则重复的任务（每天/每周几/每月的习惯或例行事项用它，不要逐天调用 create_task）", args_schema=CreateRecurringTaskInput),
         StructuredTool.from_function(coroutine=_wrap_tool("delete_task", delete_task), name="delete_task", description="删除任务", args_schema=DeleteTaskInput),
         StructuredTool.from_function(coroutine=_wrap_tool("update_task", update_task), name="update_task", description="更新任务信息", args_schema=UpdateTaskInput),
         StructuredTool.from_function(coroutine=_wrap_tool("get_tasks", get_tasks), name="get_tasks", description="获取任务列表", args_schema=GetTasksInput),
@@ -573,6 +623,7 @@ async def get_ai_tools(output_manager: OutputManager, user_id: int, db: AsyncSes
         StructuredTool.from_function(coroutine=_wrap_tool("update_journal", update_journal), name="update_journal", description="更新日记", args_schema=UpdateJournalInput),
         StructuredTool.from_function(coroutine=_wrap_tool("get_journal", get_journal), name="get_journal", description="获取指定日期的日记", args_schema=GetJournalInput),
         StructuredTool.from_function(coroutine=_wrap_tool("get_journals_in_date_range", get_journals_in_date_range), name="get_journals_in_date_range", description="获取指定日期范围内的日记", args_schema=GetJournalsInDateRangeInput),
+        StructuredTool.from_function(coroutine=_wrap_tool("search_records", search_records), name="search_records", description="按关键词全文搜索任务、日记、备忘录和历史对话（查找某条记录时优先使用，不要按日期范围逐段读取）", args_schema=SearchRecordsInput),
         
         StructuredTool.from_function(coroutine=_wrap_tool("get_memo", get_memo), name="get_memo", description="获取备忘录内容", args_schema=GetMemoInput),
         
@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models import models
-from app.core.database import SessionLocal
+from app.core.database import SessionLocal, commit
 import hashlib
 import datetime
 
@@ -77,10 +77,11 @@ async def register(data: RegisterRequest, db: AsyncSession = Depends(get_db)):
     
     # 保存到数据库
     db.add(new_user)
-    await db.commit()
-    await db.refresh(new_user)
+    await db.flush()
+    user_id = new_user.id
+    await commit(db)
     
-    return {"id": new_user.id, "username": new_user.username, "nickname": nickname}
+    return {"id": user_id, "username": username, "nickname": nickname}
 
 
 from pydantic import BaseModel
@@ -153,7 +154,7 @@ async def update_password(data: UpdatePasswordRequest, db: AsyncSession = Depend
     # 更新密码
     new_password_hash = hash_password(data.new_password)
     user.passwordHash = new_password_hash
-    await db.commit()
+    await commit(db)
     
     return {"message": "密码更新成功"}
 
@@ -194,7 +195,7 @@ async def update_nickname(data: UpdateNicknameRequest, db: AsyncSession = Depend
     print(f"[后端日志] 更新用户昵称为: {data.new_nickname}")
     
     # 保存到数据库
-    await db.commit()
+    await commit(db)
     print(f"[后端日志] 数据库提交成功")
     
     # 验证更新是否成功
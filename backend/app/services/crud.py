@@ -1,12 +1,42 @@
 import json
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
-from sqlalchemy import select, func
+from sqlalchemy.exc import SQLAlchemyError
+from pydantic import ValidationError
+from sqlalchemy import select, func, delete, insert, update, case, cast, and_, or_, bindparam, literal, union_all, Integer
 from typing import List, Optional
 from app.models import models
 from app.schemas import schemas
+from app.core.dates import normalize_date, normalize_datetime, to_epoch
+from app.core.recurrence import parse_rule, occurrence_task_id, parse_occurrence_task_id
+from app.core.config import DAILY_STATS_ENABLED
+from app.core.database import commit
+from app.core import data_versions
+from app.core.data_versions import bump_on_commit
+from app.core.cache import (
+    cached, invalidate_on_commit, SCOPE_TASKS, SCOPE_LONG_TERM_TASKS, SCOPE_URGENT, SCOPE_CALENDAR
+)
 import calendar
-from datetime import datetime
+import time
+from datetime import date, datetime, timedelta
+
+# 流式返回任务列表时每次从数据库游标读取的行数
+TASK_STREAM_BATCH = 200
+
+# 任务写入后需要失效的读缓存范围：长期任务列表内嵌子任务及进度，日历按天统计任务数
+TASK_CACHE_SCOPES = (SCOPE_TASKS, SCOPE_LONG_TERM_TASKS, SCOPE_URGENT, SCOPE_CALENDAR)
+# 长期任务写入后需要失效的范围：任务列表内嵌所属长期任务的进度
+LONG_TERM_TASK_CACHE_SCOPES = (SCOPE_TASKS, SCOPE_LONG_TERM_TASKS, SCOPE_URGENT)
+
+def _tasks_changed(db: AsyncSession, user_id: int):
+    """登记任务数据的修改：提交前递增数据版本号，提交后失效相关读缓存"""
+    bump_on_commit(db, user_id, data_versions.TASKS)
+    invalidate_on_commit(db, user_id, *TASK_CACHE_SCOPES)
+
+def _long_term_tasks_changed(db: AsyncSession, user_id: int):
+    """登记长期任务数据的修改（含进度和子任务关联）"""
+    bump_on_commit(db, user_id, data_versions.LONG_TERM_TASKS)
+    invalidate_on_commit(db, user_id, *LONG_TERM_TASK_CACHE_SCOPES)
 
 async def create_task(task: schemas.TaskCreate, db: AsyncSession) -> schemas.Task:
     """
@@ -19,12 +49,25 @@ async def create_task(task: schemas.TaskCreate, db: AsyncSession) -> schemas.Tas
     返回:
         schemas.Task: 创建成功的任务对象
     """
+    task_id = await _insert_task(db, task)
+    await commit(db)
+    
+    # 提交后对象已过期，重新查询（同时加载关联的长期任务）
+    return await get_task_by_id(task_id, db)
+
+async def _insert_task(db: AsyncSession, task: schemas.TaskCreate, affected: Optional[set] = None,
+                       recurrence_id: Optional[int] = None, occurrence_date: Optional[str] = None) -> int:
+    """
+    写入新任务及其标签、子任务关联，返回任务ID（不提交事务，affected 含义见 _move_subtask）
+    recurrence_id / occurrence_date 不为空时写入的是重复任务某个发生日的覆盖行
+    """
     db_task = models.Task(
         user_id=task.user_id,
         title=task.title,
         description=task.description,
         status=task.status,
         due_date=task.due_date,
+        due_at=to_epoch(task.due_date),
         created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         updated_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         assigned_date=task.assigned_date,
@@ -34,17 +77,17 @@ async def create_task(task: schemas.TaskCreate, db: AsyncSession) -> schemas.Tas
         record_result=1 if task.record_result else 0,
         result=task.result,
         result_picture_url=json.dumps(task.result_picture_url),
-        long_term_task_id=task.long_term_task_id
+        long_term_task_id=task.long_term_task_id,
+        recurrence_id=recurrence_id,
+        occurrence_date=occurrence_date
     )
     db.add(db_task)
-    await db.commit()
-    await db.refresh(db_task)
-    
-    # 如果任务关联了长期任务，自动计算并更新长期任务的进度
-    if db_task.long_term_task_id:
-        await update_long_term_task_progress(db_task.long_term_task_id, db)
-    
-    return map_task_to_schema(db_task)
+    await db.flush()
+    _tasks_changed(db, task.user_id)
+    await _set_task_tags(db, db_task.id, db_task.user_id, task.tags)
+    # 如果任务关联了长期任务，增量更新长期任务的进度
+    await _move_subtask(db, db_task.id, None, None, db_task.long_term_task_id, db_task.status, affected)
+    return db_task.id
 
 async def delete_task(task_id: int, db: AsyncSession) -> bool:
     """
@@ -57,21 +100,39 @@ async def delete_task(task_id: int, db: AsyncSession) -> bool:
     返回:
         bool: 删除是否成功
     """
+    if not await _delete_task_row(db, task_id):
+        return False
+    await commit(db)
+    
+    return True
+
+async def _delete_task_row(db: AsyncSession, task_id: int, affected: Optional[set] = None) -> bool:
+    """
+    删除任务及其标签、子任务关联（不提交事务，affected 含义见 _move_subtask）
+    重复任务的发生日（负数 ID 或覆盖行）删除后记入规则的 exdates，不再展开
+    """
+    if task_id < 0:
+        occurrence = parse_occurrence_task_id(task_id)
+        override_id = await _get_override_id(db, *occurrence) if occurrence else None
+        if override_id is None:
+            occurrence = await _load_occurrence(db, task_id)
+            if occurrence is None:
+                return False
+            await _exclude_occurrence(db, occurrence[0].id, occurrence[1])
+            return True
+        task_id = override_id
     result = await db.execute(select(models.Task).filter(models.Task.id == task_id))
     db_task = result.scalars().first()
     if not db_task:
         return False
+    _tasks_changed(db, db_task.user_id)
+    if db_task.recurrence_id is not None:
+        await _exclude_occurrence(db, db_task.recurrence_id, db_task.occurrence_date)
     
-    # 记录任务关联的长期任务ID，用于后续更新进度
-    long_term_task_id = db_task.long_term_task_id
-    
+    # 解除与长期任务的关联，并从长期任务进度中扣除该任务
+    await _move_subtask(db, task_id, db_task.long_term_task_id, db_task.status, None, None, affected)
+    await _set_task_tags(db, task_id, db_task.user_id, None)
     await db.delete(db_task)
-    await db.commit()
-    
-    # 如果任务关联了长期任务，自动计算并更新长期任务的进度
-    if long_term_task_id:
-        await update_long_term_task_progress(long_term_task_id, db)
-    
     return True
 
 async def create_long_term_task(task: schemas.LongTermTaskCreate, db: AsyncSession) -> schemas.LongTermTask:
@@ -91,42 +152,22 @@ async def create_long_term_task(task: schemas.LongTermTaskCreate, db: AsyncSessi
         description=task.description,
         start_date=task.start_date,
         due_date=task.due_date,
-        progress=task.progress,
-        created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        sub_task_ids=json.dumps(task.sub_task_ids) if task.sub_task_ids else "{}"
+        due_at=to_epoch(task.due_date),
+        progress=0.0,  # 进度由子任务权重汇总得出，不采用客户端传入的值
+        created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     )
     db.add(db_lt)
-    await db.commit()
-    await db.refresh(db_lt)
-    
-    if task.sub_task_ids:
-        old_long_term_task_ids = set()
-        for raw_task_id in task.sub_task_ids.keys():
-            try:
-                task_id = int(raw_task_id)
-            except (TypeError, ValueError):
-                continue
-            
-            result = await db.execute(select(models.Task).filter(
-                models.Task.id == task_id,
-                models.Task.user_id == task.user_id
-            ))
-            db_task = result.scalars().first()
-            if not db_task:
-                continue
-            
-            if db_task.long_term_task_id and db_task.long_term_task_id != db_lt.id:
-                old_long_term_task_ids.add(db_task.long_term_task_id)
-            
-            db_task.long_term_task_id = db_lt.id
-        
-        await db.commit()
-        await update_long_term_task_progress(db_lt.id, db)
-        for old_id in old_long_term_task_ids:
-            await update_long_term_task_progress(old_id, db)
-        await db.refresh(db_lt)
+    await db.flush()
+    long_term_task_id = db_lt.id
+    _long_term_tasks_changed(db, task.user_id)
+    
+    weights = _parse_sub_task_weights(task.sub_task_ids)
+    if weights:
+        await _relink_subtasks(db, long_term_task_id, task.user_id, weights, detach_missing=False)
     
-    return await map_long_term_task_to_schema(db, db_lt)
+    await commit(db)
+    
+    return await get_long_term_task_by_id(long_term_task_id, db)
 
 async def delete_long_term_task(task_id: int, db: AsyncSession) -> bool:
     """
@@ -143,8 +184,12 @@ async def delete_long_term_task(task_id: int, db: AsyncSession) -> bool:
     db_lt = result.scalars().first()
     if not db_lt:
         return False
+    _long_term_tasks_changed(db, db_lt.user_id)
+    # 解除子任务与该长期任务的关联
+    await db.execute(delete(models.LongTermTaskSubtask).where(models.LongTermTaskSubtask.long_term_task_id == task_id))
+    await db.execute(update(models.Task).where(models.Task.long_term_task_id == task_id).values(long_term_task_id=None))
     await db.delete(db_lt)
-    await db.commit()
+    await commit(db)
     return True
 
 def map_task_to_schema(t: models.Task) -> schemas.Task:
@@ -190,29 +235,35 @@ def map_task_to_schema(t: models.Task) -> schemas.Task:
         result=t.result,
         result_picture_url=json.loads(t.result_picture_url) if t.result_picture_url else [],
         long_term_task_id=t.long_term_task_id,
-        long_term_task=long_term_task
+        long_term_task=long_term_task,
+        recurrence_id=t.recurrence_id,
+        occurrence_date=t.occurrence_date,
+        rev=t.rev
     )
 
-async def map_long_term_task_to_schema(db: AsyncSession, lt: models.LongTermTask) -> schemas.LongTermTask:
-    # 处理新的数据格式: {"task_id": weight}
-    # 添加错误处理，防止sub_task_ids为None或无效JSON
-    try:
-        sub_task_ids = json.loads(lt.sub_task_ids) if lt.sub_task_ids else {}
-    except (json.JSONDecodeError, TypeError) as e:
-        print(f"Error parsing sub_task_ids: {e}, lt.sub_task_ids: {lt.sub_task_ids}")
-        sub_task_ids = {}
-    
-    # 确保是简单的键值对格式 {"task_id": weight}
-    if not isinstance(sub_task_ids, dict):
-        sub_task_ids = {}
-    
-    subtasks = []
-    if sub_task_ids:
-        task_ids = list(sub_task_ids.keys())
-        result = await db.execute(select(models.Task).filter(models.Task.id.in_(task_ids)))
-        tasks = result.scalars().all()
-        subtasks = [map_task_to_schema(t) for t in tasks]
-        
+async def _load_subtasks(db: AsyncSession, long_term_task_ids: List[int]) -> dict:
+    """
+    一次查询取出多个长期任务的子任务及其权重
+
+    返回:
+        {长期任务ID: [(Task, weight), ...]}，没有子任务的长期任务不在结果中
+    """
+    if not long_term_task_ids:
+        return {}
+    result = await db.execute(
+        select(models.LongTermTaskSubtask.long_term_task_id, models.Task, models.LongTermTaskSubtask.weight)
+        .join(models.LongTermTaskSubtask, models.LongTermTaskSubtask.task_id == models.Task.id)
+        .options(joinedload(models.Task.long_term_task))
+        .filter(models.LongTermTaskSubtask.long_term_task_id.in_(long_term_task_ids))
+        .order_by(models.Task.id)
+    )
+    subtasks = {}
+    for lt_id, t, weight in result.all():
+        subtasks.setdefault(lt_id, []).append((t, weight))
+    return subtasks
+
+def _long_term_task_to_schema(lt: models.LongTermTask, rows: list) -> schemas.LongTermTask:
+    # sub_task_ids 格式: {"task_id": weight}
     return schemas.LongTermTask(
         id=lt.id,
         user_id=lt.user_id,
@@ -221,12 +272,30 @@ async def map_long_term_task_to_schema(db: AsyncSession, lt: models.LongTermTask
         start_date=lt.start_date,
         due_date=lt.due_date,
         progress=lt.progress,
-        subtasks=subtasks,
+        subtasks=[map_task_to_schema(t) for t, _ in rows],
         created_at=lt.created_at,
-        sub_task_ids=sub_task_ids
+        sub_task_ids={str(t.id): weight for t, weight in rows},
+        rev=lt.rev
     )
 
+async def map_long_term_task_to_schema(db: AsyncSession, lt: models.LongTermTask) -> schemas.LongTermTask:
+    subtasks = await _load_subtasks(db, [lt.id])
+    return _long_term_task_to_schema(lt, subtasks.get(lt.id, []))
+
+async def map_long_term_tasks_to_schema(db: AsyncSession, lts: List[models.LongTermTask]) -> List[schemas.LongTermTask]:
+    """批量映射长期任务，所有子任务在一次查询中取出"""
+    subtasks = await _load_subtasks(db, [lt.id for lt in lts])
+    return [_long_term_task_to_schema(lt, subtasks.get(lt.id, [])) for lt in lts]
+
 async def get_task_by_id(task_id: int, db: AsyncSession) -> Optional[schemas.Task]:
+    """获取任务；重复任务发生日的负数 ID 返回其覆盖行，未覆盖时返回按规则生成的任务"""
+    if task_id < 0:
+        occurrence = parse_occurrence_task_id(task_id)
+        override_id = await _get_override_id(db, *occurrence) if occurrence else None
+        if override_id is None:
+            occurrence = await _load_occurrence(db, task_id)
+            return _occurrence_to_schema(*occurrence) if occurrence else None
+        task_id = override_id
     result = await db.execute(select(models.Task).options(
         joinedload(models.Task.long_term_task)
     ).filter(models.Task.id == task_id))
@@ -235,40 +304,313 @@ async def get_task_by_id(task_id: int, db: AsyncSession) -> Optional[schemas.Tas
         return None
     return map_task_to_schema(task)
 
-async def get_tasks_in_date_range(start_date: str, end_date: str, user_id: int, db: AsyncSession) -> List[schemas.Task]:
-    result = await db.execute(select(models.Task).options(
-        joinedload(models.Task.long_term_task)
-    ).filter(
-        models.Task.user_id == user_id,
-        models.Task.assigned_date >= start_date,
-        models.Task.assigned_date <= end_date
-    ))
-    tasks = result.scalars().all()
-    return [map_task_to_schema(t) for t in tasks]
+# 列表接口 fields= 参数可选的字段（稀疏字段集只查询这些列，不加载关联对象）
+TASK_FIELDS = (
+    "id", "user_id", "title", "description", "status", "due_date", "created_at", "updated_at",
+    "assigned_date", "assigned_start_time", "assigned_end_time", "tags", "record_result",
+    "result", "result_picture_url", "long_term_task_id", "recurrence_id", "occurrence_date",
+)
+LONG_TERM_TASK_FIELDS = (
+    "id", "user_id", "title", "description", "start_date", "due_date", "progress", "created_at", "sub_task_ids",
+)
+JOURNAL_FIELDS = ("date", "user_id", "content")
 
-async def get_all_tasks_for_user(user_id: int, db: AsyncSession) -> List[schemas.Task]:
-    result = await db.execute(select(models.Task).options(
-        joinedload(models.Task.long_term_task)
-    ).filter(models.Task.user_id == user_id))
-    tasks = result.scalars().all()
-    return [map_task_to_schema(t) for t in tasks]
+def _cache_key(values: Optional[List[str]]) -> Optional[tuple]:
+    """列表参数转为可哈希的缓存键"""
+    return tuple(values) if values else None
 
-async def get_all_long_term_tasks(user_id: int, db: AsyncSession) -> List[schemas.LongTermTask]:
-    result = await db.execute(select(models.LongTermTask).filter(models.LongTermTask.user_id == user_id))
-    lts = result.scalars().all()
-    return [await map_long_term_task_to_schema(db, lt) for lt in lts]
+def parse_fields(fields: Optional[str], allowed: tuple) -> Optional[List[str]]:
+    """
+    解析逗号分隔的 fields 参数，保持顺序并去重；为空时返回 None（返回完整对象）
 
-async def get_all_uncompleted_long_term_tasks(user_id: int, db: AsyncSession) -> List[schemas.LongTermTask]:
-    result = await db.execute(select(models.LongTermTask).filter(
+    异常:
+        ValueError: 包含不支持的字段
+    """
+    if not fields:
+        return None
+    names = []
+    for name in fields.split(","):
+        name = name.strip()
+        if not name or name in names:
+            continue
+        if name not in allowed:
+            raise ValueError(f"unknown field: {name}")
+        names.append(name)
+    return names or None
+
+def _task_row_to_dict(row, fields: List[str]) -> dict:
+    """将只包含部分列的查询结果行转换为响应字典（JSON 列解码，与 map_task_to_schema 一致）"""
+    item = {}
+    for name in fields:
+        value = getattr(row, name)
+        if name in ("tags", "result_picture_url"):
+            value = json.loads(value) if value else []
+        elif name == "record_result":
+            value = bool(value)
+        item[name] = value
+    return item
+
+def _task_list_query(user_id: int, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     tags: Optional[List[str]] = None, tag_mode: str = "any", after: Optional[tuple] = None,
+                     fields: Optional[List[str]] = None):
+    """
+    构造任务列表查询，按 (assigned_date, id) 升序排列（未安排日期的任务在最前），可走 (user_id, assigned_date) 索引
+
+    参数:
+        start_date, end_date: 安排日期范围（含首尾），任一为空时不限日期
+        after: 键集分页位置 (assigned_date, id)，只返回排在该位置之后的任务
+        fields: 只查询这些列（另外总会查询分页所需的 id 和 assigned_date），不加载关联的长期任务
+
+    异常:
+        ValueError: 日期格式无效
+    """
+    if fields:
+        columns = list(dict.fromkeys(["id", "assigned_date"] + fields))
+        query = select(*[getattr(models.Task, name) for name in columns])
+    else:
+        query = select(models.Task).options(joinedload(models.Task.long_term_task))
+    query = query.filter(models.Task.user_id == user_id)
+    if start_date and end_date:
+        start_date, end_date = normalize_date(start_date), normalize_date(end_date)
+        query = query.filter(
+            models.Task.assigned_date >= start_date,
+            models.Task.assigned_date <= end_date
+        )
+    query = _filter_by_tags(query, user_id, tags, tag_mode)
+    if after is not None:
+        after_date, after_id = after
+        if after_date is None:
+            # SQLite 升序排列时 NULL 在最前
+            query = query.filter(or_(
+                models.Task.assigned_date.isnot(None),
+                and_(models.Task.assigned_date.is_(None), models.Task.id > after_id)
+            ))
+        else:
+            query = query.filter(or_(
+                models.Task.assigned_date > after_date,
+                and_(models.Task.assigned_date == after_date, models.Task.id > after_id)
+            ))
+    return query.order_by(models.Task.assigned_date, models.Task.id)
+
+def _task_fields(fields: Optional[List[str]]) -> List[str]:
+    """稀疏字段集的输出字段，id 总是包含在内"""
+    return list(dict.fromkeys(["id"] + fields))
+
+async def _get_task_list(query, db: AsyncSession, fields: Optional[List[str]]) -> list:
+    result = await db.execute(query)
+    if fields:
+        output = _task_fields(fields)
+        return [_task_row_to_dict(row, output) for row in result.all()]
+    return [map_task_to_schema(t) for t in result.scalars().all()]
+
+async def get_tasks_in_date_range(start_date: str, end_date: str, user_id: int, db: AsyncSession,
+                                  tags: Optional[List[str]] = None, tag_mode: str = "any",
+                                  fields: Optional[List[str]] = None) -> list:
+    """
+    获取安排日期在 [start_date, end_date] 内的任务
+    assigned_date 以规范的 YYYY-MM-DD 存储，可直接走 (user_id, assigned_date) 索引做区间扫描
+    重复任务在范围内未覆盖的发生日按规则展开后一并返回（负数 ID，见 app/core/recurrence.py）
+
+    返回:
+        指定 fields 时为只包含这些字段（及 id）的字典列表，否则为 schemas.Task 列表
+
+    异常:
+        ValueError: 日期格式无效
+    """
+    query = _task_list_query(user_id, start_date, end_date, tags, tag_mode, fields=fields)
+    return await cached(db, user_id, SCOPE_TASKS, ("range", start_date, end_date, _cache_key(tags), tag_mode,
+                                                   _cache_key(fields)),
+                        lambda: _query_tasks_in_date_range(query, start_date, end_date, user_id, db,
+                                                           tags, tag_mode, fields))
+
+async def _query_tasks_in_date_range(query, start_date: str, end_date: str, user_id: int, db: AsyncSession,
+                                     tags: Optional[List[str]], tag_mode: str, fields: Optional[List[str]]) -> list:
+    """执行任务区间查询，并按 (assigned_date, id) 顺序并入展开的重复任务发生日"""
+    result = await db.execute(query)
+    output = _task_fields(fields) if fields else None
+    if fields:
+        rows = [(row.assigned_date, row.id, _task_row_to_dict(row, output)) for row in result.all()]
+    else:
+        rows = [(t.assigned_date, t.id, map_task_to_schema(t)) for t in result.scalars().all()]
+
+    occurrences = await _expand_occurrences(db, user_id, normalize_date(start_date), normalize_date(end_date))
+    if not occurrences:
+        return [item for _, _, item in rows]
+    wanted = _normalize_tags(tags)
+    for recurrence, day in occurrences:
+        task = _occurrence_to_schema(recurrence, day)
+        if wanted:
+            matched = [tag for tag in wanted if tag in task.tags]
+            if not matched or (tag_mode == "all" and len(matched) < len(wanted)):
+                continue
+        rows.append((day, task.id, {name: getattr(task, name) for name in output} if fields else task))
+    rows.sort(key=lambda row: (row[0] or "", row[1]))
+    return [item for _, _, item in rows]
+
+async def get_all_tasks_for_user(user_id: int, db: AsyncSession,
+                                 tags: Optional[List[str]] = None, tag_mode: str = "any",
+                                 fields: Optional[List[str]] = None) -> list:
+    """获取用户的全部任务（不限日期，重复任务只包含已覆盖的发生日，规则本身见 get_recurrences）"""
+    query = _task_list_query(user_id, tags=tags, tag_mode=tag_mode, fields=fields)
+    return await cached(db, user_id, SCOPE_TASKS, ("all", _cache_key(tags), tag_mode, _cache_key(fields)),
+                        lambda: _get_task_list(query, db, fields))
+
+async def get_tasks_page(user_id: int, limit: int, db: AsyncSession, after: Optional[tuple] = None,
+                         start_date: Optional[str] = None, end_date: Optional[str] = None,
+                         tags: Optional[List[str]] = None, tag_mode: str = "any",
+                         fields: Optional[List[str]] = None) -> tuple:
+    """
+    键集分页获取任务列表，每页最多 limit 条，下一页以本页最后一条的 (assigned_date, id) 作为 after
+    只包含 tasks 表中的任务（含重复任务的覆盖行），不展开重复任务未覆盖的发生日：
+    不限日期时发生日没有上限，无法与键集分页对齐。需要发生日时使用 get_tasks_in_date_range
+
+    返回:
+        (任务列表, 下一页位置)，本页不足 limit 条时下一页位置为 None
+
+    异常:
+        ValueError: 日期格式无效
+    """
+    query = _task_list_query(user_id, start_date, end_date, tags, tag_mode, after, fields).limit(limit)
+    result = await db.execute(query)
+    if fields:
+        rows = result.all()
+        output = _task_fields(fields)
+        tasks = [_task_row_to_dict(row, output) for row in rows]
+    else:
+        rows = result.scalars().all()
+        tasks = [map_task_to_schema(t) for t in rows]
+    next_after = (rows[-1].assigned_date, rows[-1].id) if len(rows) == limit else None
+    return tasks, next_after
+
+async def stream_tasks(user_id: int, db: AsyncSession, after: Optional[tuple] = None,
+                       start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       tags: Optional[List[str]] = None, tag_mode: str = "any",
+                       fields: Optional[List[str]] = None):
+    """
+    逐条产出任务（异步生成器），通过服务端游标每次只从数据库取 TASK_STREAM_BATCH 行，不在内存中构建完整列表
+    指定 fields 时产出字典，否则产出 schemas.Task；与 get_tasks_page 一样不展开重复任务的发生日
+
+    异常:
+        ValueError: 日期格式无效（在开始迭代时抛出）
+    """
+    query = _task_list_query(user_id, start_date, end_date, tags, tag_mode, after, fields)
+    result = await db.stream(query.execution_options(yield_per=TASK_STREAM_BATCH))
+    if fields:
+        output = _task_fields(fields)
+        async for row in result:
+            yield _task_row_to_dict(row, output)
+    else:
+        async for t in result.scalars():
+            yield map_task_to_schema(t)
+
+async def get_tag_counts(user_id: int, db: AsyncSession) -> List[dict]:
+    """
+    统计用户每个标签下的任务数（只扫描 task_tags 的 (user_id, tag) 索引）
+    返回: [{"tag": 标签, "count": 任务数}]，按任务数降序
+    """
+    count = func.count().label("count")
+    result = await db.execute(
+        select(models.TaskTag.tag, count)
+        .filter(models.TaskTag.user_id == user_id)
+        .group_by(models.TaskTag.tag)
+        .order_by(count.desc(), models.TaskTag.tag)
+    )
+    return [{"tag": tag, "count": n} for tag, n in result.all()]
+
+def _filter_by_tags(query, user_id: int, tags: Optional[List[str]], tag_mode: str = "any"):
+    """
+    按标签筛选任务
+    tag_mode 为 "any" 时匹配任一标签，为 "all" 时需要包含全部标签
+    """
+    tags = _normalize_tags(tags)
+    if not tags:
+        return query
+    matched = select(models.TaskTag.task_id).filter(
+        models.TaskTag.user_id == user_id,
+        models.TaskTag.tag.in_(tags)
+    )
+    if tag_mode == "all":
+        matched = matched.group_by(models.TaskTag.task_id).having(
+            func.count(models.TaskTag.tag) == len(tags)
+        )
+    return query.filter(models.Task.id.in_(matched))
+
+def _normalize_tags(tags: Optional[List[str]]) -> List[str]:
+    """去除首尾空白、空标签和重复标签，保留原有顺序"""
+    normalized = []
+    for tag in tags or []:
+        if not isinstance(tag, str):
+            continue
+        tag = tag.strip()
+        if tag and tag not in normalized:
+            normalized.append(tag)
+    return normalized
+
+async def _set_task_tags(db: AsyncSession, task_id: int, user_id: int, tags: Optional[List[str]]):
+    """重写任务在 task_tags 中的标签行，tags 为空时仅删除"""
+    await db.execute(delete(models.TaskTag).where(models.TaskTag.task_id == task_id))
+    rows = [{"task_id": task_id, "user_id": user_id, "tag": tag} for tag in _normalize_tags(tags)]
+    if rows:
+        await db.execute(insert(models.TaskTag), rows)
+
+async def _get_long_term_task_list(query, db: AsyncSession, fields: Optional[List[str]]) -> list:
+    """
+    执行长期任务列表查询；指定 fields 时只查询这些列，sub_task_ids 只读取关联表（不加载子任务）
+    """
+    if not fields:
+        result = await db.execute(query)
+        return await map_long_term_tasks_to_schema(db, result.scalars().all())
+
+    output = list(dict.fromkeys(["id"] + fields))
+    columns = [getattr(models.LongTermTask, name) for name in output if name != "sub_task_ids"]
+    result = await db.execute(query.with_only_columns(*columns))
+    items = [{name: getattr(row, name) for name in output if name != "sub_task_ids"} for row in result.all()]
+    if "sub_task_ids" in output:
+        weights = {item["id"]: {} for item in items}
+        if weights:
+            link = models.LongTermTaskSubtask
+            result = await db.execute(select(link.long_term_task_id, link.task_id, link.weight).filter(
+                link.long_term_task_id.in_(list(weights.keys()))
+            ).order_by(link.task_id))
+            for lt_id, task_id, weight in result.all():
+                weights[lt_id][str(task_id)] = weight
+        for item in items:
+            item["sub_task_ids"] = weights[item["id"]]
+        # 保持 fields 中的字段顺序
+        items = [{name: item[name] for name in output} for item in items]
+    return items
+
+async def get_all_long_term_tasks(user_id: int, db: AsyncSession, fields: Optional[List[str]] = None) -> list:
+    query = select(models.LongTermTask).filter(models.LongTermTask.user_id == user_id)
+    return await cached(db, user_id, SCOPE_LONG_TERM_TASKS, ("all", _cache_key(fields)),
+                        lambda: _get_long_term_task_list(query, db, fields))
+
+async def get_all_uncompleted_long_term_tasks(user_id: int, db: AsyncSession, fields: Optional[List[str]] = None) -> list:
+    query = select(models.LongTermTask).filter(
         models.LongTermTask.user_id == user_id,
         models.LongTermTask.progress < 1.0
-    ).order_by(models.LongTermTask.due_date))
-    lts = result.scalars().all()
-    return [await map_long_term_task_to_schema(db, lt) for lt in lts]
+    ).order_by(models.LongTermTask.due_at.is_(None), models.LongTermTask.due_at)
+    return await cached(db, user_id, SCOPE_LONG_TERM_TASKS, ("uncompleted", _cache_key(fields)),
+                        lambda: _get_long_term_task_list(query, db, fields))
 
 async def update_task(task_id: int, updated_task: schemas.Task, db: AsyncSession) -> bool:
+    if not await _update_task_row(db, task_id, updated_task):
+        return False
+
+    print(f"CRUD: 正在提交更改到数据库")
+    await commit(db)
+    print(f"CRUD: 任务更新成功")
+    
+    return True
+
+async def _update_task_row(db: AsyncSession, task_id: int, updated_task: schemas.Task,
+                           affected: Optional[set] = None) -> bool:
+    """按 updated_task 覆盖任务字段（不提交事务，affected 含义见 _move_subtask）"""
     print(f"CRUD: 正在更新任务 {task_id}")
     print(f"CRUD: 更新后的任务数据: {updated_task.dict()}")
+    task_id = await _materialize_occurrence(db, task_id)
+    if task_id is None:
+        return False
     
     result = await db.execute(select(models.Task).options(
         joinedload(models.Task.long_term_task)
@@ -279,6 +621,7 @@ async def update_task(task_id: int, updated_task: schemas.Task, db: AsyncSession
         return False
     
     print(f"CRUD: 原始任务数据: id={db_task.id}, title={db_task.title}, status={db_task.status}")
+    _tasks_changed(db, db_task.user_id)
     
     # 记录原始状态和长期任务ID，用于后续计算进度
     original_status = db_task.status
@@ -288,93 +631,521 @@ async def update_task(task_id: int, updated_task: schemas.Task, db: AsyncSession
     db_task.description = updated_task.description
     db_task.status = updated_task.status
     db_task.due_date = updated_task.due_date
-    db_task.updated_at = updated_task.updated_at
+    db_task.due_at = to_epoch(updated_task.due_date)
+    # 更新时间由服务端生成，保证格式统一
+    db_task.updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     db_task.assigned_date = updated_task.assigned_date
     db_task.assigned_start_time = updated_task.assigned_start_time
     db_task.assigned_end_time = updated_task.assigned_end_time
     db_task.tags = json.dumps(updated_task.tags)
+    await _set_task_tags(db, task_id, db_task.user_id, updated_task.tags)
     db_task.record_result = 1 if updated_task.record_result else 0
     db_task.result = updated_task.result
     db_task.result_picture_url = json.dumps(updated_task.result_picture_url)
     print(f"[[[[[Before update: long_term_task_id={db_task.long_term_task_id}")
     db_task.long_term_task_id = updated_task.long_term_task_id
     print(f"[[[[[After update: long_term_task_id={db_task.long_term_task_id}")
+    # 只有状态或所属长期任务变化时才更新长期任务进度（增量）
+    await _move_subtask(db, task_id, original_long_term_task_id, original_status,
+                        db_task.long_term_task_id, db_task.status, affected)
     print(f"[[[[[task_id: {task_id} title: {db_task.title}]")
+    return True
 
-    print(f"CRUD: 正在提交更改到数据库")
-    await db.commit()
-    await db.refresh(db_task)
-    print(f"CRUD: 任务更新成功")
-    
-    # # 如果任务关联了长期任务，自动计算并更新长期任务的进度
-    if db_task.long_term_task_id:
-        await update_long_term_task_progress(db_task.long_term_task_id, db)
-    
-    # # 如果任务原本关联了长期任务但现在取消了关联，也需要重新计算原长期任务的进度
-    if original_long_term_task_id and original_long_term_task_id != db_task.long_term_task_id:
-        await update_long_term_task_progress(original_long_term_task_id, db)
-    
+async def patch_task(task_id: int, patch: schemas.TaskPatch, db: AsyncSession) -> bool:
+    """
+    部分更新任务：只写入 patch 中出现的字段，在一条 UPDATE 中完成
+    只有 status 或 long_term_task_id 出现时才读取原值并增量调整长期任务进度
+
+    参数:
+        task_id: 任务ID
+        patch: 需要更新的字段
+        db: 数据库会话
+
+    返回:
+        bool: 任务是否存在
+    """
+    if not await _patch_task_row(db, task_id, patch):
+        return False
+    await commit(db)
+    return True
+
+async def _patch_task_row(db: AsyncSession, task_id: int, patch: schemas.TaskPatch,
+                          affected: Optional[set] = None) -> bool:
+    """按 patch 中出现的字段更新任务（不提交事务，affected 含义见 _move_subtask）"""
+    # 重复任务的发生日先写入覆盖行，再按普通任务更新
+    task_id = await _materialize_occurrence(db, task_id)
+    if task_id is None:
+        return False
+    fields = patch.model_dump(exclude_unset=True)
+    values = dict(fields)
+    if "due_date" in fields:
+        values["due_at"] = to_epoch(fields["due_date"])
+    if "tags" in fields:
+        values["tags"] = json.dumps(fields["tags"])
+    if "record_result" in fields:
+        values["record_result"] = 1 if fields["record_result"] else 0
+    if "result_picture_url" in fields:
+        values["result_picture_url"] = json.dumps(fields["result_picture_url"])
+    values["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # 标签行需要 user_id，进度调整需要原状态和原长期任务
+    original = None
+    if fields.keys() & {"status", "long_term_task_id", "tags"}:
+        result = await db.execute(select(
+            models.Task.user_id, models.Task.status, models.Task.long_term_task_id
+        ).filter(models.Task.id == task_id))
+        original = result.first()
+        if original is None:
+            return False
+
+    result = await db.execute(
+        update(models.Task).where(models.Task.id == task_id).values(**values).returning(models.Task.user_id)
+    )
+    user_id = result.scalar()
+    if user_id is None:
+        return False
+    _tasks_changed(db, user_id)
+    if "tags" in fields:
+        await _set_task_tags(db, task_id, original.user_id, fields["tags"])
+    if "status" in fields or "long_term_task_id" in fields:
+        await _move_subtask(
+            db, task_id, original.long_term_task_id, original.status,
+            fields.get("long_term_task_id", original.long_term_task_id), fields.get("status", original.status),
+            affected
+        )
+    return True
+
+async def batch_task_operations(operations: List[schemas.TaskBatchOperation], db: AsyncSession) -> List[dict]:
+    """
+    在同一事务中依次执行多个任务的创建/更新/删除操作
+
+    每个操作在各自的 SAVEPOINT 中执行，失败时只回滚该操作，其余操作照常提交。
+    受影响的长期任务在全部操作完成后统一重新计算一次进度，最后只提交一次。
+
+    参数:
+        operations: 操作列表，create 的 task 为 TaskCreate 字段，update 的 task 为 TaskPatch 字段（只写入出现的字段）
+        db: 数据库会话
+
+    返回:
+        [{"index", "op", "success", "task_id", "error"}]，与 operations 一一对应
+    """
+    affected = set()
+    results = []
+    for index, operation in enumerate(operations):
+        item = {"index": index, "op": operation.op, "success": False,
+                "task_id": operation.task_id, "error": None}
+        try:
+            async with db.begin_nested():
+                if operation.op == "create":
+                    item["task_id"] = await _insert_task(db, schemas.TaskCreate(**(operation.task or {})), affected)
+                    item["success"] = True
+                elif operation.task_id is None:
+                    item["error"] = "task_id is required"
+                elif operation.op == "update":
+                    patch = schemas.TaskPatch(**(operation.task or {}))
+                    item["success"] = await _patch_task_row(db, operation.task_id, patch, affected)
+                else:
+                    item["success"] = await _delete_task_row(db, operation.task_id, affected)
+                if not item["success"] and not item["error"]:
+                    item["error"] = "Task not found"
+        except ValidationError as e:
+            item["error"] = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+        except SQLAlchemyError as e:
+            item["error"] = str(e.orig if hasattr(e, "orig") else e)
+        results.append(item)
+
+    if affected:
+        await _recompute_progress(db, list(affected))
+    await commit(db)
+    print(f"CRUD: 批量任务操作完成，成功 {sum(r['success'] for r in results)}/{len(results)}，重新计算长期任务 {sorted(affected)}")
+    return results
+
+def map_recurrence_to_schema(r: models.TaskRecurrence) -> schemas.TaskRecurrence:
+    return schemas.TaskRecurrence(
+        id=r.id,
+        user_id=r.user_id,
+        title=r.title,
+        description=r.description,
+        status=r.status,
+        rule=r.rule,
+        start_date=r.start_date,
+        end_date=r.end_date,
+        assigned_start_time=r.assigned_start_time,
+        assigned_end_time=r.assigned_end_time,
+        tags=json.loads(r.tags) if r.tags else [],
+        record_result=bool(r.record_result),
+        exdates=json.loads(r.exdates) if r.exdates else [],
+        created_at=r.created_at,
+        updated_at=r.updated_at,
+        rev=r.rev
+    )
+
+def _occurrence_to_schema(r: models.TaskRecurrence, day: str) -> schemas.Task:
+    """重复任务未覆盖的发生日按规则生成的任务（不在 tasks 表中）"""
+    return schemas.Task(
+        id=occurrence_task_id(r.id, day),
+        user_id=r.user_id,
+        title=r.title,
+        description=r.description,
+        status=r.status,
+        due_date=None,
+        created_at=r.created_at,
+        updated_at=r.updated_at,
+        assigned_date=day,
+        assigned_start_time=r.assigned_start_time,
+        assigned_end_time=r.assigned_end_time,
+        tags=json.loads(r.tags) if r.tags else [],
+        record_result=bool(r.record_result),
+        result="",
+        result_picture_url=[],
+        long_term_task_id=None,
+        recurrence_id=r.id,
+        occurrence_date=day
+    )
+
+async def _expand_occurrences(db: AsyncSession, user_id: int, start_date: str, end_date: str) -> list:
+    """
+    展开 [start_date, end_date]（含首尾）内重复任务未覆盖、未删除的发生日
+    两次查询：与日期范围相交的规则，以及这些规则在范围内的覆盖行；发生日在内存中按规则计算
+
+    返回:
+        [(models.TaskRecurrence, YYYY-MM-DD)]，按 (日期, 规则ID) 升序
+    """
+    rec = models.TaskRecurrence
+    result = await db.execute(select(rec).filter(
+        rec.user_id == user_id,
+        rec.start_date <= end_date,
+        or_(rec.end_date.is_(None), rec.end_date >= start_date)
+    ))
+    recurrences = result.scalars().all()
+    if not recurrences:
+        return []
+    result = await db.execute(select(models.Task.recurrence_id, models.Task.occurrence_date).filter(
+        models.Task.recurrence_id.in_([r.id for r in recurrences]),
+        models.Task.occurrence_date >= start_date,
+        models.Task.occurrence_date <= end_date
+    ))
+    overridden = set(result.all())
+    first, last = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    occurrences = []
+    for r in recurrences:
+        rule = parse_rule(r.rule, r.start_date)
+        for day in rule.occurrences(first, last, json.loads(r.exdates) if r.exdates else []):
+            day = day.isoformat()
+            if (r.id, day) not in overridden:
+                occurrences.append((r, day))
+    occurrences.sort(key=lambda item: (item[1], item[0].id))
+    return occurrences
+
+async def _get_override_id(db: AsyncSession, recurrence_id: int, day: str) -> Optional[int]:
+    """发生日的覆盖行ID，没有覆盖时返回 None"""
+    result = await db.execute(select(models.Task.id).filter(
+        models.Task.recurrence_id == recurrence_id,
+        models.Task.occurrence_date == day
+    ))
+    return result.scalar()
+
+async def _load_occurrence(db: AsyncSession, task_id: int) -> Optional[tuple]:
+    """
+    解析发生日的负数任务ID
+
+    返回:
+        (models.TaskRecurrence, YYYY-MM-DD)；规则不存在、该日不是发生日或已被删除时返回 None
+    """
+    occurrence = parse_occurrence_task_id(task_id)
+    if occurrence is None:
+        return None
+    recurrence_id, day = occurrence
+    result = await db.execute(select(models.TaskRecurrence).filter(models.TaskRecurrence.id == recurrence_id))
+    r = result.scalars().first()
+    if r is None or day in (json.loads(r.exdates) if r.exdates else []):
+        return None
+    if not parse_rule(r.rule, r.start_date).occurs_on(date.fromisoformat(day)):
+        return None
+    return r, day
+
+async def _materialize_occurrence(db: AsyncSession, task_id: int) -> Optional[int]:
+    """
+    把重复任务的发生日写入为覆盖行并返回其ID（已有覆盖行时直接返回），普通任务的ID原样返回
+    发生日不存在时返回 None；不提交事务
+    """
+    if task_id >= 0:
+        return task_id
+    occurrence = parse_occurrence_task_id(task_id)
+    override_id = await _get_override_id(db, *occurrence) if occurrence else None
+    if override_id is not None:
+        return override_id
+    occurrence = await _load_occurrence(db, task_id)
+    if occurrence is None:
+        return None
+    r, day = occurrence
+    task = _occurrence_to_schema(r, day)
+    print(f"CRUD: 写入重复任务 {r.id} 在 {day} 的覆盖行")
+    return await _insert_task(db, schemas.TaskCreate(**task.model_dump(include=set(schemas.TaskCreate.model_fields))),
+                              recurrence_id=r.id, occurrence_date=day)
+
+async def _exclude_occurrence(db: AsyncSession, recurrence_id: int, day: Optional[str]):
+    """把发生日记入规则的 exdates，之后不再展开（不提交事务）"""
+    result = await db.execute(select(models.TaskRecurrence).filter(models.TaskRecurrence.id == recurrence_id))
+    r = result.scalars().first()
+    if r is None or not day:
+        return
+    exdates = set(json.loads(r.exdates) if r.exdates else [])
+    if day in exdates:
+        return
+    r.exdates = json.dumps(sorted(exdates | {day}))
+    r.updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _tasks_changed(db, r.user_id)
+
+def _apply_rule(db_recurrence: models.TaskRecurrence, rule_text: str, start_date: str):
+    """
+    解析规则并写入规范形式的规则、开始日期和最后一个发生日
+
+    异常:
+        ValueError: 规则无效
+    """
+    rule = parse_rule(rule_text, start_date)
+    last = rule.last_date()
+    db_recurrence.rule = str(rule)
+    db_recurrence.start_date = rule.start.isoformat()
+    db_recurrence.end_date = last.isoformat() if last else None
+
+async def create_recurrence(recurrence: schemas.TaskRecurrenceCreate, db: AsyncSession) -> schemas.TaskRecurrence:
+    """
+    创建重复任务：只写入一行规则，发生日在查询任务时按日期范围展开
+
+    异常:
+        ValueError: 规则无效
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    db_recurrence = models.TaskRecurrence(
+        user_id=recurrence.user_id,
+        title=recurrence.title,
+        description=recurrence.description,
+        status=recurrence.status,
+        assigned_start_time=recurrence.assigned_start_time,
+        assigned_end_time=recurrence.assigned_end_time,
+        tags=json.dumps(_normalize_tags(recurrence.tags)),
+        record_result=1 if recurrence.record_result else 0,
+        exdates="[]",
+        created_at=timestamp,
+        updated_at=timestamp
+    )
+    _apply_rule(db_recurrence, recurrence.rule, recurrence.start_date)
+    db.add(db_recurrence)
+    await db.flush()
+    created = map_recurrence_to_schema(db_recurrence)
+    _tasks_changed(db, recurrence.user_id)
+    await commit(db)
+    return created
+
+async def get_recurrences(user_id: int, db: AsyncSession) -> List[schemas.TaskRecurrence]:
+    result = await db.execute(select(models.TaskRecurrence).filter(
+        models.TaskRecurrence.user_id == user_id
+    ).order_by(models.TaskRecurrence.id))
+    return [map_recurrence_to_schema(r) for r in result.scalars().all()]
+
+async def get_recurrence_by_id(recurrence_id: int, db: AsyncSession) -> Optional[schemas.TaskRecurrence]:
+    result = await db.execute(select(models.TaskRecurrence).filter(models.TaskRecurrence.id == recurrence_id))
+    r = result.scalars().first()
+    return map_recurrence_to_schema(r) if r else None
+
+async def patch_recurrence(recurrence_id: int, patch: schemas.TaskRecurrencePatch,
+                           db: AsyncSession) -> Optional[schemas.TaskRecurrence]:
+    """
+    部分更新重复任务；修改只影响未覆盖的发生日，已完成或编辑过的发生日（覆盖行）保持不变
+
+    返回:
+        更新后的重复任务，不存在时返回 None
+
+    异常:
+        ValueError: 规则无效
+    """
+    result = await db.execute(select(models.TaskRecurrence).filter(models.TaskRecurrence.id == recurrence_id))
+    db_recurrence = result.scalars().first()
+    if not db_recurrence:
+        return None
+    fields = patch.model_dump(exclude_unset=True)
+    if "rule" in fields or "start_date" in fields:
+        _apply_rule(db_recurrence, fields.pop("rule", db_recurrence.rule),
+                    fields.pop("start_date", db_recurrence.start_date))
+    if "tags" in fields:
+        fields["tags"] = json.dumps(_normalize_tags(fields["tags"]))
+    if "record_result" in fields:
+        fields["record_result"] = 1 if fields["record_result"] else 0
+    if "exdates" in fields:
+        fields["exdates"] = json.dumps(fields["exdates"])
+    for name, value in fields.items():
+        setattr(db_recurrence, name, value)
+    db_recurrence.updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    await db.flush()
+    updated = map_recurrence_to_schema(db_recurrence)
+    _tasks_changed(db, db_recurrence.user_id)
+    await commit(db)
+    return updated
+
+async def delete_recurrence(recurrence_id: int, db: AsyncSession) -> bool:
+    """
+    删除重复任务：规则不再展开，已完成或编辑过的发生日（覆盖行）保留为普通任务
+    """
+    result = await db.execute(select(models.TaskRecurrence).filter(models.TaskRecurrence.id == recurrence_id))
+    db_recurrence = result.scalars().first()
+    if not db_recurrence:
+        return False
+    _tasks_changed(db, db_recurrence.user_id)
+    await db.execute(update(models.Task).where(models.Task.recurrence_id == recurrence_id).values(
+        recurrence_id=None, occurrence_date=None
+    ))
+    await db.delete(db_recurrence)
+    await commit(db)
     return True
 
-async def update_long_term_task(task_id: int, updated_task: schemas.LongTermTask, db: AsyncSession) -> bool:
+async def update_long_term_task(task_id: int, updated_task: schemas.LongTermTask, db: AsyncSession,
+                                relink: bool = False) -> bool:
+    """
+    更新长期任务
+
+    参数:
+        task_id: 长期任务ID
+        updated_task: 更新后的长期任务数据
+        db: 数据库会话
+        relink: 为 True 时 sub_task_ids 同时决定子任务的关联关系（新增的关联、未列出的解除关联），
+            否则只更新已关联子任务的权重
+
+    返回:
+        bool: 更新是否成功
+    """
     result = await db.execute(select(models.LongTermTask).filter(models.LongTermTask.id == task_id))
     db_lt = result.scalars().first()
     if not db_lt:
         return False
     
-    # 添加日志以查看sub_task_ids的内容
     print(f"[crud.py] 更新长期任务，task_id: {task_id}")
-    print(f"[crud.py] 更新前的sub_task_ids: {db_lt.sub_task_ids}")
-    print(f"[crud.py] 更新前的sub_task_ids类型: {type(db_lt.sub_task_ids)}")
-    
-    # 获取更新后的sub_task_ids
-    updated_sub_task_ids = None
-    if hasattr(updated_task, 'sub_task_ids') and updated_task.sub_task_ids is not None:
-        updated_sub_task_ids = updated_task.sub_task_ids
-        print(f"[crud.py] 更新后的sub_task_ids: {updated_sub_task_ids}")
-        print(f"[crud.py] 更新后的sub_task_ids类型: {type(updated_sub_task_ids)}")
-        try:
-            print(f"[crud.py] 更新后的sub_task_ids字符串: {str(updated_sub_task_ids)}")
-        except Exception as e:
-            print(f"[crud.py] 转换更新后的sub_task_ids为字符串时出错: {e}")
+    _long_term_tasks_changed(db, db_lt.user_id)
+    print(f"[crud.py] 更新后的sub_task_ids: {updated_task.sub_task_ids}")
         
     db_lt.title = updated_task.title
     db_lt.description = updated_task.description
     db_lt.start_date = updated_task.start_date
     db_lt.due_date = updated_task.due_date
-    db_lt.progress = updated_task.progress
+    db_lt.due_at = to_epoch(updated_task.due_date)
+    # 进度只由子任务权重汇总得出，忽略客户端传回的 progress（可能基于过期的数据）
     
     if updated_task.sub_task_ids is not None:
-        # 新格式: {"task_id": weight}，直接保存
-        final_sub_task_ids = json.dumps(updated_task.sub_task_ids)
-        db_lt.sub_task_ids = final_sub_task_ids
-        print(f"[crud.py] 最终保存的sub_task_ids: {final_sub_task_ids}")
+        # 未指定 relink 时 sub_task_ids 只更新已关联子任务的权重，未列出的子任务权重恢复为默认值 1.0
+        # 子任务的关联关系由 Task.long_term_task_id 决定
+        weights = _parse_sub_task_weights(updated_task.sub_task_ids)
+        if relink:
+            await _relink_subtasks(db, task_id, db_lt.user_id, weights)
+            # 汇总值已由 UPDATE 重新计算，重新读取后再叠加权重变化
+            await db.refresh(db_lt, ["total_weight", "completed_weight"])
+        result = await db.execute(select(models.LongTermTaskSubtask, models.Task.status).join(
+            models.Task, models.Task.id == models.LongTermTaskSubtask.task_id
+        ).filter(
+            models.LongTermTaskSubtask.long_term_task_id == task_id
+        ))
+        # 只按权重有变化的子任务调整汇总值
+        total_delta, completed_delta = 0.0, 0.0
+        for link, status in result.all():
+            new_weight = weights.get(link.task_id, 1.0)
+            if new_weight != link.weight:
+                total_delta += new_weight - link.weight
+                completed_delta += (new_weight - link.weight) * _status_factor(status)
+                link.weight = new_weight
+        db_lt.total_weight = round((db_lt.total_weight or 0.0) + total_delta, 9)
+        db_lt.completed_weight = round((db_lt.completed_weight or 0.0) + completed_delta, 9)
+        db_lt.progress = _calculate_progress(db_lt.total_weight, db_lt.completed_weight)
     
-    await db.commit()
-    
-    # 更新子任务后，重新计算进度
-    if updated_task.sub_task_ids is not None:
-        await update_long_term_task_progress(task_id, db)
+    await commit(db)
     
     return True
 
-async def get_journals_in_date_range(start_date: str, end_date: str, user_id: int, db: AsyncSession) -> List[schemas.Journal]:
-    result = await db.execute(select(models.Journal).filter(
+async def patch_long_term_task(task_id: int, patch: schemas.LongTermTaskPatch, db: AsyncSession) -> bool:
+    """
+    部分更新长期任务：只写入 patch 中出现的字段
+    出现 sub_task_ids 时按 PUT 的规则调整已关联子任务的权重（未列出的恢复为 1.0），并重新计算进度
+    progress 由子任务权重汇总得出，patch 中的 progress 被忽略
+
+    返回:
+        bool: 长期任务是否存在
+    """
+    fields = patch.model_dump(exclude_unset=True)
+    fields.pop("progress", None)
+    sub_task_ids = fields.pop("sub_task_ids", None)
+    values = dict(fields)
+    if "due_date" in fields:
+        values["due_at"] = to_epoch(fields["due_date"])
+
+    lt = models.LongTermTask
+    if values:
+        result = await db.execute(update(lt).where(lt.id == task_id).values(**values).returning(lt.user_id))
+    else:
+        result = await db.execute(select(lt.user_id).filter(lt.id == task_id))
+    user_id = result.scalar()
+    if user_id is None:
+        return False
+    _long_term_tasks_changed(db, user_id)
+
+    if sub_task_ids is not None:
+        weights = _parse_sub_task_weights(sub_task_ids)
+        link = models.LongTermTaskSubtask.__table__
+        await db.execute(update(link).where(
+            link.c.long_term_task_id == task_id,
+            link.c.task_id.not_in(list(weights.keys()))
+        ).values(weight=1.0))
+        if weights:
+            await db.execute(
+                update(link).where(
+                    link.c.long_term_task_id == task_id,
+                    link.c.task_id == bindparam("b_task_id")
+                ).values(weight=bindparam("b_weight")),
+                [{"b_task_id": tid, "b_weight": weight} for tid, weight in weights.items()]
+            )
+        await _recompute_progress(db, [task_id])
+    await commit(db)
+    return True
+
+async def get_journals_in_date_range(start_date: str, end_date: str, user_id: int, db: AsyncSession,
+                                     fields: Optional[List[str]] = None) -> list:
+    """
+    获取日期在 [start_date, end_date] 内的日记，按日期升序
+
+    参数:
+        fields: 只查询这些列（date 总是包含在内），例如不含 content 时不读取日记正文
+
+    异常:
+        ValueError: 日期格式无效
+    """
+    start_date, end_date = normalize_date(start_date), normalize_date(end_date)
+    conditions = (
         models.Journal.user_id == user_id,
         models.Journal.date >= start_date,
         models.Journal.date <= end_date
-    ).order_by(models.Journal.date))
+    )
+    if fields:
+        output = list(dict.fromkeys(["date"] + fields))
+        result = await db.execute(select(
+            *[getattr(models.Journal, name) for name in output]
+        ).filter(*conditions).order_by(models.Journal.date))
+        return [{name: getattr(row, name) for name in output} for row in result.all()]
+    result = await db.execute(select(models.Journal).filter(*conditions).order_by(models.Journal.date))
     journals = result.scalars().all()
-    return [schemas.Journal(date=j.date, user_id=j.user_id, content=j.content) for j in journals]
+    return [schemas.Journal(date=j.date, user_id=j.user_id, content=j.content, rev=j.rev) for j in journals]
 
 async def get_journal_by_date(date: str, user_id: int, db: AsyncSession) -> Optional[schemas.Journal]:
+    date = normalize_date(date)
     result = await db.execute(select(models.Journal).filter(models.Journal.date == date, models.Journal.user_id == user_id))
     journal = result.scalars().first()
     if journal:
-        return schemas.Journal(date=journal.date, user_id=journal.user_id, content=journal.content)
+        return schemas.Journal(date=journal.date, user_id=journal.user_id, content=journal.content, rev=journal.rev)
     return None
 
 async def update_journal_content(date: str, new_content: str, user_id: int, db: AsyncSession) -> bool:
+    date = normalize_date(date)
+    if not date:
+        raise ValueError("invalid date")
     result = await db.execute(select(models.Journal).filter(models.Journal.date == date, models.Journal.user_id == user_id))
     journal = result.scalars().first()
     if journal:
@@ -382,43 +1153,60 @@ async def update_journal_content(date: str, new_content: str, user_id: int, db:
     else:
         journal = models.Journal(date=date, user_id=user_id, content=new_content)
         db.add(journal)
-    await db.commit()
+    invalidate_on_commit(db, user_id, SCOPE_CALENDAR)
+    bump_on_commit(db, user_id, data_versions.JOURNALS)
+    await commit(db)
     return True
 
-async def get_heatmap_data(year: int, month: int, user_id: int, db: AsyncSession) -> List[int]:
-    # 构造本月的起始日期
+# 区间热力图最多返回的天数
+MAX_HEATMAP_DAYS = 366 * 5
+
+def _month_range(year: int, month: int):
+    """返回 [本月第一天, 下月第一天) 的规范日期字符串"""
     start_date = f"{year}-{month:02d}-01"
-    # 构造本月的结束日期（下个月的第一天）
     if month == 12:
         end_date = f"{year+1}-01-01"
     else:
         end_date = f"{year}-{month+1:02d}-01"
-    
-    # 查询本月属于该用户且状态为3的所有任务
-    result = await db.execute(select(models.Task).filter(
-        models.Task.user_id == user_id,
-        models.Task.status == 3,
-        models.Task.assigned_date >= start_date,
-        models.Task.assigned_date < end_date
-    ))
-    tasks = result.scalars().all()
-    
-    # 获取本月天数，初始化每天任务完成数列表
-    days_in_month = calendar.monthrange(year, month)[1]
-    heatmap = [0] * days_in_month
-    
-    # 遍历任务，统计每一天的任务完成数
-    for t in tasks:
-        if t.assigned_date:
-            try:
-                day = int(t.assigned_date.split('-')[2])
-                if 1 <= day <= days_in_month:
-                    heatmap[day-1] += 1
-            except:
-                pass
-    
-    # 获取本月单日最大任务完成数
-    max_count = max(heatmap) if heatmap else 0
+    return start_date, end_date
+
+def _day_of_month(column):
+    """SQL 表达式：规范日期字符串中的日（1~31）"""
+    return cast(func.strftime('%d', column), Integer)
+
+async def _get_completed_counts(start_date: str, end_date: str, user_id: int, db: AsyncSession) -> dict:
+    """
+    统计 [start_date, end_date) 内每天安排且已完成的任务数
+
+    启用 daily_stats 时直接读取预聚合的每日统计（每天一行），否则在 tasks 表上按天分组统计
+    重复任务的发生日只有完成后写入的覆盖行（status 为 3）才计入，与普通任务一样统计；
+    未覆盖的发生日总是未完成，不论规则的 status
+
+    返回:
+        {YYYY-MM-DD: 已完成任务数}，没有完成任务的日期不在结果中
+    """
+    if DAILY_STATS_ENABLED:
+        stat = models.DailyStat
+        query = select(stat.day, stat.completed).filter(
+            stat.user_id == user_id,
+            stat.day >= start_date,
+            stat.day < end_date,
+            stat.completed > 0
+        )
+    else:
+        query = select(models.Task.assigned_date, func.count()).filter(
+            models.Task.user_id == user_id,
+            models.Task.status == 3,
+            models.Task.assigned_date >= start_date,
+            models.Task.assigned_date < end_date
+        ).group_by(models.Task.assigned_date)
+    result = await db.execute(query)
+    return dict(result.all())
+
+def _heatmap_levels(counts: List[int]) -> List[int]:
+    """把每天的完成数映射到热力等级（0~6），区间按这段时间内的单日最大完成数划分"""
+    # 获取单日最大任务完成数
+    max_count = max(counts) if counts else 0
     # 计算热力等级区间步长，最小为1
     step = max(1, max_count // 6) if max_count > 0 else 1
     # 构造长度为7的工具list，用于热力等级分区
@@ -431,37 +1219,64 @@ async def get_heatmap_data(year: int, month: int, user_id: int, db: AsyncSession
                 return idx
         return 6
     
+    return [get_level(x) for x in counts]
+
+async def get_heatmap_data(year: int, month: int, user_id: int, db: AsyncSession) -> List[int]:
+    return await cached(db, user_id, SCOPE_CALENDAR, ("heatmap", year, month),
+                        lambda: _query_heatmap_data(year, month, user_id, db))
+
+async def _query_heatmap_data(year: int, month: int, user_id: int, db: AsyncSession) -> List[int]:
+    start_date, end_date = _month_range(year, month)
+    counts = await _get_completed_counts(start_date, end_date, user_id, db)
+    
+    # 获取本月天数，生成每天任务完成数列表
+    days_in_month = calendar.monthrange(year, month)[1]
+    heatmap = [counts.get(f"{year}-{month:02d}-{d:02d}", 0) for d in range(1, days_in_month + 1)]
+    
     # 生成最终热力等级列表
-    result = [get_level(x) for x in heatmap]
-    return result
+    return _heatmap_levels(heatmap)
 
-async def get_journal_dates(year: int, month: int, user_id: int, db: AsyncSession) -> List[int]:
-    # 构造本月的起始日期
-    start_date = f"{year}-{month:02d}-01"
-    # 构造本月的结束日期（下个月的第一天）
-    if month == 12:
-        end_date = f"{year+1}-01-01"
-    else:
-        end_date = f"{year}-{month+1:02d}-01"
+async def get_heatmap_range(start_date: str, end_date: str, user_id: int, db: AsyncSession) -> dict:
+    """
+    获取任意日期范围（含首尾两天）的热力图数据，热力等级按整个范围统一划分
+
+    返回:
+        {"start_date", "end_date", "counts": [每天完成数], "levels": [每天热力等级]}
+
+    异常:
+        ValueError: 日期无效、结束日期早于开始日期或范围超过 MAX_HEATMAP_DAYS
+    """
+    return await cached(db, user_id, SCOPE_CALENDAR, ("heatmap_range", start_date, end_date),
+                        lambda: _query_heatmap_range(start_date, end_date, user_id, db))
+
+async def _query_heatmap_range(start_date: str, end_date: str, user_id: int, db: AsyncSession) -> dict:
+    start, end = normalize_date(start_date), normalize_date(end_date)
+    if not start or not end:
+        raise ValueError("start_date and end_date are required")
+    first = datetime.strptime(start, "%Y-%m-%d").date()
+    last = datetime.strptime(end, "%Y-%m-%d").date()
+    days = (last - first).days + 1
+    if days <= 0 or days > MAX_HEATMAP_DAYS:
+        raise ValueError("invalid date range")
     
-    # 查询本月属于该用户的所有日志
-    result = await db.execute(select(models.Journal).filter(
+    next_day = (last + timedelta(days=1)).strftime("%Y-%m-%d")
+    completed = await _get_completed_counts(start, next_day, user_id, db)
+    counts = [completed.get((first + timedelta(days=i)).strftime("%Y-%m-%d"), 0) for i in range(days)]
+    return {"start_date": start, "end_date": end, "counts": counts, "levels": _heatmap_levels(counts)}
+
+async def _get_journal_days(year: int, month: int, user_id: int, db: AsyncSession) -> List[int]:
+    """查询本月有日志的日（升序），由数据库完成按天去重"""
+    start_date, end_date = _month_range(year, month)
+    day = _day_of_month(models.Journal.date)
+    result = await db.execute(select(day).distinct().filter(
         models.Journal.user_id == user_id,
         models.Journal.date >= start_date,
         models.Journal.date < end_date
-    ))
-    journals = result.scalars().all()
-    
-    # 提取所有有日志的日期（日）
-    journal_days = []
-    for journal in journals:
-        try:
-            day = int(journal.date.split('-')[2])
-            journal_days.append(day)
-        except:
-            pass
-            
-    return sorted(list(set(journal_days)))
+    ).order_by(day))
+    return [d for d in result.scalars().all() if d]
+
+async def get_journal_dates(year: int, month: int, user_id: int, db: AsyncSession) -> List[int]:
+    return await _get_journal_days(year, month, user_id, db)
 
 async def get_journal_status_list(year: int, month: int, user_id: int, db: AsyncSession) -> List[bool]:
     """
@@ -473,38 +1288,80 @@ async def get_journal_status_list(year: int, month: int, user_id: int, db: Async
     
     # 初始化状态列表，默认为False
     status_list = [False] * days_in_month
-    
-    # 构造本月的起始日期
-    start_date = f"{year}-{month:02d}-01"
-    # 构造本月的结束日期（下个月的第一天）
-    if month == 12:
-        end_date = f"{year+1}-01-01"
-    else:
-        end_date = f"{year}-{month+1:02d}-01"
-    
-    # 查询本月属于该用户的所有日志
-    result = await db.execute(select(models.Journal).filter(
+    for day in await _get_journal_days(year, month, user_id, db):
+        if 1 <= day <= days_in_month:
+            status_list[day-1] = True
+            
+    return status_list
+
+async def get_calendar_month(year: int, month: int, user_id: int, db: AsyncSession) -> dict:
+    """
+    获取月历所需的全部按天数据（一次聚合查询，不读取日记正文）
+
+    返回:
+        {"year", "month", "journal": [是否有日记], "task_count": [安排在当天的任务数],
+         "completed_count": [其中已完成的任务数], "levels": [热力等级 0~6]}，列表每个元素对应当月一天
+    """
+    return await cached(db, user_id, SCOPE_CALENDAR, ("month", year, month),
+                        lambda: _query_calendar_month(year, month, user_id, db))
+
+async def _query_calendar_month(year: int, month: int, user_id: int, db: AsyncSession) -> dict:
+    start_date, end_date = _month_range(year, month)
+    journal_days = select(
+        models.Journal.date.label("day"),
+        literal(1).label("journal"),
+        literal(0).label("total"),
+        literal(0).label("completed")
+    ).filter(
         models.Journal.user_id == user_id,
         models.Journal.date >= start_date,
         models.Journal.date < end_date
-    ))
-    journals = result.scalars().all()
-    
-    # 更新状态列表
-    for journal in journals:
+    )
+    task_days = select(
+        models.Task.assigned_date,
+        literal(0),
+        func.count(),
+        func.sum(case((models.Task.status == 3, 1), else_=0))
+    ).filter(
+        models.Task.user_id == user_id,
+        models.Task.assigned_date >= start_date,
+        models.Task.assigned_date < end_date
+    ).group_by(models.Task.assigned_date)
+    days = union_all(journal_days, task_days).subquery()
+    result = await db.execute(select(
+        days.c.day, func.max(days.c.journal), func.sum(days.c.total), func.sum(days.c.completed)
+    ).group_by(days.c.day))
+
+    days_in_month = calendar.monthrange(year, month)[1]
+    journal = [False] * days_in_month
+    task_count = [0] * days_in_month
+    completed_count = [0] * days_in_month
+    for day, has_journal, total, completed in result.all():
         try:
-            day = int(journal.date.split('-')[2])
-            if 1 <= day <= days_in_month:
-                status_list[day-1] = True
-        except:
-            pass
-            
-    return status_list
+            index = int(day[8:10]) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < days_in_month:
+            journal[index] = bool(has_journal)
+            task_count[index] = int(total or 0)
+            completed_count[index] = int(completed or 0)
+    last_day = f"{year}-{month:02d}-{days_in_month:02d}"
+    # 未覆盖的发生日计入任务数；完成的发生日已有覆盖行，在上面的 tasks 统计中计入
+    for _, day in await _expand_occurrences(db, user_id, start_date, last_day):
+        task_count[int(day[8:10]) - 1] += 1
+    return {
+        "year": year,
+        "month": month,
+        "journal": journal,
+        "task_count": task_count,
+        "completed_count": completed_count,
+        "levels": _heatmap_levels(completed_count),
+    }
 
 async def update_long_term_task_progress(long_term_task_id: int, db: AsyncSession) -> bool:
     """
-    根据关联的子任务状态自动计算并更新长期任务的进度
-    考虑每个子任务的权重/比例
+    根据关联的子任务状态全量重新计算长期任务的权重汇总和进度（修复用）
+    日常写入通过 _apply_progress_delta 增量维护，这里用于校正历史数据或排查问题
     """
     print(f"CRUD: Updating progress for long-term task {long_term_task_id}")
     
@@ -515,107 +1372,337 @@ async def update_long_term_task_progress(long_term_task_id: int, db: AsyncSessio
         print(f"CRUD: Long-term task {long_term_task_id} not found")
         return False
     
-    # 获取所有关联的子任务
-    result = await db.execute(select(models.Task).filter(models.Task.long_term_task_id == long_term_task_id))
-    subtasks = result.scalars().all()
-    
-    if not subtasks:
-        print(f"CRUD: No subtasks found for long-term task {long_term_task_id}")
-        # 如果没有子任务，进度设为0
-        long_term_task.progress = 0.0
-        long_term_task.sub_task_ids = "{}"
-    else:
-        # 获取现有的子任务ID和权重信息
-        existing_sub_task_ids = {}
-        if long_term_task.sub_task_ids:
-            try:
-                existing_sub_task_ids = json.loads(long_term_task.sub_task_ids)
-                # 确保是简单的键值对格式 {"task_id": weight}
-                if not isinstance(existing_sub_task_ids, dict):
-                    existing_sub_task_ids = {}
-            except (json.JSONDecodeError, TypeError):
-                existing_sub_task_ids = {}
-        
-        # 计算加权进度
-        total_weight = 0.0
-        completed_weight = 0.0
-        
-        # 更新sub_task_ids字典，记录每个子任务的权重
-        sub_task_ids = {}
-        for task in subtasks:
-            task_id_str = str(task.id)
-            # 获取子任务的权重，默认为1.0
-            task_weight = float(existing_sub_task_ids.get(task_id_str, 1.0))
-            
-            # 根据任务状态计算完成的权重
-            if task.status == 3:  # 已完成
-                task_progress = 1.0
-                completed_weight += task_weight
-            elif task.status == 2:  # 进行中
-                task_progress = 0.5
-                completed_weight += task_weight * 0.5
-            else:  # 未开始
-                task_progress = 0.0
-            
-            total_weight += task_weight
-            # 保存子任务的权重信息
-            sub_task_ids[task_id_str] = task_weight
-        
-        # 计算加权进度
-        # 根据权重总和决定计算方式
-        if total_weight <= 1.0:
-            # 如果子任务权重总和小于等于1.0，子任务完成后直接计入子任务权重到progress中
-            progress = completed_weight
-        else:
-            # 如果子任务权重总和大于1.0，progress为(已完成子任务的权重总和)/(全部的子任务权重总和)
-            progress = completed_weight / total_weight if total_weight > 0 else 0.0
-        
-        # 更新长期任务的进度和子任务ID字典
-        long_term_task.progress = progress
-        long_term_task.sub_task_ids = json.dumps(sub_task_ids)
-        
-        print(f"CRUD: 已更新长期任务 {long_term_task_id} 的加权进度: {progress} (总权重: {total_weight}, 已完成权重: {completed_weight}, 计算方法: {'直接计算' if total_weight <= 1.0 else '比例计算'})")
+    total_weight, completed_weight = await _get_subtask_weight_totals(long_term_task_id, db)
+    progress = _calculate_progress(total_weight, completed_weight)
+    long_term_task.total_weight = total_weight
+    long_term_task.completed_weight = completed_weight
+    long_term_task.progress = progress
+    _long_term_tasks_changed(db, long_term_task.user_id)
+    print(f"CRUD: 已更新长期任务 {long_term_task_id} 的加权进度: {progress} (总权重: {total_weight}, 已完成权重: {completed_weight}, 计算方法: {'直接计算' if total_weight <= 1.0 else '比例计算'})")
     
-    await db.commit()
+    await commit(db)
     print(f"CRUD: 长期任务进度更新成功")
     return True
 
-async def get_urgent_tasks(user_id: int, db: AsyncSession) -> List[dict]:
-    # 获取所有有截止时间且未完成的短期任务（status != 3）
-    result = await db.execute(select(models.Task).filter(
+async def repair_long_term_task_progress(user_id: int, db: AsyncSession) -> int:
+    """
+    全量重新计算用户所有长期任务的权重汇总和进度（一次聚合查询）
+
+    返回:
+        int: 汇总值与实际不一致而被修正的长期任务数
+    """
+    status_factor = _status_factor_expr()
+    result = await db.execute(
+        select(
+            models.LongTermTaskSubtask.long_term_task_id,
+            func.sum(models.LongTermTaskSubtask.weight),
+            func.sum(models.LongTermTaskSubtask.weight * status_factor)
+        )
+        .join(models.Task, models.Task.id == models.LongTermTaskSubtask.task_id)
+        .join(models.LongTermTask, models.LongTermTask.id == models.LongTermTaskSubtask.long_term_task_id)
+        .filter(models.LongTermTask.user_id == user_id)
+        .group_by(models.LongTermTaskSubtask.long_term_task_id)
+    )
+    totals = {
+        lt_id: (round(float(total), 9), round(float(completed), 9))
+        for lt_id, total, completed in result.all()
+    }
+    
+    result = await db.execute(select(models.LongTermTask).filter(models.LongTermTask.user_id == user_id))
+    repaired = 0
+    for lt in result.scalars().all():
+        total_weight, completed_weight = totals.get(lt.id, (0.0, 0.0))
+        # 没有子任务的长期任务保留手动设置的进度
+        progress = _calculate_progress(total_weight, completed_weight) if total_weight > 0 else lt.progress
+        if (lt.total_weight, lt.completed_weight, lt.progress) != (total_weight, completed_weight, progress):
+            lt.total_weight = total_weight
+            lt.completed_weight = completed_weight
+            lt.progress = progress
+            repaired += 1
+    if repaired:
+        _long_term_tasks_changed(db, user_id)
+    await commit(db)
+    print(f"CRUD: 用户 {user_id} 的长期任务进度已重新计算，修正 {repaired} 个")
+    return repaired
+
+def _status_factor(status: Optional[int]) -> float:
+    """子任务状态对应的完成系数：已完成(3)为1，进行中(2)为0.5，其余为0"""
+    if status == 3:
+        return 1.0
+    if status == 2:
+        return 0.5
+    return 0.0
+
+def _status_factor_expr():
+    """_status_factor 的 SQL 表达式"""
+    return case(
+        (models.Task.status == 3, 1.0),
+        (models.Task.status == 2, 0.5),
+        else_=0.0
+    )
+
+async def _get_subtask_weight_totals(long_term_task_id: int, db: AsyncSession):
+    """
+    聚合查询长期任务的子任务权重
+    已完成(status=3)计全部权重，进行中(status=2)计一半权重，未开始不计
+
+    返回:
+        (总权重, 已完成权重)
+    """
+    status_factor = _status_factor_expr()
+    result = await db.execute(
+        select(
+            func.coalesce(func.sum(models.LongTermTaskSubtask.weight), 0.0),
+            func.coalesce(func.sum(models.LongTermTaskSubtask.weight * status_factor), 0.0)
+        )
+        .select_from(models.LongTermTaskSubtask)
+        .join(models.Task, models.Task.id == models.LongTermTaskSubtask.task_id)
+        .filter(models.LongTermTaskSubtask.long_term_task_id == long_term_task_id)
+    )
+    total_weight, completed_weight = result.one()
+    return float(total_weight), float(completed_weight)
+
+async def _apply_progress_delta(db: AsyncSession, long_term_task_id: Optional[int],
+                                total_delta: float, completed_delta: float):
+    """
+    在一条 UPDATE 中调整长期任务的权重汇总并重新计算进度（不读取子任务）
+    调用方负责提交事务
+    """
+    if not long_term_task_id or (total_delta == 0 and completed_delta == 0):
+        return
+    lt = models.LongTermTask
+    # 四舍五入到固定精度，避免浮点累加误差使已全部完成的任务进度略小于 1
+    new_total = func.round(lt.total_weight + total_delta, 9)
+    new_completed = func.round(lt.completed_weight + completed_delta, 9)
+    progress = case(
+        (new_total <= 0, 0.0),
+        (new_total <= 1.0, new_completed),
+        else_=new_completed / new_total
+    )
+    await db.execute(update(lt).where(lt.id == long_term_task_id).values(
+        total_weight=new_total,
+        completed_weight=new_completed,
+        progress=func.round(progress, 9)
+    ))
+
+async def _move_subtask(db: AsyncSession, task_id: int,
+                        old_long_term_task_id: Optional[int], old_status: Optional[int],
+                        new_long_term_task_id: Optional[int], new_status: Optional[int],
+                        affected: Optional[set] = None):
+    """
+    子任务的归属或状态变化时，更新关联表并增量调整相关长期任务的进度
+    归属不变且状态不变时不做任何操作；重新关联的子任务权重为默认值 1.0
+    传入 affected 集合时不调整进度，只把受影响的长期任务ID加入集合，由调用方最后统一 _recompute_progress
+    """
+    if affected is not None:
+        if old_long_term_task_id != new_long_term_task_id:
+            await _link_subtask(db, task_id, new_long_term_task_id)
+            affected.update(lt_id for lt_id in (old_long_term_task_id, new_long_term_task_id) if lt_id)
+        elif old_long_term_task_id and _status_factor(old_status) != _status_factor(new_status):
+            affected.add(old_long_term_task_id)
+        return
+    if old_long_term_task_id == new_long_term_task_id:
+        if old_long_term_task_id and _status_factor(old_status) != _status_factor(new_status):
+            weight = await _get_link_weight(db, task_id)
+            await _apply_progress_delta(
+                db, old_long_term_task_id, 0.0,
+                weight * (_status_factor(new_status) - _status_factor(old_status))
+            )
+        return
+    if old_long_term_task_id:
+        weight = await _get_link_weight(db, task_id)
+        await _apply_progress_delta(db, old_long_term_task_id, -weight, -weight * _status_factor(old_status))
+    await _link_subtask(db, task_id, new_long_term_task_id)
+    if new_long_term_task_id:
+        await _apply_progress_delta(db, new_long_term_task_id, 1.0, _status_factor(new_status))
+
+async def _relink_subtasks(db: AsyncSession, long_term_task_id: int, user_id: int,
+                           weights: dict, detach_missing: bool = True):
+    """
+    批量设置长期任务的子任务（查询和写入次数与子任务数量无关）
+
+    weights 中的任务（限该用户）关联到长期任务并使用给定权重，原属其他长期任务的从原任务中移出；
+    detach_missing 为 True 时，当前已关联但不在 weights 中的子任务解除关联。
+    已关联的子任务保持原权重，权重调整由调用方处理。
+    涉及的长期任务在一条 UPDATE 中重新汇总权重和进度，调用方负责提交事务。
+    """
+    conditions = [models.Task.id.in_(list(weights.keys()))]
+    if detach_missing:
+        conditions.append(models.Task.long_term_task_id == long_term_task_id)
+    result = await db.execute(select(models.Task.id, models.Task.long_term_task_id).filter(
         models.Task.user_id == user_id,
-        models.Task.due_date.isnot(None),
-        models.Task.due_date != "",
-        models.Task.status != 3
+        or_(*conditions)
     ))
-    short_tasks = result.scalars().all()
-    # 获取所有有截止时间且未完成的长期任务（progress < 1.0）
-    result = await db.execute(select(models.LongTermTask).filter(
-        models.LongTermTask.user_id == user_id,
-        models.LongTermTask.due_date.isnot(None),
-        models.LongTermTask.due_date != "",
-        models.LongTermTask.progress < 1.0
+    to_add, to_remove = [], []
+    affected = {long_term_task_id}
+    for task_id, current_lt_id in result.all():
+        if task_id in weights:
+            if current_lt_id != long_term_task_id:
+                to_add.append(task_id)
+                if current_lt_id:
+                    affected.add(current_lt_id)
+        elif detach_missing:
+            to_remove.append(task_id)
+    if not to_add and not to_remove:
+        return
+
+    await db.execute(delete(models.LongTermTaskSubtask).where(
+        models.LongTermTaskSubtask.task_id.in_(to_add + to_remove)
     ))
-    long_tasks = result.scalars().all()
-
-    urgent_list = []
-    for t in short_tasks:
-        urgent_list.append({
-            "id": t.id,
-            "title": t.title,
-            "due_date": t.due_date,
-            "type": "short"
-        })
-    for lt in long_tasks:
-        urgent_list.append({
-            "id": lt.id,
-            "title": lt.title,
-            "due_date": lt.due_date,
-            "type": "long"
-        })
-
-    urgent_list.sort(key=lambda x: x["due_date"])
-    return urgent_list
+    if to_add:
+        await db.execute(insert(models.LongTermTaskSubtask), [
+            {"long_term_task_id": long_term_task_id, "task_id": task_id, "weight": weights[task_id]}
+            for task_id in to_add
+        ])
+        await db.execute(update(models.Task).where(models.Task.id.in_(to_add)).values(
+            long_term_task_id=long_term_task_id
+        ))
+    if to_remove:
+        await db.execute(update(models.Task).where(models.Task.id.in_(to_remove)).values(
+            long_term_task_id=None
+        ))
+    await _recompute_progress(db, list(affected))
+
+async def _recompute_progress(db: AsyncSession, long_term_task_ids: List[int]):
+    """在一条 UPDATE 中按关联表重新汇总多个长期任务的权重和进度，调用方负责提交事务"""
+    lt = models.LongTermTask
+    link = models.LongTermTaskSubtask
+
+    def _sum(expr):
+        return func.round(func.coalesce(
+            select(func.sum(expr))
+            .select_from(link)
+            .join(models.Task, models.Task.id == link.task_id)
+            .where(link.long_term_task_id == lt.id)
+            .scalar_subquery(), 0.0
+        ), 9)
+
+    total = _sum(link.weight)
+    completed = _sum(link.weight * _status_factor_expr())
+    progress = case(
+        (total <= 0, 0.0),
+        (total <= 1.0, completed),
+        else_=completed / total
+    )
+    await db.execute(update(lt).where(lt.id.in_(long_term_task_ids)).values(
+        total_weight=total,
+        completed_weight=completed,
+        progress=func.round(progress, 9)
+    ))
+
+async def _get_link_weight(db: AsyncSession, task_id: int) -> float:
+    """子任务当前在关联表中的权重，没有关联记录时返回 0"""
+    result = await db.execute(select(models.LongTermTaskSubtask.weight).filter(
+        models.LongTermTaskSubtask.task_id == task_id
+    ))
+    weight = result.scalar()
+    return float(weight) if weight is not None else 0.0
+
+def _calculate_progress(total_weight: float, completed_weight: float) -> float:
+    """
+    根据权重总和计算进度
+    权重总和小于等于1.0时，已完成的权重直接计入进度；
+    大于1.0时，进度为 已完成权重/总权重
+    """
+    if total_weight <= 0:
+        return 0.0
+    if total_weight <= 1.0:
+        return round(completed_weight, 9)
+    return round(completed_weight / total_weight, 9)
+
+async def _link_subtask(db: AsyncSession, task_id: int, long_term_task_id: Optional[int], weight: float = 1.0):
+    """
+    将任务关联到长期任务（写入 long_term_task_subtasks），long_term_task_id 为 None 时仅解除关联
+    调用方负责同步 Task.long_term_task_id 并提交事务
+    """
+    await db.execute(delete(models.LongTermTaskSubtask).where(models.LongTermTaskSubtask.task_id == task_id))
+    if long_term_task_id:
+        await db.execute(insert(models.LongTermTaskSubtask).values(
+            long_term_task_id=long_term_task_id,
+            task_id=task_id,
+            weight=weight
+        ))
+
+def _parse_sub_task_weights(sub_task_ids: Optional[dict]) -> dict:
+    """将 API 中的 {"task_id": weight} 转为 {task_id(int): weight(float)}，忽略无效项"""
+    weights = {}
+    for raw_task_id, raw_weight in (sub_task_ids or {}).items():
+        try:
+            weights[int(raw_task_id)] = float(raw_weight)
+        except (TypeError, ValueError):
+            continue
+    return weights
+
+async def get_urgent_tasks(user_id: int, db: AsyncSession, limit: Optional[int] = None,
+                           within_days: Optional[float] = None, sort: str = "due") -> List[dict]:
+    """
+    获取有截止时间且未完成的短期任务（status != 3）和长期任务（progress < 1.0）
+
+    两类任务在一条 UNION ALL 查询中按 due_at 合并排序并截取前 limit 条，各自走 (user_id, due_at) 索引。
+
+    参数:
+        limit: 最多返回的条数，None 表示全部
+        within_days: 只返回截止时间在当前时间之后 within_days 天以内的任务（已逾期的总会返回）
+        sort: "due" 按截止时间升序；"score" 按紧急度降序
+
+    返回:
+        [{id, title, due_date, type, progress, score}]，type 为 short / long；
+        progress 为完成度（短期任务进行中计 0.5），score 为紧急度 = 剩余工作量 / max(剩余天数 + 1, 0.1)
+        结果会被缓存（最长 CACHE_TTL_SECONDS 秒），期间 score 和 within_days 不随时间推移重新计算
+    """
+    return await cached(db, user_id, SCOPE_URGENT, (limit, within_days, sort),
+                        lambda: _query_urgent_tasks(user_id, db, limit, within_days, sort))
+
+async def _query_urgent_tasks(user_id: int, db: AsyncSession, limit: Optional[int],
+                              within_days: Optional[float], sort: str) -> List[dict]:
+    now = to_epoch(datetime.now())
+    task, lt = models.Task, models.LongTermTask
+    short_tasks = select(
+        task.id, task.title, task.due_date, task.due_at,
+        literal("short").label("type"),
+        _status_factor_expr().label("progress")
+    ).filter(
+        task.user_id == user_id,
+        task.due_at.isnot(None),
+        task.status != 3
+    )
+    long_tasks = select(
+        lt.id, lt.title, lt.due_date, lt.due_at,
+        literal("long").label("type"),
+        lt.progress
+    ).filter(
+        lt.user_id == user_id,
+        lt.due_at.isnot(None),
+        lt.progress < 1.0
+    )
+    if within_days is not None:
+        deadline = now + int(within_days * 86400)
+        short_tasks = short_tasks.filter(task.due_at <= deadline)
+        long_tasks = long_tasks.filter(lt.due_at <= deadline)
+
+    urgent = union_all(short_tasks, long_tasks).subquery()
+    days_left = (urgent.c.due_at - now) / 86400.0
+    score = (1.0 - urgent.c.progress) / func.max(days_left + 1.0, 0.1)
+    query = select(urgent, score.label("score"))
+    if sort == "score":
+        query = query.order_by(score.desc(), urgent.c.due_at, urgent.c.type, urgent.c.id)
+    else:
+        # 按 due_at 排序，日期与日期时间混用时顺序同样正确
+        query = query.order_by(urgent.c.due_at, urgent.c.type, urgent.c.id)
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return [
+        {
+            "id": row.id,
+            "title": row.title,
+            "due_date": row.due_date,
+            "type": row.type,
+            "progress": row.progress,
+            "score": round(row.score, 4),
+        }
+        for row in result.all()
+    ]
 
 async def get_long_term_task_by_id(task_id: int, db: AsyncSession) -> Optional[schemas.LongTermTask]:
     """
@@ -649,9 +1736,12 @@ async def create_settings(settings: schemas.SettingsCreate, db: AsyncSession) ->
         theme_mode=settings.theme_mode
     )
     db.add(db_settings)
-    await db.commit()
-    await db.refresh(db_settings)
-    return db_settings
+    await db.flush()
+    # 提交前转换为 schema，数据已在内存中，无需提交后再 refresh
+    created = schemas.Settings.model_validate(db_settings)
+    bump_on_commit(db, settings.user_id, data_versions.SETTINGS)
+    await commit(db)
+    return created
 
 async def get_memo(user_id: int, db: AsyncSession) -> Optional[schemas.Memo]:
     result = await db.execute(select(models.Memo).filter(models.Memo.user_id == user_id))
@@ -673,9 +1763,10 @@ async def update_memo(user_id: int, content: str, db: AsyncSession) -> schemas.M
         )
         db.add(memo)
     
-    await db.commit()
-    await db.refresh(memo)
-    return memo
+    updated = schemas.Memo.model_validate(memo)
+    bump_on_commit(db, user_id, data_versions.MEMO)
+    await commit(db)
+    return updated
 
 async def update_settings(user_id: int, settings: schemas.SettingsUpdate, db: AsyncSession) -> Optional[schemas.Settings]:
     result = await db.execute(select(models.Settings).filter(models.Settings.user_id == user_id))
@@ -687,76 +1778,150 @@ async def update_settings(user_id: int, settings: schemas.SettingsUpdate, db: As
     for key, value in update_data.items():
         setattr(db_settings, key, value)
     
-    await db.commit()
-    await db.refresh(db_settings)
-    return db_settings
+    updated = schemas.Settings.model_validate(db_settings)
+    bump_on_commit(db, user_id, data_versions.SETTINGS)
+    await commit(db)
+    return updated
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+def _reminder_to_dict(r: models.Reminder, with_sync_fields: bool = False) -> dict:
+    item = {
+        "id": r.id,
+        "type": r.type,
+        "time": r.time,
+        "content": r.content
+    }
+    if r.task_id is not None:
+        item["task_id"] = r.task_id
+    if with_sync_fields:
+        item["updated_at"] = r.updated_at
+        item["deleted"] = bool(r.deleted)
+    return item
+
+def _reminder_row(user_id: int, item: dict, updated_at: int) -> dict:
+    """由已校验的提醒生成 reminders 表的列值"""
+    return {
+        "user_id": user_id,
+        "type": item["type"],
+        "time": item["time"],
+        "fire_at": to_epoch(item["time"]),
+        "content": item["content"],
+        "task_id": item.get("task_id"),
+        "updated_at": updated_at,
+        "deleted": 0
+    }
 
 async def get_reminder_list(user_id: int, db: AsyncSession) -> List[dict]:
-    result = await db.execute(select(models.AIConfig).filter(models.AIConfig.user_id == user_id))
-    config = result.scalars().first()
-    if not config or not config.reminder_list:
-        return []
-    try:
-        parsed = json.loads(config.reminder_list)
-    except (json.JSONDecodeError, TypeError):
-        return []
-    if not isinstance(parsed, list):
-        return []
-    normalized_items: List[dict] = []
-    for item in parsed:
-        if not isinstance(item, dict):
-            continue
-        try:
-            normalized_items.append(_normalize_reminder_item(item))
-        except ValueError:
-            continue
-    normalized_items.sort(key=lambda x: _parse_reminder_time(x["time"]))
-    return normalized_items
+    """获取用户未删除的提醒，按触发时间升序（走 (user_id, fire_at) 索引）"""
+    result = await db.execute(select(models.Reminder).filter(
+        models.Reminder.user_id == user_id,
+        models.Reminder.deleted == 0
+    ).order_by(models.Reminder.fire_at, models.Reminder.id))
+    return [_reminder_to_dict(r) for r in result.scalars().all()]
+
+async def get_reminder_changes(user_id: int, since: Optional[int], db: AsyncSession) -> dict:
+    """
+    获取提醒的增量变更（走 (user_id, rev) 索引）
+
+    sync_token 为全局同步修订号（见 migrations/m0013_sync_revisions.py），与行的 rev 在同一个读事务中读取：
+    修订号随提交严格递增，不受同一毫秒内的多次写入或服务器时钟调整的影响
+
+    参数:
+        since: 上次同步返回的 sync_token，为 None 时返回全部未删除的提醒；
+            大于当前修订号时（旧版本返回的毫秒时间戳或数据库已重建）返回包括已删除在内的全部提醒
+
+    返回:
+        {"reminders": [...], "sync_token": int}
+        增量结果中已删除的提醒 deleted 为 True；客户端下次以 sync_token 作为 since 请求
+    """
+    result = await db.execute(select(models.SyncRevision.rev).filter(models.SyncRevision.id == 1))
+    sync_token = result.scalar() or 0
+    if since is None:
+        reminders = await get_reminder_list(user_id, db)
+        return {"reminders": reminders, "sync_token": sync_token}
+    if since > sync_token:
+        since = 0
+
+    result = await db.execute(select(models.Reminder).filter(
+        models.Reminder.user_id == user_id,
+        models.Reminder.rev > since
+    ).order_by(models.Reminder.rev, models.Reminder.id))
+    return {
+        "reminders": [_reminder_to_dict(r, with_sync_fields=True) for r in result.scalars().all()],
+        "sync_token": sync_token
+    }
+
+async def add_reminder(user_id: int, reminder: dict, db: AsyncSession) -> dict:
+    """
+    新增一条提醒
+
+    返回:
+        新增的提醒（含 id）
+
+    异常:
+        ValueError: 提醒内容无效
+    """
+    if not isinstance(reminder, dict):
+        raise ValueError("reminder must be an object")
+    item = _normalize_reminder_item(reminder)
+    result = await db.execute(insert(models.Reminder).values(**_reminder_row(user_id, item, _now_ms())))
+    reminder_id = result.inserted_primary_key[0]
+    bump_on_commit(db, user_id, data_versions.REMINDERS)
+    await commit(db)
+    return {"id": reminder_id, **item}
+
+async def delete_reminder(user_id: int, reminder_id: int, db: AsyncSession) -> bool:
+    """删除一条提醒（保留墓碑行，增量同步时返回 deleted=True）"""
+    result = await db.execute(update(models.Reminder).where(
+        models.Reminder.id == reminder_id,
+        models.Reminder.user_id == user_id,
+        models.Reminder.deleted == 0
+    ).values(deleted=1, updated_at=_now_ms()))
+    if result.rowcount > 0:
+        bump_on_commit(db, user_id, data_versions.REMINDERS)
+    await commit(db)
+    return result.rowcount > 0
 
 async def update_reminder_list(user_id: int, reminder_list: Optional[List[dict]], db: AsyncSession) -> List[dict]:
-    result = await db.execute(select(models.AIConfig).filter(models.AIConfig.user_id == user_id))
-    config = result.scalars().first()
-    normalized_items: List[dict] = []
+    """
+    用完整列表替换用户的提醒
+    带有已存在 id 的提醒原地更新（内容不变时不修改），其余新增；列表中没有的提醒标记为删除
+
+    异常:
+        ValueError: 列表中存在无效提醒（此时不做任何修改）
+    """
+    items = []
     for item in (reminder_list or []):
         if not isinstance(item, dict):
             raise ValueError("reminder_list item must be an object")
-        normalized_items.append(_normalize_reminder_item(item))
-    normalized_items.sort(key=lambda x: _parse_reminder_time(x["time"]))
-    serialized = json.dumps(normalized_items, ensure_ascii=False)
-    if not config:
-        config = models.AIConfig(
-            user_id=user_id,
-            api_key="",
-            model="qwen-plus",
-            openai_base_url="",
-            prompt=None,
-            character=None,
-            long_term_memory=None,
-            ai_dialogue_id_list=json.dumps([]),
-            is_enable_prompt=0,
-            is_auto_confirm_create_request=0,
-            is_auto_confirm_update_request=0,
-            is_auto_confirm_delete_request=0,
-            is_auto_confirm_create_reminder=0,
-            reminder_list=serialized
-        )
-        db.add(config)
-    else:
-        config.reminder_list = serialized
-    await db.commit()
-    await db.refresh(config)
-    return await get_reminder_list(user_id, db)
+        items.append((item.get("id"), _normalize_reminder_item(item)))
 
-async def add_reminder(user_id: int, reminder: dict, db: AsyncSession) -> List[dict]:
-    if not isinstance(reminder, dict):
-        raise ValueError("reminder must be an object")
-    existing = await get_reminder_list(user_id, db)
-    existing.append(_normalize_reminder_item(reminder))
-    existing.sort(key=lambda x: _parse_reminder_time(x["time"]))
-    return await update_reminder_list(user_id, existing, db)
-
-def _parse_reminder_time(value: str) -> datetime:
-    return datetime.strptime(value, "%Y-%m-%d %H:%M")
+    result = await db.execute(select(models.Reminder).filter(
+        models.Reminder.user_id == user_id,
+        models.Reminder.deleted == 0
+    ))
+    existing = {r.id: r for r in result.scalars().all()}
+    now_ms = _now_ms()
+    new_rows = []
+    for reminder_id, item in items:
+        row = existing.pop(reminder_id, None) if isinstance(reminder_id, int) else None
+        if row is None:
+            new_rows.append(_reminder_row(user_id, item, now_ms))
+            continue
+        values = _reminder_row(user_id, item, now_ms)
+        if any(getattr(row, key) != values[key] for key in ("type", "time", "content", "task_id")):
+            for key, value in values.items():
+                setattr(row, key, value)
+    for row in existing.values():
+        row.deleted = 1
+        row.updated_at = now_ms
+    if new_rows:
+        await db.execute(insert(models.Reminder), new_rows)
+    bump_on_commit(db, user_id, data_versions.REMINDERS)
+    await commit(db)
+    return await get_reminder_list(user_id, db)
 
 def _normalize_reminder_item(item: dict) -> dict:
     reminder_type = item.get("type")
@@ -766,7 +1931,8 @@ def _normalize_reminder_item(item: dict) -> dict:
     time_value = item.get("time")
     if not isinstance(time_value, str) or not time_value.strip():
         raise ValueError("invalid reminder time")
-    _parse_reminder_time(time_value)
+    # 规范为 YYYY-MM-DD HH:MM，按字符串排序即按时间先后排序
+    time_value = normalize_datetime(time_value, require_time=True)
 
     content_value = item.get("content")
     if not isinstance(content_value, str) or not content_value.strip():
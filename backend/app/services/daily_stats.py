@@ -0,0 +1,83 @@
+# daily_stats 每日统计表：由 tasks 表上的触发器维护，热力图按天直接读取
+#
+# completed 按安排日期（assigned_date）统计已完成（status=3）的任务数，与热力图口径一致；
+# created 按创建日期（created_at 的日期部分）统计新建任务数。
+# 是否启用由 DAILY_STATS_ENABLED 控制：启动时按配置创建或删除触发器，
+# 从关闭切换为开启时（触发器不存在）会先按 tasks 表重建统计数据。
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.core.config import DAILY_STATS_ENABLED
+
+COMPLETED = "{row}.status = 3 AND {row}.assigned_date IS NOT NULL"
+
+INCREMENT_CREATED = (
+    "INSERT INTO daily_stats (user_id, day, completed, created) "
+    "VALUES (new.user_id, substr(new.created_at, 1, 10), 0, 1) "
+    "ON CONFLICT (user_id, day) DO UPDATE SET created = created + 1;"
+)
+DECREMENT_CREATED = (
+    "UPDATE daily_stats SET created = created - 1 "
+    "WHERE user_id = old.user_id AND day = substr(old.created_at, 1, 10);"
+)
+# 触发器中的 INSERT ... SELECT ... ON CONFLICT 需要 WHERE 子句以免语法歧义
+INCREMENT_COMPLETED = (
+    "INSERT INTO daily_stats (user_id, day, completed, created) "
+    "SELECT new.user_id, new.assigned_date, 1, 0 WHERE " + COMPLETED.format(row="new") + " "
+    "ON CONFLICT (user_id, day) DO UPDATE SET completed = completed + 1;"
+)
+DECREMENT_COMPLETED = (
+    "UPDATE daily_stats SET completed = completed - 1 "
+    "WHERE user_id = old.user_id AND day = old.assigned_date AND " + COMPLETED.format(row="old") + ";"
+)
+
+TRIGGERS = {
+    "tasks_daily_stats_ai":
+        "CREATE TRIGGER IF NOT EXISTS tasks_daily_stats_ai AFTER INSERT ON tasks BEGIN "
+        f"{INCREMENT_CREATED} {INCREMENT_COMPLETED} END",
+    "tasks_daily_stats_au":
+        "CREATE TRIGGER IF NOT EXISTS tasks_daily_stats_au AFTER UPDATE OF user_id, status, assigned_date ON tasks "
+        f"WHEN ({COMPLETED.format(row='old')}) OR ({COMPLETED.format(row='new')}) BEGIN "
+        f"{DECREMENT_COMPLETED} {INCREMENT_COMPLETED} END",
+    "tasks_daily_stats_ad":
+        "CREATE TRIGGER IF NOT EXISTS tasks_daily_stats_ad AFTER DELETE ON tasks BEGIN "
+        f"{DECREMENT_CREATED} {DECREMENT_COMPLETED} END",
+}
+
+REBUILD = (
+    "INSERT INTO daily_stats (user_id, day, completed, created) "
+    "SELECT user_id, day, sum(completed), sum(created) FROM ("
+    "  SELECT user_id, assigned_date AS day, count(*) AS completed, 0 AS created FROM tasks "
+    "  WHERE " + COMPLETED.format(row="tasks") + " GROUP BY user_id, assigned_date "
+    "  UNION ALL "
+    "  SELECT user_id, substr(created_at, 1, 10), 0, count(*) FROM tasks "
+    "  WHERE created_at IS NOT NULL GROUP BY user_id, substr(created_at, 1, 10)"
+    ") GROUP BY user_id, day"
+)
+
+
+async def sync_daily_stats(engine: AsyncEngine, enabled: bool = DAILY_STATS_ENABLED):
+    """
+    按配置创建或删除 daily_stats 的维护触发器（启动时调用，幂等）
+
+    参数:
+        engine: 数据库引擎
+        enabled: 是否启用每日统计表
+    """
+    async with engine.begin() as conn:
+        result = await conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'tasks' "
+            "AND name LIKE 'tasks_daily_stats_%'"
+        ))
+        existing = {row[0] for row in result.all()}
+        if not enabled:
+            for name in existing:
+                await conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            return
+        if existing == set(TRIGGERS):
+            return
+        # 触发器缺失期间的写入没有计入统计，整体重建
+        print("[daily_stats] 重建每日统计表")
+        await conn.execute(text("DELETE FROM daily_stats"))
+        await conn.execute(text(REBUILD))
+        for statement in TRIGGERS.values():
+            await conn.execute(text(statement))
@@ -0,0 +1,166 @@
+from sqlalchemy import text, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.models import models
+
+# search_index 中的来源类型（rowid = 来源主键 * 4 + 编码，见 migrations/m0009_search_index.py）
+SEARCH_TYPES = ("task", "journal", "memo", "dialogue")
+
+# trigram 分词器只能匹配至少 3 个字符的子串
+MIN_FTS_TERM_LENGTH = 3
+
+# 短关键词（不走 FTS）时直接查询各来源表，按 user_id 索引只读取该用户的行；
+# 列与 search_index 的内容一致（见 migrations/m0009_search_index.py），ts 为最后修改时间（日记为日期）
+SHORT_TERM_SOURCES = {
+    "task": (
+        "SELECT 'task' AS kind, id AS ref_id, NULL AS ref_key, title, "
+        "trim(coalesce(description, '') || char(10) || coalesce(result, ''), char(10)) AS body, updated_at AS ts "
+        "FROM tasks WHERE user_id = :user_id"
+    ),
+    "journal": (
+        "SELECT 'journal' AS kind, NULL AS ref_id, date AS ref_key, date AS title, content AS body, date AS ts "
+        "FROM journals WHERE user_id = :user_id AND date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+    ),
+    "memo": (
+        "SELECT 'memo' AS kind, NULL AS ref_id, NULL AS ref_key, NULL AS title, coalesce(content, '') AS body, "
+        "updated_at AS ts FROM memos WHERE user_id = :user_id"
+    ),
+    "dialogue": (
+        "SELECT 'dialogue' AS kind, turn.dialogue_id AS ref_id, turn.seq AS ref_key, NULL AS title, "
+        "coalesce(turn.text, '') AS body, turn.created_at AS ts "
+        "FROM ai_assistant_messages AS dialogue JOIN dialogue_turns AS turn ON turn.dialogue_id = dialogue.id "
+        "WHERE dialogue.user_id = :user_id"
+    ),
+}
+
+SNIPPET_OPEN = "<mark>"
+SNIPPET_CLOSE = "</mark>"
+SNIPPET_CONTEXT = 24  # 手工生成摘要时关键词前后保留的字符数
+
+
+def _split_terms(query: str) -> List[str]:
+    """按空白拆分关键词，去重并保留顺序"""
+    terms = []
+    for term in (query or "").split():
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def _fts_phrase(term: str) -> str:
+    """将关键词转为 FTS5 短语，避免其中的引号、括号等被当作查询语法"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _make_snippet(body: str, terms: List[str]) -> str:
+    """在正文中截取第一个关键词附近的片段并高亮（用于不经过 FTS 的短关键词查询）"""
+    body = body or ""
+    lowered = body.lower()
+    positions = [(lowered.find(t.lower()), t) for t in terms]
+    positions = [(pos, t) for pos, t in positions if pos >= 0]
+    if not positions:
+        return body[:SNIPPET_CONTEXT * 2]
+    pos, term = min(positions)
+    start = max(0, pos - SNIPPET_CONTEXT)
+    end = min(len(body), pos + len(term) + SNIPPET_CONTEXT)
+    return (
+        ("…" if start > 0 else "")
+        + body[start:pos]
+        + SNIPPET_OPEN + body[pos:pos + len(term)] + SNIPPET_CLOSE
+        + body[pos + len(term):end]
+        + ("…" if end < len(body) else "")
+    )
+
+
+async def search(db: AsyncSession, user_id: int, query: str, types: Optional[List[str]] = None,
+                 limit: int = 20, offset: int = 0) -> List[dict]:
+    """
+    在用户的任务、日记、备忘录和对话记录中全文检索
+
+    多个关键词（空白分隔）需同时命中。至少 3 个字符的关键词走 FTS5 索引并按 bm25 相关度排序；
+    全部关键词都短于 3 个字符时 trigram 索引无法使用，改为按 user_id 索引读取该用户在各来源表中的行逐行匹配，
+    按最后修改时间倒序返回（日记按日期）。
+
+    参数:
+        query: 搜索关键词
+        types: 限定来源类型，取值见 SEARCH_TYPES，为空表示全部
+        limit: 返回条数
+        offset: 跳过的条数
+
+    返回:
+        [{"type", "id", "date", "seq", "title", "snippet", "score"}]
+        id 为任务 ID 或对话 ID，date 为日记日期，seq 为对话轮次序号
+    """
+    terms = _split_terms(query)
+    if not terms:
+        return []
+    fts_terms = [t for t in terms if len(t) >= MIN_FTS_TERM_LENGTH]
+    like_terms = [t for t in terms if len(t) < MIN_FTS_TERM_LENGTH]
+
+    params = {"user_id": user_id, "limit": limit, "offset": offset}
+    kinds = list(SEARCH_TYPES)
+    if types:
+        kinds = [t for t in SEARCH_TYPES if t in types]
+        if not kinds:
+            return []
+    like_conditions = []
+    for i, term in enumerate(like_terms):
+        params[f"like{i}"] = _like_pattern(term)
+        like_conditions.append(f"(title LIKE :like{i} ESCAPE '\\' OR body LIKE :like{i} ESCAPE '\\')")
+
+    if fts_terms:
+        params["match"] = " ".join(_fts_phrase(t) for t in fts_terms)
+        conditions = ["user_id = :user_id"]
+        if types:
+            names = []
+            for i, kind in enumerate(kinds):
+                params[f"kind{i}"] = kind
+                names.append(f":kind{i}")
+            conditions.append(f"kind IN ({', '.join(names)})")
+        sql = (
+            "SELECT kind, ref_id, ref_key, title, "
+            f"snippet(search_index, -1, '{SNIPPET_OPEN}', '{SNIPPET_CLOSE}', '…', 16) AS snippet, "
+            "bm25(search_index, 2.0, 1.0) AS score "
+            "FROM search_index WHERE search_index MATCH :match AND " + " AND ".join(conditions + like_conditions) + " "
+            "ORDER BY score LIMIT :limit OFFSET :offset"
+        )
+    else:
+        sql = (
+            "SELECT kind, ref_id, ref_key, title, body AS snippet, 0.0 AS score FROM ("
+            + " UNION ALL ".join(SHORT_TERM_SOURCES[kind] for kind in kinds) + ") "
+            "WHERE " + " AND ".join(like_conditions) + " "
+            "ORDER BY ts DESC, kind, ref_id DESC, ref_key DESC LIMIT :limit OFFSET :offset"
+        )
+    result = await db.execute(text(sql), params)
+    rows = result.all()
+
+    # 对话标题单独批量查询，标题修改后无需更新索引
+    dialogue_ids = {row.ref_id for row in rows if row.kind == "dialogue"}
+    dialogue_titles = {}
+    if dialogue_ids:
+        title_result = await db.execute(select(
+            models.AIAssistantMessage.id, models.AIAssistantMessage.title
+        ).filter(models.AIAssistantMessage.id.in_(dialogue_ids)))
+        dialogue_titles = dict(title_result.all())
+
+    items = []
+    for row in rows:
+        snippet = row.snippet if fts_terms else _make_snippet(row.snippet, like_terms)
+        # bm25 越小越相关，取反后分数越大越相关
+        item = {"type": row.kind, "id": None, "date": None, "seq": None,
+                "title": row.title, "snippet": snippet, "score": -float(row.score) if fts_terms else 0.0}
+        if row.kind == "task":
+            item["id"] = row.ref_id
+        elif row.kind == "journal":
+            item["date"] = row.ref_key
+        elif row.kind == "dialogue":
+            item["id"] = row.ref_id
+            item["seq"] = row.ref_key
+            item["title"] = dialogue_titles.get(row.ref_id)
+        items.append(item)
+    return items
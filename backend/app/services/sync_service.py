@@ -0,0 +1,256 @@
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from typing import List, Optional
+from app.core.database import unit_of_work
+from app.core.dates import normalize_date
+from app.models import models
+from app.schemas import schemas
+from app.services import crud
+
+# 增量同步：每行数据的 rev 为最后修改时的全局修订号，删除的任务 / 长期任务 / 重复任务规则记录在 sync_tombstones 中
+# （由触发器维护，见 migrations/m0013_sync_revisions.py）。
+# 离线重放：客户端离线时排队的修改带上所基于的 rev 一次提交，rev 不一致的修改作为冲突返回，由客户端合并后重试。
+
+
+async def get_changes(db: AsyncSession, user_id: int, since: Optional[int] = None) -> dict:
+    """
+    获取用户在修订号 since 之后变更的任务、长期任务、重复任务规则、日记、备忘录、设置和提醒
+
+    所有查询在同一个读事务中执行，看到的是同一时刻的数据；每类数据走 (user_id, rev) 索引，
+    查询量只取决于变更的行数，与账户的数据总量无关。
+
+    参数:
+        since: 上次同步返回的 revision；为空或大于当前修订号（如数据库已重建）时返回全部数据
+
+    返回:
+        {"revision", "full", "tasks", "long_term_tasks", "journals", "memo", "settings", "reminders",
+         "recurrences", "deleted"}
+        每条记录带有最后修改时的 rev，客户端离线修改该记录时作为 base_rev 传给 replay_mutations
+        客户端下次以 revision 作为 since 请求；full 为 True 时客户端应以结果替换本地全部数据，
+        否则按 deleted（[{"type", "id"}]）删除本地记录，再合并其余变更
+    """
+    result = await db.execute(select(models.SyncRevision.rev).filter(models.SyncRevision.id == 1))
+    revision = result.scalar() or 0
+    full = since is None or since > revision
+
+    def changed(model, query=None):
+        query = query if query is not None else select(model)
+        query = query.filter(model.user_id == user_id)
+        if not full:
+            query = query.filter(model.rev > since)
+        return query.order_by(model.rev)
+
+    result = await db.execute(changed(models.Task, select(models.Task).options(joinedload(models.Task.long_term_task))))
+    tasks = [crud.map_task_to_schema(t) for t in result.scalars().all()]
+
+    result = await db.execute(changed(models.LongTermTask))
+    long_term_tasks = await crud.map_long_term_tasks_to_schema(db, result.scalars().all())
+
+    result = await db.execute(changed(models.TaskRecurrence))
+    recurrences = [crud.map_recurrence_to_schema(r) for r in result.scalars().all()]
+
+    result = await db.execute(changed(models.Journal))
+    journals = [schemas.Journal.model_validate(j) for j in result.scalars().all()]
+
+    result = await db.execute(changed(models.Memo))
+    memo = result.scalars().first()
+
+    result = await db.execute(changed(models.Settings))
+    settings = result.scalars().first()
+
+    reminder_query = select(models.Reminder)
+    if full:
+        reminder_query = reminder_query.filter(models.Reminder.deleted == 0)
+    result = await db.execute(changed(models.Reminder, reminder_query))
+    reminders, deleted = [], []
+    for r in result.scalars().all():
+        if r.deleted:
+            deleted.append({"type": "reminder", "id": r.id})
+        else:
+            reminders.append({**crud._reminder_to_dict(r), "rev": r.rev})
+
+    if not full:
+        result = await db.execute(select(models.SyncTombstone.kind, models.SyncTombstone.ref_id).filter(
+            models.SyncTombstone.user_id == user_id,
+            models.SyncTombstone.rev > since
+        ).order_by(models.SyncTombstone.rev))
+        # 删除后又以相同 ID 新建的记录（SQLite 可能复用最大的 rowid）以新记录为准
+        alive = ({("task", t.id) for t in tasks} | {("long_term_task", lt.id) for lt in long_term_tasks}
+                 | {("task_recurrence", r.id) for r in recurrences})
+        seen = set()
+        for kind, ref_id in result.all():
+            if (kind, ref_id) not in alive and (kind, ref_id) not in seen:
+                seen.add((kind, ref_id))
+                deleted.append({"type": kind, "id": ref_id})
+
+    return {
+        "revision": revision,
+        "full": full,
+        "tasks": tasks,
+        "long_term_tasks": long_term_tasks,
+        "journals": journals,
+        "memo": schemas.Memo.model_validate(memo) if memo else None,
+        "settings": schemas.Settings.model_validate(settings) if settings else None,
+        "reminders": reminders,
+        "recurrences": recurrences,
+        "deleted": deleted,
+    }
+
+
+# 离线重放支持的数据类型
+REPLAY_MODELS = {
+    "task": models.Task,
+    "long_term_task": models.LongTermTask,
+    "journal": models.Journal,
+    "memo": models.Memo,
+}
+
+
+async def _row_rev(db: AsyncSession, kind: str, user_id: int, ref) -> Optional[int]:
+    """
+    读取记录当前的 rev（直接查询列值，不受会话中已加载对象的影响）
+
+    参数:
+        ref: task / long_term_task 为 ID，journal 为日期，memo 忽略
+
+    返回:
+        rev；记录不存在或不属于该用户时返回 None
+    """
+    model = REPLAY_MODELS[kind]
+    query = select(model.rev).filter(model.user_id == user_id)
+    if kind == "journal":
+        query = query.filter(model.date == ref)
+    elif kind != "memo":
+        query = query.filter(model.id == ref)
+    result = await db.execute(query)
+    return result.scalar()
+
+
+async def _current_row(db: AsyncSession, kind: str, user_id: int, ref) -> Optional[dict]:
+    """服务器上的当前记录（冲突时返回给客户端合并）"""
+    if kind == "task":
+        current = await crud.get_task_by_id(ref, db)
+    elif kind == "long_term_task":
+        current = await crud.get_long_term_task_by_id(ref, db)
+    elif kind == "journal":
+        current = await crud.get_journal_by_date(ref, user_id, db)
+    else:
+        memo = await crud.get_memo(user_id, db)
+        current = schemas.Memo.model_validate(memo) if memo else None
+    return current.model_dump() if current else None
+
+
+async def _replay_one(db: AsyncSession, user_id: int, mutation: schemas.ReplayMutation, item: dict):
+    """执行一条修改，结果写入 item"""
+    kind, op, data = mutation.type, mutation.op, mutation.data or {}
+    if kind in ("journal", "memo") and op != "update":
+        item["error"] = f"{kind} only supports update"
+        return
+    if kind == "journal":
+        ref = normalize_date(mutation.date) if mutation.date else None
+        if not ref:
+            item["error"] = "date is required"
+            return
+    else:
+        ref = mutation.id
+        if kind != "memo" and op != "create" and ref is None:
+            item["error"] = "id is required"
+            return
+    if kind in ("journal", "memo") and not isinstance(data.get("content"), str):
+        item["error"] = "data.content is required"
+        return
+
+    if op == "create":
+        if kind == "task":
+            created = await crud.create_task(schemas.TaskCreate(**{**data, "user_id": user_id}), db)
+        else:
+            created = await crud.create_long_term_task(schemas.LongTermTaskCreate(**{**data, "user_id": user_id}), db)
+        ref = item["id"] = created.id
+    else:
+        virtual = False
+        if kind == "task" and ref < 0:
+            # 重复任务的发生日：已有覆盖行时按覆盖行检查版本，否则没有 rev，由 patch_task / delete_task 写入覆盖行
+            occurrence = await crud.get_task_by_id(ref, db)
+            if occurrence is not None and occurrence.user_id == user_id:
+                virtual = occurrence.id < 0
+                ref = item["id"] = occurrence.id
+        rev = 0 if virtual else await _row_rev(db, kind, user_id, ref)
+        if rev is None and op == "delete":
+            # 已在服务器上删除，结果与客户端期望一致
+            item["status"] = "applied"
+            return
+        if rev is None and kind in ("task", "long_term_task"):
+            # 客户端修改的记录已在服务器上删除
+            item["status"] = "conflict"
+            return
+        if not virtual and rev is not None and mutation.base_rev is not None and rev != mutation.base_rev:
+            item["status"] = "conflict"
+            item["rev"] = rev
+            item["current"] = await _current_row(db, kind, user_id, ref)
+            if item["current"] is not None:
+                # 会话中已加载的对象可能没有触发器写入的最新 rev
+                item["current"]["rev"] = rev
+            return
+
+        if kind == "task":
+            if op == "delete":
+                await crud.delete_task(ref, db)
+            else:
+                await crud.patch_task(ref, schemas.TaskPatch(**data), db)
+                if virtual:
+                    ref = item["id"] = (await crud.get_task_by_id(ref, db)).id
+        elif kind == "long_term_task":
+            if op == "delete":
+                await crud.delete_long_term_task(ref, db)
+            else:
+                await crud.patch_long_term_task(ref, schemas.LongTermTaskPatch(**data), db)
+        elif kind == "journal":
+            await crud.update_journal_content(ref, data["content"], user_id, db)
+        else:
+            await crud.update_memo(user_id, data["content"], db)
+
+    item["status"] = "applied"
+    if op != "delete":
+        item["rev"] = await _row_rev(db, kind, user_id, ref)
+
+
+async def replay_mutations(db: AsyncSession, user_id: int, mutations: List[schemas.ReplayMutation]) -> dict:
+    """
+    按顺序重放客户端离线时排队的修改，全部在一个事务中执行，只提交一次
+
+    update / delete 带 base_rev 时先比较记录当前的 rev：不一致说明记录在客户端离线期间被其他设备修改过，
+    该修改不执行，作为冲突返回服务器的当前记录和 rev。每条修改在各自的 SAVEPOINT 中执行，
+    冲突或失败的修改不影响其他修改。新建的记录在结果中返回服务器分配的 ID，
+    客户端应在排队时把对同一条新记录的后续修改合并到 create 中。
+
+    参数:
+        mutations: 修改列表，含义见 schemas.ReplayMutation
+
+    返回:
+        {"revision", "results": [{"index", "status", "id", "rev", "current", "error"}]}，results 与 mutations 一一对应
+    """
+    results = []
+    async with unit_of_work(db):
+        for index, mutation in enumerate(mutations):
+            item = {"index": index, "status": "error", "id": mutation.id, "rev": None, "current": None, "error": None}
+            try:
+                async with db.begin_nested():
+                    await _replay_one(db, user_id, mutation, item)
+            except ValidationError as e:
+                item["status"] = "error"
+                item["error"] = "; ".join(
+                    f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+                )
+            except (ValueError, SQLAlchemyError) as e:
+                item["status"] = "error"
+                item["error"] = str(getattr(e, "orig", None) or e)
+            results.append(item)
+        result = await db.execute(select(models.SyncRevision.rev).filter(models.SyncRevision.id == 1))
+        revision = result.scalar() or 0
+    print(f"[sync] 离线重放完成，用户 {user_id}，" + "，".join(
+        f"{status} {sum(r['status'] == status for r in results)}" for status in ("applied", "conflict", "error")
+    ))
+    return {"revision": revision, "results": results}
@@ -0,0 +1,68 @@
+# 测试共用的夹具：所有测试使用临时目录中的同一个 SQLite 数据库，
+# DATABASE_URL 在导入 app 之前设置（app.core.config 在导入时读取）。
+# 各测试通过 user_id 夹具使用互不相同的用户，彼此的数据不会相互影响。
+import itertools
+import os
+import tempfile
+
+TEST_DB_DIR = tempfile.mkdtemp(prefix="task_stream_tests_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(TEST_DB_DIR, 'test.db')}"
+
+import pytest
+from sqlalchemy import event
+from app.core.database import engine
+from app.migrations import run_migrations
+from app.services.daily_stats import sync_daily_stats
+
+_user_ids = itertools.count(1000)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def database():
+    """升级到最新结构版本的数据库引擎；测试结束时关闭连接池（每个测试使用新的事件循环）"""
+    await run_migrations(engine)
+    await sync_daily_stats(engine)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def user_id():
+    """本测试专用的用户 ID"""
+    return next(_user_ids)
+
+
+class EventCounter:
+    """统计引擎事件（执行的语句数、提交次数）的发生次数"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+
+    def _on_event(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(engine.sync_engine, self.name, self._on_event)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine.sync_engine, self.name, self._on_event)
+
+
+@pytest.fixture
+def count_statements():
+    """用法: with count_statements() as counter: ...; counter.count 为执行的 SQL 语句数"""
+    return lambda: EventCounter("before_cursor_execute")
+
+
+@pytest.fixture
+def count_commits():
+    """用法: with count_commits() as counter: ...; counter.count 为提交次数"""
+    return lambda: EventCounter("commit")
@@ -0,0 +1,42 @@
+# 批量任务操作：update 按 TaskPatch 部分更新，只写入出现的字段
+import httpx
+import pytest
+from app.core.database import SessionLocal
+from app.main import app
+from app.schemas import schemas
+from app.services import crud
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client(database):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_batch_partial_reschedule_and_complete(client, user_id):
+    async with SessionLocal() as db:
+        long_term = await crud.create_long_term_task(schemas.LongTermTaskCreate(user_id=user_id, title="L"), db)
+        first = await crud.create_task(schemas.TaskCreate(
+            user_id=user_id, title="a", status=1, tags=["x"], assigned_date="2026-01-01",
+            long_term_task_id=long_term.id), db)
+        second = await crud.create_task(schemas.TaskCreate(
+            user_id=user_id, title="b", status=1, long_term_task_id=long_term.id), db)
+
+    response = await client.post("/api/v1/tasks/batch", json={"operations": [
+        {"op": "update", "task_id": first.id, "task": {"assigned_date": "2026-01-02"}},
+        {"op": "update", "task_id": second.id, "task": {"status": 3}},
+        {"op": "update", "task_id": second.id, "task": {"status": None}},
+    ]})
+    assert response.status_code == 200
+    results = response.json()
+    assert [r["success"] for r in results] == [True, True, False]
+    assert "status" in results[2]["error"]
+
+    moved = (await client.get(f"/api/v1/tasks/{first.id}")).json()
+    assert (moved["title"], moved["status"], moved["tags"], moved["assigned_date"]) == ("a", 1, ["x"], "2026-01-02")
+    completed = (await client.get(f"/api/v1/tasks/{second.id}")).json()
+    assert (completed["title"], completed["status"]) == ("b", 3)
+    progress = (await client.get(f"/api/v1/long-term-tasks/{long_term.id}")).json()["progress"]
+    assert progress == 0.5
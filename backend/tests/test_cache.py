@@ -0,0 +1,44 @@
+# 读缓存与读快照：先执行了其他查询（如 ETag 的版本号查询）的读事务不能把旧数据缓存在新版本下
+import pytest
+from app.core.cache import cache, mark_snapshot
+from app.core.data_versions import TASKS, get_versions
+from app.core.database import SessionLocal
+from app.schemas import schemas
+from app.services import crud
+
+pytestmark = pytest.mark.anyio
+
+
+async def _titles(db, user_id):
+    return sorted(t.title for t in await crud.get_all_tasks_for_user(user_id, db))
+
+
+async def test_write_between_etag_query_and_loader(database, user_id):
+    async with SessionLocal() as db:
+        await crud.create_task(schemas.TaskCreate(user_id=user_id, title="a", status=1), db)
+
+    async with SessionLocal() as read_db:
+        await mark_snapshot(read_db)
+        await get_versions(read_db, user_id, [TASKS])  # 读快照在这里确定
+        async with SessionLocal() as db:
+            await crud.create_task(schemas.TaskCreate(user_id=user_id, title="b", status=1), db)
+        assert await _titles(read_db, user_id) == ["a"]
+
+    async with SessionLocal() as db:
+        await mark_snapshot(db)
+        await get_versions(db, user_id, [TASKS])
+        assert await _titles(db, user_id) == ["a", "b"]
+
+
+async def test_etag_query_before_loader_still_hits_cache(database, user_id):
+    async with SessionLocal() as db:
+        await crud.create_task(schemas.TaskCreate(user_id=user_id, title="a", status=1), db)
+    async with SessionLocal() as db:
+        assert await _titles(db, user_id) == ["a"]
+
+    hits = cache.stats()["hits"]
+    async with SessionLocal() as db:
+        await mark_snapshot(db)
+        await get_versions(db, user_id, [TASKS])
+        assert await _titles(db, user_id) == ["a"]
+    assert cache.stats()["hits"] == hits + 1
@@ -0,0 +1,126 @@
+# 每个写接口、每次 AI 工具调用只提交一次（SQLite 每次提交都要 fsync，见 app/core/database.py 的 unit_of_work）
+import httpx
+import pytest
+from app.core.database import SessionLocal, unit_of_work
+from app.main import app
+from app.schemas import schemas
+from app.services import crud
+from app.services.ai_tools import get_ai_tools
+
+pytestmark = pytest.mark.anyio
+
+
+class ConfirmingOutputManager:
+    """测试用的输出管理器：所有卡片直接确认"""
+
+    async def send_card(self, card_data, need_confirm: bool = True):
+        return True
+
+
+async def test_each_write_endpoint_commits_once(database, user_id, count_commits):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        async def request(method: str, url: str, **kwargs):
+            with count_commits() as counter:
+                response = await client.request(method, url, **kwargs)
+            assert response.status_code == 200, (method, url, response.text)
+            assert counter.count == 1, (method, url, counter.count)
+            return response.json()
+
+        await request("POST", "/api/v1/auth/register", json={"username": f"commits{user_id}", "passwordHash": "x"})
+        long_term = await request("POST", "/api/v1/long-term-tasks", json={"user_id": user_id, "title": "L"})
+        task = await request("POST", "/api/v1/tasks/", json={
+            "user_id": user_id, "title": "T", "status": 1, "long_term_task_id": long_term["id"]})
+        await request("PATCH", f"/api/v1/tasks/{task['id']}", json={"status": 3})
+        task = await client.get(f"/api/v1/tasks/{task['id']}")
+        await request("PUT", f"/api/v1/tasks/{task.json()['id']}", json={**task.json(), "title": "T2"})
+        await request("POST", "/api/v1/tasks/batch", json={"operations": [
+            {"op": "create", "task": {"user_id": user_id, "title": "B1", "status": 1}},
+            {"op": "create", "task": {"user_id": user_id, "title": "B2", "status": 1}},
+            {"op": "update", "task_id": task.json()["id"], "task": {**task.json(), "status": 1}},
+        ]})
+        await request("PATCH", f"/api/v1/long-term-tasks/{long_term['id']}", json={"title": "L2"})
+        await request("POST", "/api/v1/long-term-tasks/repair-progress", params={"user_id": user_id})
+        recurrence = await request("POST", "/api/v1/recurrences", json={
+            "user_id": user_id, "title": "R", "rule": "daily", "start_date": "2026-01-01"})
+        await request("PATCH", f"/api/v1/recurrences/{recurrence['id']}", json={"title": "R2"})
+        await request("DELETE", f"/api/v1/recurrences/{recurrence['id']}")
+        await request("PUT", "/api/v1/journals/2026-01-01", json={"user_id": user_id, "content": "j"})
+        await request("POST", "/api/v1/settings", json={
+            "user_id": user_id, "primary": "a", "bg": "b", "card": "c", "text": "d"})
+        await request("PUT", f"/api/v1/settings/{user_id}", json={"bg": "e"})
+        await request("PUT", f"/api/v1/memos/{user_id}", json={"content": "m"})
+        reminder = await request("POST", "/api/v1/reminders", json={
+            "user_id": user_id, "type": "Message", "time": "2026-01-01 10:00", "content": "r"})
+        await request("DELETE", f"/api/v1/reminders/{reminder['id']}", params={"user_id": user_id})
+        await request("POST", "/api/v1/sync/replay", json={"user_id": user_id, "mutations": [
+            {"type": "task", "op": "create", "data": {"user_id": user_id, "title": "S", "status": 1}},
+            {"type": "memo", "op": "update", "data": {"content": "m2"}},
+        ]})
+        await request("DELETE", f"/api/v1/tasks/{task.json()['id']}")
+        await request("DELETE", f"/api/v1/long-term-tasks/{long_term['id']}")
+
+
+async def test_each_ai_tool_call_commits_once(database, user_id, count_commits):
+    async with SessionLocal() as db:
+        long_term = await crud.create_long_term_task(schemas.LongTermTaskCreate(user_id=user_id, title="L"), db)
+        task = await crud.create_task(schemas.TaskCreate(user_id=user_id, title="T", status=1), db)
+        tools = {tool.name: tool for tool in await get_ai_tools(ConfirmingOutputManager(), user_id, db)}
+
+        async def call(name: str, **kwargs):
+            with count_commits() as counter:
+                result = await tools[name].coroutine(**kwargs)
+            assert counter.count == 1, (name, counter.count, result)
+            return result
+
+        await call("create_task", title="A", assigned_date="2026-01-01", long_term_task_id=long_term.id)
+        await call("update_task", task_id=task.id, status=3)
+        await call("create_recurring_task", title="R", rule="weekly", start_date="2026-01-05")
+        await call("create_long_term_task", title="L2", sub_task_ids={str(task.id): 1.0})
+        await call("update_long_term_task", task_id=long_term.id, sub_task_ids={str(task.id): 2.0})
+        await call("update_journal", date="2026-01-01", content="j")
+        await call("add_reminder", type="Message", time="2026-01-01 10:00", content="r")
+        await call("delete_task", task_id=task.id)
+        await call("delete_long_term_task", task_id=long_term.id)
+        await call("get_tasks", start_date="2026-01-01", end_date="2026-01-31")
+        await call("get_memo")
+
+
+async def test_unit_of_work_commits_once_and_rolls_back(database, user_id, count_commits):
+    async with SessionLocal() as db:
+        with count_commits() as counter:
+            async with unit_of_work(db):
+                await crud.create_task(schemas.TaskCreate(user_id=user_id, title="A", status=1), db)
+                await crud.create_task(schemas.TaskCreate(user_id=user_id, title="B", status=3), db)
+                await crud.update_memo(user_id, "m", db)
+        assert counter.count == 1
+
+        with count_commits() as counter:
+            with pytest.raises(RuntimeError):
+                async with unit_of_work(db):
+                    await crud.create_task(schemas.TaskCreate(user_id=user_id, title="C", status=1), db)
+                    raise RuntimeError("rollback")
+        assert counter.count == 0
+        titles = [t.title for t in await crud.get_all_tasks_for_user(user_id, db)]
+        assert sorted(titles) == ["A", "B"]
+
+
+class ConcurrentWriteOutputManager(ConfirmingOutputManager):
+    """等待确认期间另一个会话提交了写入"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+
+    async def send_card(self, card_data, need_confirm: bool = True):
+        async with SessionLocal() as other:
+            await crud.update_memo(self.user_id, "written while waiting", other)
+        return True
+
+
+async def test_ai_tool_writes_after_concurrent_commit(database, user_id, count_commits):
+    async with SessionLocal() as db:
+        task = await crud.create_task(schemas.TaskCreate(user_id=user_id, title="T", status=1), db)
+        tools = {tool.name: tool for tool in await get_ai_tools(ConcurrentWriteOutputManager(user_id), user_id, db)}
+        with count_commits() as counter:
+            await tools["update_task"].coroutine(task_id=task.id, status=3)
+        assert counter.count == 2  # 等待期间的写入和工具调用各一次
+        assert (await crud.get_task_by_id(task.id, db)).status == 3
@@ -0,0 +1,89 @@
+# 并发读写：WAL 模式下读不阻塞写、写不阻塞读，写与写之间由 busy_timeout 排队，
+# 不应出现 "database is locked"
+import asyncio
+import time
+import httpx
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import OperationalError
+from app.core.database import SessionLocal
+from app.main import app
+from app.models import models
+from app.schemas import schemas
+from app.services import crud
+
+pytestmark = pytest.mark.anyio
+
+WRITERS = 4
+WRITES_PER_WRITER = 25
+READERS = 8
+READS_PER_READER = 50
+
+
+async def test_journal_mode_is_wal(database):
+    async with database.connect() as conn:
+        mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+    assert mode.lower() == "wal"
+
+
+async def test_concurrent_reads_during_writes(database, user_id):
+    errors = []
+    reads = [0]
+
+    async def writer(index: int):
+        for i in range(WRITES_PER_WRITER):
+            try:
+                async with SessionLocal() as db:
+                    await crud.create_task(schemas.TaskCreate(
+                        user_id=user_id, title=f"w{index}-{i}", status=1, assigned_date="2026-01-01"), db)
+            except OperationalError as e:
+                errors.append(str(e))
+
+    async def reader():
+        for _ in range(READS_PER_READER):
+            try:
+                async with SessionLocal() as db:
+                    await db.execute(select(func.count()).select_from(models.Task)
+                                     .where(models.Task.user_id == user_id,
+                                            models.Task.assigned_date == "2026-01-01"))
+                    reads[0] += 1
+            except OperationalError as e:
+                errors.append(str(e))
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[writer(i) for i in range(WRITERS)], *[reader() for _ in range(READERS)])
+    elapsed = time.perf_counter() - started
+    print(f"{WRITERS * WRITES_PER_WRITER} writes / {reads[0]} reads in {elapsed:.2f}s")
+
+    assert not [e for e in errors if "database is locked" in e]
+    assert not errors
+    assert reads[0] == READERS * READS_PER_READER
+    async with SessionLocal() as db:
+        count = (await db.execute(select(func.count()).select_from(models.Task)
+                                  .where(models.Task.user_id == user_id))).scalar()
+    assert count == WRITERS * WRITES_PER_WRITER
+
+
+async def test_concurrent_updates_through_api(database, user_id):
+    """写请求先读后写（PUT 任务），并发执行时由 BEGIN IMMEDIATE 排队，同时进行的列表查询不受影响"""
+    async with SessionLocal() as db:
+        tasks = [await crud.create_task(schemas.TaskCreate(user_id=user_id, title=f"t{i}", status=1), db)
+                 for i in range(WRITERS * 5)]
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        async def update(task: schemas.Task):
+            body = task.model_dump(exclude={"long_term_task"})
+            body["status"] = 3
+            return await client.put(f"/api/v1/tasks/{task.id}", json=body)
+
+        async def list_tasks():
+            return await client.get("/api/v1/tasks/", params={"user_id": user_id})
+
+        responses = await asyncio.gather(*[update(t) for t in tasks], *[list_tasks() for _ in range(READERS)])
+
+    assert [r.status_code for r in responses] == [200] * len(responses)
+    async with SessionLocal() as db:
+        done = (await db.execute(select(func.count()).select_from(models.Task)
+                                 .where(models.Task.user_id == user_id, models.Task.status == 3))).scalar()
+    assert done == len(tasks)
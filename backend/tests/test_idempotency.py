@@ -0,0 +1,56 @@
+# 幂等键：按用户区分，处理中途退出留下的占位记录超时后可以重新执行
+import json
+import time
+import httpx
+import pytest
+from sqlalchemy import text
+from app.core.idempotency import IDEMPOTENCY_HEADER, INSERT_PENDING, REPLAYED_HEADER, _fingerprint
+from app.main import app
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client(database):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+def _task(user_id: int) -> dict:
+    return {"user_id": user_id, "title": "T", "status": 1}
+
+
+async def test_same_key_from_different_users(client, user_id):
+    other_user_id = user_id + 10000
+    headers = {IDEMPOTENCY_HEADER: "shared-key"}
+    first = await client.post("/api/v1/tasks/", json=_task(user_id), headers=headers)
+    second = await client.post("/api/v1/tasks/", json=_task(other_user_id), headers=headers)
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert REPLAYED_HEADER not in second.headers
+    assert (first.json()["user_id"], second.json()["user_id"]) == (user_id, other_user_id)
+
+    retry = await client.post("/api/v1/tasks/", json=_task(other_user_id), headers=headers)
+    assert retry.headers[REPLAYED_HEADER] == "true"
+    assert retry.json()["id"] == second.json()["id"]
+
+
+async def test_expired_pending_claim_is_reclaimed(client, database, user_id):
+    """写操作提交后、保存响应前进程退出：占位记录超时前重试返回 409，超时后重新执行"""
+    body = json.dumps(_task(user_id)).encode()
+    params = {"user_id": user_id, "method": "POST", "path": "/api/v1/tasks/",
+              "fingerprint": _fingerprint("POST", "/api/v1/tasks/", b"", body)}
+    async with database.begin() as conn:
+        await conn.execute(INSERT_PENDING, {**params, "key": "stuck", "expires_at": int(time.time()) + 60})
+        await conn.execute(INSERT_PENDING, {**params, "key": "expired", "expires_at": int(time.time()) - 1})
+
+    headers = {"content-type": "application/json"}
+    stuck = await client.post("/api/v1/tasks/", content=body, headers={**headers, IDEMPOTENCY_HEADER: "stuck"})
+    assert stuck.status_code == 409
+    expired = await client.post("/api/v1/tasks/", content=body, headers={**headers, IDEMPOTENCY_HEADER: "expired"})
+    assert expired.status_code == 200 and REPLAYED_HEADER not in expired.headers
+
+    async with database.connect() as conn:
+        status = (await conn.execute(text(
+            "SELECT status_code FROM idempotency_keys WHERE user_id = :user_id AND key = 'expired'"
+        ), {"user_id": user_id})).scalar()
+    assert status == 200
@@ -0,0 +1,24 @@
+# 迁移 0007 保留的无法解析的旧日记日期：读取接口应原样返回，而不是校验失败返回 500
+import httpx
+import pytest
+from sqlalchemy import insert
+from app.core.database import SessionLocal
+from app.main import app
+from app.models import models
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_legacy_journal_date_is_returned_as_is(database, user_id):
+    async with SessionLocal() as db:
+        await db.execute(insert(models.Journal).values(user_id=user_id, date="2026-02-30", content="legacy"))
+        await db.commit()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/api/v1/journals", params={
+            "user_id": user_id, "start_date": "2026-02-01", "end_date": "2026-02-31"})
+        assert response.status_code == 400  # 查询参数仍然校验
+        response = await client.get("/api/v1/journals", params={
+            "user_id": user_id, "start_date": "2026-02-01", "end_date": "2026-03-01"})
+        assert response.status_code == 200
+        assert [(j["date"], j["content"]) for j in response.json()] == [("2026-02-30", "legacy")]
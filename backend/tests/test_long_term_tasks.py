@@ -0,0 +1,42 @@
+# 长期任务进度只由子任务权重汇总得出，客户端传回的 progress 不会覆盖
+import httpx
+import pytest
+from app.core.database import SessionLocal
+from app.main import app
+from app.schemas import schemas
+from app.services import crud
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client(database):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_client_progress_is_ignored(client, user_id):
+    async with SessionLocal() as db:
+        long_term = await crud.create_long_term_task(
+            schemas.LongTermTaskCreate(user_id=user_id, title="L", progress=0.9), db)
+        assert long_term.progress == 0.0
+        done = await crud.create_task(schemas.TaskCreate(
+            user_id=user_id, title="a", status=3, long_term_task_id=long_term.id), db)
+        await crud.create_task(schemas.TaskCreate(
+            user_id=user_id, title="b", status=1, long_term_task_id=long_term.id), db)
+
+    path = f"/api/v1/long-term-tasks/{long_term.id}"
+    stale = (await client.get(path)).json()
+    assert stale["progress"] == 0.5
+
+    # 基于过期数据的 PUT：其他设备在此期间把第二个子任务也完成了
+    async with SessionLocal() as db:
+        await crud.patch_task(done.id + 1, schemas.TaskPatch(status=3), db)
+    stale["title"] = "renamed"
+    assert (await client.put(path, json=stale)).status_code == 200
+    current = (await client.get(path)).json()
+    assert (current["title"], current["progress"]) == ("renamed", 1.0)
+
+    assert (await client.patch(path, json={"progress": 0.1, "description": "d"})).status_code == 200
+    current = (await client.get(path)).json()
+    assert (current["description"], current["progress"]) == ("d", 1.0)
@@ -0,0 +1,78 @@
+# 长期任务相关操作执行的 SQL 语句数不随长期任务数 N、子任务数 M 增长（没有 N+1 查询）
+import pytest
+from app.core.cache import cache
+from app.core.database import SessionLocal
+from app.schemas import schemas
+from app.services import crud
+
+pytestmark = pytest.mark.anyio
+
+SMALL, LARGE = 2, 20
+
+
+async def create_tasks(db, user_id: int, count: int) -> list:
+    return [(await crud.create_task(schemas.TaskCreate(user_id=user_id, title=f"t{i}", status=i % 4), db)).id
+            for i in range(count)]
+
+
+async def count_for_sizes(count_statements, scenario) -> list:
+    """对 SMALL、LARGE 两种规模分别准备数据（各用一个新用户）并统计 scenario 执行的语句数"""
+    counts = []
+    for size in (SMALL, LARGE):
+        async with SessionLocal() as db:
+            run = await scenario(db, size)
+            await cache.clear()
+            with count_statements() as counter:
+                await run()
+            counts.append(counter.count)
+    return counts
+
+
+async def test_listing_long_term_tasks(database, user_id, count_statements):
+    async def scenario(db, size):
+        owner = user_id * 1000 + size
+        task_ids = await create_tasks(db, owner, size * 2)
+        for i in range(size):
+            await crud.create_long_term_task(schemas.LongTermTaskCreate(
+                user_id=owner, title=f"L{i}", sub_task_ids={str(t): 1.0 for t in task_ids[i * 2:i * 2 + 2]}), db)
+
+        async def run():
+            assert len(await crud.get_all_long_term_tasks(owner, db)) == size
+            assert len(await crud.get_all_uncompleted_long_term_tasks(owner, db)) <= size
+        return run
+
+    small, large = await count_for_sizes(count_statements, scenario)
+    assert small == large
+
+
+async def test_create_long_term_task_with_subtasks(database, user_id, count_statements):
+    async def scenario(db, size):
+        owner = user_id * 1000 + size
+        task_ids = await create_tasks(db, owner, size)
+
+        async def run():
+            created = await crud.create_long_term_task(schemas.LongTermTaskCreate(
+                user_id=owner, title="L", sub_task_ids={str(t): 0.5 for t in task_ids}), db)
+            assert len(created.sub_task_ids) == size
+        return run
+
+    small, large = await count_for_sizes(count_statements, scenario)
+    assert small == large
+
+
+async def test_relink_long_term_task_subtasks(database, user_id, count_statements):
+    """AI 更新长期任务时 sub_task_ids 决定关联关系（relink=True）：解除 size 个旧关联并新增 size 个"""
+    async def scenario(db, size):
+        owner = user_id * 1000 + size
+        task_ids = await create_tasks(db, owner, size * 2)
+        long_term = await crud.create_long_term_task(schemas.LongTermTaskCreate(
+            user_id=owner, title="L", sub_task_ids={str(t): 0.5 for t in task_ids[:size]}), db)
+
+        async def run():
+            data = long_term.model_dump()
+            data["sub_task_ids"] = {str(t): 1.0 for t in task_ids[size:]}
+            assert await crud.update_long_term_task(long_term.id, schemas.LongTermTask(**data), db, relink=True)
+        return run
+
+    small, large = await count_for_sizes(count_statements, scenario)
+    assert small == large
@@ -0,0 +1,111 @@
+# 常用查询的执行计划回归测试：对 crud 实际执行的每条 SELECT 运行 EXPLAIN QUERY PLAN，
+# 不应出现对整张表的 SCAN（按用户、日期范围、长期任务 ID 的查询都应走索引）
+import re
+import pytest
+from sqlalchemy import event
+from app.core.cache import cache
+from app.core.database import Base, SessionLocal
+from app.schemas import schemas
+from app.services import ai_config_service, crud, search_service
+
+pytestmark = pytest.mark.anyio
+
+# 整表扫描："SCAN tasks" 或 "SCAN tasks USING INDEX ..."（按索引顺序遍历整张表）；
+# 子查询、CTE 的物化结果（SCAN anon_1、SCAN CONSTANT ROW 等）不是数据表，不算
+TABLES = sorted([*Base.metadata.tables, "search_index"], key=len, reverse=True)
+FULL_SCAN = re.compile(r"^SCAN (%s)\b" % "|".join(TABLES))
+
+
+async def explain_statements(database, call):
+    """执行 call 并返回其间每条 SELECT 的 (语句, 执行计划各行)"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(database.sync_engine, "before_cursor_execute", capture)
+    try:
+        await call()
+    finally:
+        event.remove(database.sync_engine, "before_cursor_execute", capture)
+
+    plans = []
+    async with database.connect() as conn:
+        for statement, parameters in statements:
+            rows = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+            plans.append((statement, [row[3] for row in rows]))
+    return plans
+
+
+def assert_no_full_scan(plans):
+    assert plans, "no SELECT was executed"
+    for statement, details in plans:
+        scans = [d for d in details if FULL_SCAN.match(d)]
+        assert not scans, f"{scans} in plan of:\n{statement}"
+
+
+@pytest.fixture
+async def seeded(database, user_id):
+    """为本测试的用户写入少量任务、长期任务、日记和 AI 配置，并清空读缓存（保证查询真正执行）"""
+    async with SessionLocal() as db:
+        long_term = await crud.create_long_term_task(
+            schemas.LongTermTaskCreate(user_id=user_id, title="L", due_date="2026-03-01"), db)
+        for day in range(1, 6):
+            await crud.create_task(schemas.TaskCreate(
+                user_id=user_id, title=f"t{day}", status=3 if day % 2 else 1, assigned_date=f"2026-02-0{day}",
+                due_date=f"2026-02-0{day} 18:00", long_term_task_id=long_term.id), db)
+        await crud.update_journal_content("2026-02-01", "j", user_id, db)
+        await ai_config_service.create_ai_config(db, schemas.AIConfigCreate(user_id=user_id, api_key="k", model="m"))
+    await cache.clear()
+    return long_term.id
+
+
+async def test_date_range_query_uses_index(database, user_id, seeded):
+    async def call():
+        async with SessionLocal() as db:
+            await crud.get_tasks_in_date_range("2026-02-01", "2026-02-28", user_id, db)
+            await crud.get_journals_in_date_range("2026-02-01", "2026-02-28", user_id, db)
+    assert_no_full_scan(await explain_statements(database, call))
+
+
+async def test_heatmap_query_uses_index(database, user_id, seeded):
+    async def call():
+        async with SessionLocal() as db:
+            await crud.get_heatmap_data(2026, 2, user_id, db)
+            await crud.get_heatmap_range("2026-01-01", "2026-12-31", user_id, db)
+    assert_no_full_scan(await explain_statements(database, call))
+
+
+async def test_urgent_query_uses_index(database, user_id, seeded):
+    async def call():
+        async with SessionLocal() as db:
+            await crud.get_urgent_tasks(user_id, db, limit=10)
+    assert_no_full_scan(await explain_statements(database, call))
+
+
+async def test_subtask_query_uses_index(database, user_id, seeded):
+    async def call():
+        async with SessionLocal() as db:
+            await crud.get_long_term_task_by_id(seeded, db)
+            await crud.get_all_long_term_tasks(user_id, db)
+    assert_no_full_scan(await explain_statements(database, call))
+
+
+async def test_per_user_config_queries_use_index(database, user_id, seeded):
+    async def call():
+        async with SessionLocal() as db:
+            await ai_config_service.get_ai_config(db, user_id)
+            await crud.get_settings_by_user_id(user_id, db)
+            await crud.get_memo(user_id, db)
+            await crud.get_reminder_list(user_id, db)
+    assert_no_full_scan(await explain_statements(database, call))
+
+
+async def test_short_term_search_uses_index(database, user_id, seeded):
+    """全部关键词短于 3 个字符时不能使用 trigram 索引，应按 user_id 读取各来源表，而不是扫描所有用户的索引内容"""
+    async def call():
+        async with SessionLocal() as db:
+            await search_service.search(db, user_id, "t1")
+            await search_service.search(db, user_id, "t1", ["task", "dialogue"])
+    assert_no_full_scan(await explain_statements(database, call))
@@ -0,0 +1,86 @@
+# 重复任务：按日期窗口展开发生日，编辑发生日写入覆盖行，删除发生日记入 exdates
+import httpx
+import pytest
+from sqlalchemy import select
+from app.core.database import SessionLocal
+from app.core.recurrence import occurrence_task_id
+from app.main import app
+from app.models import models
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client(database):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def _create(client, user_id, rule, start_date, **fields):
+    response = await client.post("/api/v1/recurrences", json={
+        "user_id": user_id, "title": rule, "rule": rule, "start_date": start_date, **fields})
+    assert response.status_code == 200
+    return response.json()
+
+
+async def _tasks(client, user_id, start_date, end_date):
+    response = await client.get("/api/v1/tasks/", params={
+        "user_id": user_id, "start_date": start_date, "end_date": end_date})
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_daily_and_weekly_expansion(client, user_id):
+    daily = await _create(client, user_id, "FREQ=DAILY;UNTIL=20260106", "2026-01-03")
+    weekly = await _create(client, user_id, "FREQ=WEEKLY;BYDAY=MO,WE", "2026-01-05")
+    assert daily["end_date"] == "2026-01-06"
+
+    tasks = await _tasks(client, user_id, "2026-01-01", "2026-01-14")
+    expected = [(daily["id"], day) for day in ("2026-01-03", "2026-01-04", "2026-01-05", "2026-01-06")]
+    expected += [(weekly["id"], day) for day in ("2026-01-05", "2026-01-07", "2026-01-12", "2026-01-14")]
+    expected.sort(key=lambda item: (item[1], occurrence_task_id(*item)))
+    assert [(t["recurrence_id"], t["assigned_date"]) for t in tasks] == expected
+    assert all(t["id"] == occurrence_task_id(t["recurrence_id"], t["assigned_date"]) for t in tasks)
+
+
+async def test_patch_occurrence_writes_override_row(client, user_id):
+    recurrence = await _create(client, user_id, "daily", "2026-01-01")
+    occurrence_id = occurrence_task_id(recurrence["id"], "2026-01-02")
+
+    response = await client.patch(f"/api/v1/tasks/{occurrence_id}", json={"title": "moved", "status": 2})
+    assert response.status_code == 200
+
+    async with SessionLocal() as db:
+        rows = (await db.execute(select(models.Task).filter(models.Task.recurrence_id == recurrence["id"]))).scalars().all()
+    assert [(r.occurrence_date, r.assigned_date, r.title, r.status) for r in rows] == [
+        ("2026-01-02", "2026-01-02", "moved", 2)]
+    tasks = await _tasks(client, user_id, "2026-01-01", "2026-01-03")
+    assert [(t["id"] > 0, t["title"]) for t in tasks] == [(False, "daily"), (True, "moved"), (False, "daily")]
+
+
+async def test_delete_occurrence_adds_exdate(client, user_id):
+    recurrence = await _create(client, user_id, "daily", "2026-01-01")
+    occurrence_id = occurrence_task_id(recurrence["id"], "2026-01-02")
+
+    assert (await client.delete(f"/api/v1/tasks/{occurrence_id}")).status_code == 200
+
+    stored = (await client.get(f"/api/v1/recurrences/{recurrence['id']}")).json()
+    assert stored["exdates"] == ["2026-01-02"]
+    tasks = await _tasks(client, user_id, "2026-01-01", "2026-01-03")
+    assert [t["assigned_date"] for t in tasks] == ["2026-01-01", "2026-01-03"]
+
+
+async def test_completed_counts_only_include_completed_occurrences(client, user_id):
+    """只有完成的发生日（覆盖行 status 为 3）计入完成数，规则本身的状态不影响"""
+    await _create(client, user_id, "daily", "2026-01-01", status=3)
+    recurrence = await _create(client, user_id, "daily", "2026-01-01")
+    occurrence_id = occurrence_task_id(recurrence["id"], "2026-01-02")
+    assert (await client.patch(f"/api/v1/tasks/{occurrence_id}", json={"status": 3})).status_code == 200
+
+    heatmap = (await client.get("/api/v1/stats/heatmap/range", params={
+        "user_id": user_id, "start_date": "2026-01-01", "end_date": "2026-01-03"})).json()
+    assert heatmap["counts"] == [0, 1, 0]
+
+    month = (await client.get("/api/v1/calendar/2026/1", params={"user_id": user_id})).json()
+    assert month["task_count"][:3] == [2, 2, 2]
+    assert month["completed_count"][:3] == [0, 1, 0]
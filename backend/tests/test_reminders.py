@@ -0,0 +1,45 @@
+# 提醒增量同步：sync_token 为同步修订号，不受写入时间戳精度和时钟的影响
+import httpx
+import pytest
+from app.main import app
+from app.services import crud
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client(database):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+def _reminder(user_id: int, content: str) -> dict:
+    return {"user_id": user_id, "type": "Message", "time": "2026-01-01 10:00", "content": content}
+
+
+async def test_changes_in_same_millisecond_are_returned(client, user_id, monkeypatch):
+    """同一毫秒内（或时钟回拨后）的多次写入都应出现在下一次增量结果中"""
+    first = (await client.post("/api/v1/reminders", json=_reminder(user_id, "a"))).json()
+    token = (await client.get("/api/v1/reminders", params={"user_id": user_id})).json()["sync_token"]
+
+    monkeypatch.setattr(crud, "_now_ms", lambda: 0)
+    await client.post("/api/v1/reminders", json=_reminder(user_id, "b"))
+    await client.post("/api/v1/reminders", json=_reminder(user_id, "c"))
+    await client.delete(f"/api/v1/reminders/{first['id']}", params={"user_id": user_id})
+
+    changes = (await client.get("/api/v1/reminders", params={"user_id": user_id, "since": token})).json()
+    assert [(r["content"], r["deleted"]) for r in changes["reminders"]] == [("b", False), ("c", False), ("a", True)]
+    assert changes["sync_token"] > token
+
+    again = (await client.get("/api/v1/reminders", params={"user_id": user_id, "since": changes["sync_token"]})).json()
+    assert again["reminders"] == []
+
+
+async def test_legacy_timestamp_token_returns_everything(client, user_id):
+    """旧版本客户端保存的毫秒时间戳大于当前修订号：返回包括已删除在内的全部提醒"""
+    kept = (await client.post("/api/v1/reminders", json=_reminder(user_id, "kept"))).json()
+    removed = (await client.post("/api/v1/reminders", json=_reminder(user_id, "removed"))).json()
+    await client.delete(f"/api/v1/reminders/{removed['id']}", params={"user_id": user_id})
+
+    changes = (await client.get("/api/v1/reminders", params={"user_id": user_id, "since": 1767225600000})).json()
+    assert {(r["id"], r["deleted"]) for r in changes["reminders"]} == {(kept["id"], False), (removed["id"], True)}
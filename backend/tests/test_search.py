@@ -0,0 +1,29 @@
+# 全文检索：短关键词（不走 FTS 索引）只返回该用户的内容，按最后修改时间倒序
+import pytest
+from sqlalchemy import update
+from app.core.database import SessionLocal
+from app.models import models
+from app.schemas import schemas
+from app.services import crud, search_service
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_short_term_search_is_per_user_and_newest_first(database, user_id):
+    other_user_id = user_id + 100000
+    async with SessionLocal() as db:
+        older = await crud.create_task(schemas.TaskCreate(user_id=user_id, title="xy older", status=1), db)
+        newer = await crud.create_task(schemas.TaskCreate(user_id=user_id, title="xy newer", status=1), db)
+        await crud.create_task(schemas.TaskCreate(user_id=other_user_id, title="xy other user", status=1), db)
+        await crud.update_journal_content("2026-01-01", "journal xy", user_id, db)
+        for task, updated_at in ((older, "2026-01-01 10:00:00"), (newer, "2026-01-02 10:00:00")):
+            await db.execute(update(models.Task).where(models.Task.id == task.id).values(updated_at=updated_at))
+        await db.commit()
+
+        results = await search_service.search(db, user_id, "xy")
+        assert [(r["type"], r["id"], r["date"]) for r in results] == [
+            ("task", newer.id, None), ("task", older.id, None), ("journal", None, "2026-01-01")]
+        assert results[0]["title"] == "xy newer"
+
+        results = await search_service.search(db, user_id, "xy", ["journal"])
+        assert [r["type"] for r in results] == ["journal"]
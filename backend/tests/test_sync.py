@@ -0,0 +1,80 @@
+# 增量同步：每条记录带 rev（离线重放时作为 base_rev 传回）
+import httpx
+import pytest
+from sqlalchemy import insert, select
+from app.core.database import SessionLocal
+from app.main import app
+from app.models import models
+from app.schemas import schemas
+from app.services import crud
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client(database):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_sync_rows_carry_rev(client, user_id):
+    async with SessionLocal() as db:
+        long_term = await crud.create_long_term_task(schemas.LongTermTaskCreate(user_id=user_id, title="L"), db)
+        task = await crud.create_task(schemas.TaskCreate(
+            user_id=user_id, title="T", status=1, long_term_task_id=long_term.id), db)
+        await crud.update_journal_content("2026-01-01", "j", user_id, db)
+        await crud.update_memo(user_id, "m", db)
+        await crud.create_recurrence(schemas.TaskRecurrenceCreate(
+            user_id=user_id, title="R", rule="daily", start_date="2026-01-01"), db)
+    await client.post("/api/v1/settings", json={"user_id": user_id, "primary": "a", "bg": "b", "card": "c", "text": "d"})
+    await client.post("/api/v1/reminders", json={
+        "user_id": user_id, "type": "Message", "time": "2026-01-01 10:00", "content": "r"})
+
+    response = await client.get("/api/v1/sync", params={"user_id": user_id})
+    assert response.status_code == 200
+    changes = response.json()
+    rows = (changes["tasks"] + changes["long_term_tasks"] + changes["journals"] + changes["reminders"]
+            + changes["recurrences"] + [changes["memo"], changes["settings"]])
+    assert len(rows) == 7
+    assert all(isinstance(row["rev"], int) and 0 < row["rev"] <= changes["revision"] for row in rows)
+
+    async with SessionLocal() as db:
+        task_rev = (await db.execute(select(models.Task.rev).filter(models.Task.id == task.id))).scalar()
+    assert changes["tasks"][0]["rev"] == task_rev
+
+
+async def test_sync_returns_legacy_journal_dates(client, user_id):
+    """迁移 0007 保留的无法解析的日记日期不应使同步接口返回 500"""
+    async with SessionLocal() as db:
+        await db.execute(insert(models.Journal).values(user_id=user_id, date="bad", content="legacy"))
+        await db.commit()
+
+    response = await client.get("/api/v1/sync", params={"user_id": user_id})
+    assert response.status_code == 200
+    assert [j["date"] for j in response.json()["journals"]] == ["bad"]
+
+
+async def test_replay_detects_conflicts_with_synced_rev(client, user_id):
+    """客户端以同步得到的 rev 作为 base_rev 重放：其他设备在此之后的修改作为冲突返回"""
+    async with SessionLocal() as db:
+        task = await crud.create_task(schemas.TaskCreate(user_id=user_id, title="T", status=1), db)
+    synced = (await client.get("/api/v1/sync", params={"user_id": user_id})).json()
+    synced_rev = synced["tasks"][0]["rev"]
+
+    async def replay(base_rev: int, status: int) -> dict:
+        response = await client.post("/api/v1/sync/replay", json={"user_id": user_id, "mutations": [
+            {"type": "task", "op": "update", "id": task.id, "base_rev": base_rev, "data": {"status": status}}]})
+        assert response.status_code == 200
+        return response.json()["results"][0]
+
+    applied = await replay(synced_rev, 2)
+    assert applied["status"] == "applied" and applied["rev"] > synced_rev
+
+    # 另一台设备仍持有旧的 rev
+    conflict = await replay(synced_rev, 3)
+    assert conflict["status"] == "conflict"
+    assert conflict["rev"] == applied["rev"] == conflict["current"]["rev"]
+    assert conflict["current"]["status"] == 2
+
+    # 合并后以服务器的 rev 重新排队
+    assert (await replay(conflict["rev"], 3))["status"] == "applied"
@@ -364,6 +364,33 @@ function App() {
     } catch {
       oldIds = []
     }
+
+    // 本地缓存提醒列表和 sync_token，只向服务端拉取增量变更
+    const cacheKey = `taskStream:reminderCache:${uid}`
+    let cache = null
+    try {
+      const raw = localStorage.getItem(cacheKey)
+      cache = raw ? JSON.parse(raw) : null
+    } catch {
+      cache = null
+    }
+    const hasCache = !!(cache && typeof cache.token === 'number' && cache.items && typeof cache.items === 'object')
+    const changes = await api.getReminderChanges(uid, hasCache ? cache.token : null)
+    const changed = Array.isArray(changes?.reminders) ? changes.reminders : []
+    if (hasCache && changed.length === 0 && Array.isArray(oldIds) && oldIds.length > 0) return
+    const items = hasCache ? { ...cache.items } : {}
+    for (const r of changed) {
+      if (r?.deleted) {
+        delete items[r.id]
+      } else if (r && r.id !== undefined) {
+        const { updated_at: _updatedAt, deleted: _deleted, ...rest } = r
+        items[r.id] = rest
+      }
+    }
+    try {
+      localStorage.setItem(cacheKey, JSON.stringify({ token: changes?.sync_token ?? 0, items }))
+    } catch {
+    }
     if (Array.isArray(oldIds) && oldIds.length > 0) {
       try {
         await LocalNotifications.cancel({
@@ -373,7 +400,7 @@ function App() {
       }
     }
 
-    const list = await api.getReminderList(uid)
+    const list = Object.values(items)
     const now = Date.now()
     const upcoming = (Array.isArray(list) ? list : [])
       .map((r) => ({ r, at: parseReminderAt(r?.time) }))
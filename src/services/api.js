@@ -11,6 +11,19 @@ const storageBaseUrl =
     typeof window !== 'undefined' ? window.localStorage?.getItem('apiBaseUrl') : null;
 export const API_BASE_URL = envBaseUrl || storageBaseUrl || (import.meta.env.DEV ? '' : '');
 
+const MUTATING_METHODS = new Set(['POST', 'PUT', 'PATCH', 'DELETE']);
+
+/**
+ * 生成写请求的幂等键（非安全上下文中没有 crypto.randomUUID，退回随机字符串）
+ * @returns {string}
+ */
+function newIdempotencyKey() {
+    if (typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function') {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+}
+
 /**
  * 通用 Fetch 请求封装
  * @param {string} url - 请求 URL
@@ -57,13 +70,26 @@ async function request(url, options = {}) {
         }
     }
     
-    const response = await fetch(`${API_BASE_URL}${url}`, {
-        headers: {
-            'Content-Type': 'application/json',
-            ...options.headers,
-        },
-        ...options,
-    });
+    const headers = {
+        'Content-Type': 'application/json',
+        ...options.headers,
+    };
+    // 写请求带上幂等键：网络错误（请求可能已在服务器执行）时以同一个键重试一次，服务器返回第一次的结果而不会重复执行
+    const idempotent = MUTATING_METHODS.has((options.method || 'GET').toUpperCase());
+    if (idempotent && !headers['Idempotency-Key']) {
+        headers['Idempotency-Key'] = newIdempotencyKey();
+    }
+    const send = () => fetch(`${API_BASE_URL}${url}`, { ...options, headers });
+    let response;
+    try {
+        response = await send();
+    } catch (e) {
+        if (!idempotent) {
+            throw e;
+        }
+        console.warn('写请求网络错误，使用同一幂等键重试:', url, e);
+        response = await send();
+    }
 
     if (isNicknameUpdate) {
         if (import.meta.env.DEV) {
@@ -143,12 +169,13 @@ export async function getAllUncompletedLongTermTasks(userId) {
 }
 
 /**
- * 获取用户急需处理的任务
+ * 获取用户急需处理的任务（按截止时间升序）
  * @param {number} userId - 用户 ID
+ * @param {number} limit - 最多返回的任务数，首页只展示前几页
  * @returns {Promise<Array>} - 急需处理的任务列表
  */
-export async function getUrgentTasks(userId) {
-    return request(`/api/v1/tasks/urgent?user_id=${userId}`);
+export async function getUrgentTasks(userId, limit = 30) {
+    return request(`/api/v1/tasks/urgent?user_id=${userId}&limit=${limit}`);
 }
 
 
@@ -219,6 +246,52 @@ export async function createLongTermTask(taskData) {
     });
 }
 
+/**
+ * 获取用户的重复任务规则
+ * 按日期范围获取任务时，规则的发生日已展开在任务列表中（id 为负数，recurrence_id 为所属规则），
+ * 对这些任务调用 updateTask / deleteTask 只修改或删除当天
+ * @param {number} userId - 用户 ID
+ * @returns {Promise<Array>} - 重复任务规则列表
+ */
+export async function getRecurrences(userId) {
+    return request(`/api/v1/recurrences?user_id=${userId}`);
+}
+
+/**
+ * 创建重复任务
+ * @param {object} recurrence - {user_id, title, rule, start_date, ...}，rule 为 daily / weekly / monthly 或 RRULE 子集
+ * @returns {Promise<object>} - 创建的重复任务
+ */
+export async function createRecurrence(recurrence) {
+    return request('/api/v1/recurrences', {
+        method: 'POST',
+        body: JSON.stringify(recurrence),
+    });
+}
+
+/**
+ * 部分更新重复任务（只影响尚未完成或编辑过的发生日）
+ * @param {number} recurrenceId - 重复任务 ID
+ * @param {object} patch - 需要修改的字段
+ * @returns {Promise<object>} - 更新后的重复任务
+ */
+export async function updateRecurrence(recurrenceId, patch) {
+    return request(`/api/v1/recurrences/${recurrenceId}`, {
+        method: 'PATCH',
+        body: JSON.stringify(patch),
+    });
+}
+
+/**
+ * 删除重复任务（已完成或编辑过的发生日保留为普通任务）
+ * @param {number} recurrenceId - 重复任务 ID
+ */
+export async function deleteRecurrence(recurrenceId) {
+    return request(`/api/v1/recurrences/${recurrenceId}`, {
+        method: 'DELETE',
+    });
+}
+
 // --- 智能助手 (AI) 接口 ---
 
 /**
@@ -251,6 +324,88 @@ export async function updateReminderList(userId, reminderList) {
     return Array.isArray(res?.reminder_list) ? res.reminder_list : [];
 }
 
+/**
+ * 获取提醒的增量变更
+ * @param {number} userId - 用户 ID
+ * @param {number|null} since - 上次返回的 sync_token（同步修订号），为空时返回全部提醒
+ * @returns {Promise<{reminders: Array, sync_token: number}>} - 已删除的提醒 deleted 为 true
+ */
+export async function getReminderChanges(userId, since = null) {
+    const query = since === null || since === undefined ? '' : `&since=${since}`;
+    return request(`/api/v1/reminders?user_id=${userId}${query}`);
+}
+
+/**
+ * 增量同步：获取上次同步之后变更的任务、长期任务、日记、备忘录、设置和提醒
+ * @param {number} userId - 用户 ID
+ * @param {number|null} since - 上次返回的 revision，为空时返回全部数据
+ * @returns {Promise<object>} - {revision, full, tasks, long_term_tasks, journals, memo, settings, reminders, recurrences, deleted}
+ *     每条记录带有 rev，离线修改该记录时作为 base_rev（见 buildMutation）
+ */
+export async function getSyncChanges(userId, since = null) {
+    const query = since === null || since === undefined ? '' : `&since=${since}`;
+    return request(`/api/v1/sync?user_id=${userId}${query}`);
+}
+
+/**
+ * 生成一条离线修改，排队后交给 replayMutations
+ * base_rev 取自 getSyncChanges 返回的记录的 rev：服务器上的记录在此之后被其他设备修改过时，重放返回 conflict
+ * @param {string} type - task | long_term_task | journal | memo
+ * @param {string} op - create | update | delete（journal / memo 只支持 update）
+ * @param {object|null} record - 同步得到的本地记录（create 时为空）
+ * @param {object|null} data - create 时为完整记录，update 时为修改的字段；journal / memo 为 {content}
+ * @returns {object} - {type, op, id, date, base_rev, data}
+ */
+export function buildMutation(type, op, record = null, data = null) {
+    return {
+        type,
+        op,
+        id: record?.id ?? null,
+        date: type === 'journal' ? (record?.date ?? data?.date ?? null) : null,
+        base_rev: record?.rev ?? null,
+        data,
+    };
+}
+
+/**
+ * 重放离线时排队的修改（同一事务，按顺序执行）
+ * @param {number} userId - 用户 ID
+ * @param {Array<object>} mutations - [{type: task|long_term_task|journal|memo, op: create|update|delete, id, date, base_rev, data}]，
+ *     用 buildMutation 生成，base_rev 为同步时记录的 rev
+ * @returns {Promise<object>} - {revision, results: [{index, status: applied|conflict|error, id, rev, current, error}]}
+ *     applied 的 rev 为修改后的 rev，应写回本地记录；conflict 时 current 为服务器的当前记录（含 rev），合并后以其 rev 重新排队
+ */
+export async function replayMutations(userId, mutations) {
+    return request('/api/v1/sync/replay', {
+        method: 'POST',
+        body: JSON.stringify({ user_id: userId, mutations }),
+    });
+}
+
+/**
+ * 新增一条提醒
+ * @param {number} userId - 用户 ID
+ * @param {object} reminder - {type, time, content, task_id}
+ * @returns {Promise<object>} - 新增的提醒（含 id）
+ */
+export async function addReminder(userId, reminder) {
+    return request('/api/v1/reminders', {
+        method: 'POST',
+        body: JSON.stringify({ ...reminder, user_id: userId }),
+    });
+}
+
+/**
+ * 删除一条提醒
+ * @param {number} userId - 用户 ID
+ * @param {number} reminderId - 提醒 ID
+ */
+export async function deleteReminder(userId, reminderId) {
+    return request(`/api/v1/reminders/${reminderId}?user_id=${userId}`, {
+        method: 'DELETE',
+    });
+}
+
 /**
  * 获取用户对话列表
  * @param {number} userId 
@@ -397,7 +552,8 @@ export async function getJournalDates(year, month, userId) {
  * @returns {Promise<Array<boolean>>} - 日志状态列表
  */
 export async function getJournalStatus(year, month, userId) {
-    return request(`/api/v1/journals/status?year=${year}&month=${month}&user_id=${userId}`);
+    const data = await getCalendarMonth(year, month, userId);
+    return data.journal;
 }
 
 /**
@@ -408,7 +564,20 @@ export async function getJournalStatus(year, month, userId) {
  * @returns {Promise<Array<number>>} - 热力图数据
  */
 export async function getHeatmapData(year, month, userId) {
-    return request(`/api/v1/stats/heatmap?year=${year}&month=${month}&user_id=${userId}`);
+    const data = await getCalendarMonth(year, month, userId);
+    return data.levels;
+}
+
+/**
+ * 获取月历数据（日记标记、热力等级、每天任务数）
+ * 日记状态和热力图共用该接口，服务端返回 ETag，月份数据未变化时浏览器缓存经 304 验证后直接复用
+ * @param {number} year - 年份
+ * @param {number} month - 月份
+ * @param {number} userId - 用户 ID
+ * @returns {Promise<{journal: boolean[], levels: number[], task_count: number[], completed_count: number[]}>}
+ */
+export async function getCalendarMonth(year, month, userId) {
+    return request(`/api/v1/calendar/${year}/${month}?user_id=${userId}`);
 }
 
 /**